@@ -0,0 +1,104 @@
+"""
+Check and time the single-pass select_one_lead_per_company against the original groupby loop.
+
+    python benchmarks/company_selection.py --rows 200000 --companies 50000
+
+The original loop sorted each company group with the default quicksort, which numpy
+does not guarantee to be stable, so companies with two equally ranked executives
+could come back with either one. The comparison therefore runs twice: exactly against
+the original on data where every company has a single best title, and against the
+original with a stable sort (its documented intent) on data with ties. The same
+comparison on small fixed tie cases runs with the tests (tests/test_company_selection.py).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from miedge_pipeline import company_keys, job_title_rank, select_one_lead_per_company  # noqa: E402
+
+RANKED_TITLES = ['CEO', 'President', 'COO', 'CFO', 'CTO', 'CIO', 'CMO', 'Owner', 'Founder', 'Chairman',
+                 'Managing Director', 'CAO', 'CRO', 'CHRO', 'CLO', 'CPO']
+OTHER_TITLES = ['Office Manager', 'HR Director', 'Sales Associate', None]
+
+
+def legacy_select_one_lead_per_company(df, sort_kind='quicksort'):
+    # The groupby loop select_one_lead_per_company used before ranks were computed in one pass
+    if df.empty:
+        return df.drop(columns=['__company_key'], errors='ignore')
+
+    selected_rows = []
+
+    for company, group in df.groupby('__company_key', dropna=False):
+        group = group.copy()
+        group['job_rank'] = group['Job Title'].apply(job_title_rank)
+        group = group.sort_values(by=['job_rank'], kind=sort_kind)
+        selected_rows.append(group.iloc[0])
+
+    return pd.DataFrame(selected_rows).drop(columns=['job_rank', '__company_key'], errors='ignore')
+
+
+def make_leads(rows, companies, with_ties, seed=11):
+    rng = random.Random(seed)
+    names = [f"Company {i}" for i in range(companies)]
+    data = []
+    used = {}
+    for i in range(rows):
+        company = rng.choice(names)
+        if with_ties:
+            title = rng.choice(RANKED_TITLES + OTHER_TITLES)
+        else:
+            # Hand out each ranked title at most once per company so no company has a tie at the top
+            taken = used.setdefault(company, set())
+            free = [title for title in RANKED_TITLES if title not in taken]
+            title = rng.choice(free) if free and rng.random() < 0.7 else None
+            taken.add(title)
+        data.append({'Contact Company name': rng.choice([company, company.upper(), f" {company} "]),
+                     'Job Title': title, 'Contact Email': f"lead{i}@example.com"})
+
+    df = pd.DataFrame(data)
+    df['__company_key'] = company_keys(df['Contact Company name'])
+    if not with_ties:
+        # Leave one row per company without a ranked title so the 999 bucket stays tie-free too
+        df = df[df['Job Title'].notna() | ~df['__company_key'].duplicated()]
+    return df
+
+
+def assert_same(expected, actual, label):
+    pd.testing.assert_frame_equal(expected, actual, check_dtype=False)
+    print(f"{label}: identical ({len(actual)} companies)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--companies', type=int, default=50000)
+    args = parser.parse_args()
+
+    no_ties = make_leads(args.rows, args.companies, with_ties=False)
+    assert_same(legacy_select_one_lead_per_company(no_ties), select_one_lead_per_company(no_ties),
+                'no ties vs original')
+
+    ties = make_leads(args.rows, args.companies, with_ties=True)
+    start = time.perf_counter()
+    legacy = legacy_select_one_lead_per_company(ties, sort_kind='stable')
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    selected = select_one_lead_per_company(ties)
+    single_pass_seconds = time.perf_counter() - start
+
+    assert_same(legacy, selected, 'ties vs original (stable sort)')
+    print(f"rows:        {len(ties)}")
+    print(f"groupby:     {legacy_seconds:.2f}s")
+    print(f"single pass: {single_pass_seconds:.2f}s")
+    print(f"speedup:     {legacy_seconds / single_pass_seconds:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark the column-wise Lead payload builder against the original iterrows loop.
+
+    python benchmarks/payload_mapping.py --rows 100000
+
+Both builders are run on the same synthetic miEdge export and their payloads are
+compared before timings are reported.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from miedge_pipeline import LEAD_FIELD_MAP, build_lead_payloads, clean_date  # noqa: E402
+
+PEOS = ['ADP TotalSource', 'Insperity', 'Justworks', 'TriNet', 'Paychex', 'Unknown PEO']
+TITLES = ['CEO', 'President', 'Owner', 'CFO', 'Office Manager', 'VP of Sales', 'Founder & CEO']
+DATES = ['01/15/2025', '2025-03-01', '7/4/2024', 'not a date', '']
+
+
+def make_miedge_csv(rows, seed=7):
+    rng = random.Random(seed)
+    headers = []
+    for header, _, _ in LEAD_FIELD_MAP:
+        for name in (header if isinstance(header, tuple) else (header,)):
+            if name and name not in headers:
+                headers.append(name)
+
+    data = {name: [f"{name} {rng.randint(0, 5000)}" if rng.random() > 0.2 else '' for _ in range(rows)]
+            for name in headers}
+    data['Job Title'] = [rng.choice(TITLES) for _ in range(rows)]
+    data['PEO (Normalized)'] = [rng.choice(PEOS) for _ in range(rows)]
+    data['Employees'] = [rng.randint(5, 500) for _ in range(rows)]
+    data['Contact Zip'] = [rng.randint(10000, 99999) for _ in range(rows)]
+    data['Contact Zip4'] = [rng.choice(['', '1234', '0042']) for _ in range(rows)]
+    for header, _, transform in LEAD_FIELD_MAP:
+        if transform == 'date':
+            data[header] = [rng.choice(DATES) for _ in range(rows)]
+
+    # Round trip through CSV so dtypes match what pd.read_csv gives the app
+    return pd.read_csv(io.StringIO(pd.DataFrame(data).to_csv(index=False)))
+
+
+def legacy_build_lead_payloads(df, owners, valid_providers):
+    # The per-row mapping push_to_salesforce used before LEAD_FIELD_MAP
+    payloads = []
+    for (_, row), owner_id in zip(df.fillna('').iterrows(), owners):
+        current_provider = row.get('PEO (Normalized)', '').strip()
+        payloads.append({
+            'Salutation': row.get('Contact Prefix (e.g. Dr, Prof etc.)', '') or '',
+            'FirstName': row.get('Contact First Name', '') or '',
+            'MiddleName': row.get('Contact Middle Name (or initial)', '') or '',
+            'LastName': row.get('Contact Last Name', '') or '',
+            'Company': row.get('Contact Company name', '') or 'Unknown',
+            'Email': row.get('Contact Email', '') or '',
+            'Phone': row.get('Contact Phone Number', '') or '',
+            'Title': row.get('Job Title', '') or '',
+            'LeadSource': 'miEdge',
+            'OwnerId': owner_id,
+            'Current_Provider__c': current_provider if current_provider in valid_providers else 'Unknown',
+            'NumberOfEmployees': row.get('Employees', '') or '',
+            'Website': row.get('Website', '') or '',
+            'Industry': (row.get('Industry', '') or '')[:255],
+            'Company_Phone__c': row.get('Phone Number', '') or '',
+            'LinkedIn__c': row.get('LinkedIn', '') or '',
+            'Street': row.get('Contact Address', '') or '',
+            'City': row.get('Contact City', '') or '',
+            'State': row.get('Contact State', '') or '',
+            'PostalCode': f"{row.get('Contact Zip', '')}-{row.get('Contact Zip4', '')}" if row.get('Contact Zip4', '') else row.get('Contact Zip', ''),
+            'Facebook__c': row.get('Facebook', '') or '',
+            'Twitter__c': row.get('Twitter', '') or '',
+            'NAICS_Description__c': row.get('NAICS Description', '')[:150] or '',
+            'Primary_NAICS__c': row.get('NAICS Code', '') or '',
+            'OSHA__c': row.get('OSHA', '') or '',
+            'Lead_Source_Other__c': row.get('PEO (Normalized)', '') or '',
+            'WHD__c': row.get('WHD', '') or '',
+            'Fidelity_Bond__c': row.get('Fidelity Bond', '') or '',
+            'Revenue_Range__c': row.get('Revenue Range', '') or '',
+            'Benefits_Broker__c': row.get('Benefits Broker', '') or '',
+            'Accounting_Firm__c': row.get('Accounting Firm', '') or '',
+            'Workers_Compensation_Carrier__c': row.get("Workers' Compensation Carrier", '') or '',
+            'Workers_Comp_Renewal_Date__c': clean_date(row.get("Workers' Compensation Renewal Date", '') or ''),
+            'BIPD_Carrier__c': row.get("BIPD Carrier", '') or '',
+            'BIPD_Renewal__c': clean_date(row.get("BIPD Renewal", '') or ''),
+            'Bond_Carrier__c': row.get("Bond Carrier", '') or '',
+            'Bond_Renewal__c': clean_date(row.get("Bond Renewal", '') or ''),
+            'Business_Travel__c': row.get("Business Travel", '') or '',
+            'Business_Travel_Carrier__c': row.get("Business Travel Carrier", '') or '',
+            'Business_Travel_Renewal__c': clean_date(row.get("Business Travel Renewal", '') or ''),
+            'Actuary_Name__c': row.get("Actuary Name", '') or '',
+            'Actuary_Firm_Name__c': row.get("Actuary Firm Name", '') or '',
+            'Motor_Carrier_Operation__c': row.get("Motor Carrier Operation", '') or '',
+            'Drivers__c': row.get('Drivers', '') or '',
+            'Mileage__c': row.get('Mileage', '') or '',
+            'DOT__c': row.get('DOT', '') or '',
+            'Ex_Mod__c': row.get('Ex. Mod.', '') or '',
+            'Ex_Mod_changed_in_last_30_days__c': row.get('Ex Mod changed in last 30 days', '') or '',
+        })
+    return payloads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    df = make_miedge_csv(args.rows)
+    owners = [f"005{i % 7:012d}" for i in range(len(df))]
+    valid_providers = set(PEOS[:4])
+
+    start = time.perf_counter()
+    legacy = legacy_build_lead_payloads(df, owners, valid_providers)
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    payloads = build_lead_payloads(df, owners, valid_providers)
+    vectorized_seconds = time.perf_counter() - start
+
+    # msid__c was mapped after the original loop was retired; compare the fields it produced
+    payloads = [{field: value for field, value in payload.items() if field != 'msid__c'} for payload in payloads]
+    if payloads != legacy:
+        mismatch = next(i for i, (new, old) in enumerate(zip(payloads, legacy)) if new != old)
+        raise SystemExit(f"Payload mismatch at row {mismatch}:\n{legacy[mismatch]}\n{payloads[mismatch]}")
+
+    print(f"rows:        {len(df)}")
+    print(f"iterrows:    {legacy_seconds:.2f}s")
+    print(f"column-wise: {vectorized_seconds:.2f}s")
+    print(f"speedup:     {legacy_seconds / vectorized_seconds:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
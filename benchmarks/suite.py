@@ -0,0 +1,227 @@
+"""
+Time every stage of an upload, from CSV parse to push, on synthetic miEdge exports.
+
+    python benchmarks/suite.py --rows 10000 100000 1000000 --output results.json
+    python benchmarks/suite.py --rows 100000 --baseline results.json
+
+Each export has every column LEAD_FIELD_MAP reads plus filler columns, a long tail of
+job titles in which roughly one contact in six is an executive, a skewed PEO mix and
+several contacts per company. Stages are timed separately:
+
+    csv_parse          read_miedge_csv, the columns the app uses, no filters
+    executive_filter   EXECUTIVE_TITLES-style classification with a cold cache
+    title_options      the job title / PEO options job_title_selector shows
+    filtered_ingest    streaming read with the default selection applied per chunk
+    company_keys       company_keys (fuzzy company grouping) on the filtered rows
+    company_selection  select_one_lead_per_company on the filtered rows
+    payload_mapping    build_lead_payloads on the selected leads
+    push_<mode>        run_push of --push-rows leads against the fake Salesforce org
+
+The fake org is a requests transport adapter rather than a socket server, because
+simple_salesforce only speaks https; --latency adds a delay to every API call.
+Results are written as JSON; with --baseline each stage is also compared to an
+earlier run.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep benchmark pushes out of the app's checkpoint database
+os.environ.setdefault('MIEDGE_CHECKPOINT_DB', os.path.join(tempfile.mkdtemp(prefix='miedge-bench-'), 'checkpoints.sqlite3'))
+
+from fake_salesforce import connect  # noqa: E402
+from miedge_pipeline import (LEAD_FIELD_MAP, ExecutiveTitleClassifier, LeadPipeline, build_lead_payloads,  # noqa: E402
+                             company_keys, content_hash, fill_blank, filter_leads, read_miedge_csv,
+                             select_one_lead_per_company)
+from push_jobs import PushJob, run_push  # noqa: E402
+from salesforce_metadata import SalesforceMetadataCache  # noqa: E402
+
+# (title, weight): executives first, then the long tail miEdge exports are mostly made of
+EXECUTIVE_TITLE_WEIGHTS = [
+    ('CEO', 30), ('President', 25), ('Owner', 25), ('Chief Executive Officer', 12), ('Founder & CEO', 6),
+    ('CFO', 10), ('COO', 6), ('Co-Owner', 6), ('President & CEO', 5), ('Managing Director', 4),
+    ('Chief Financial Officer', 4), ('CTO', 3), ('Chairman', 2), ('CHRO', 1), ('Managing Partner', 2),
+]
+OTHER_TITLE_WEIGHTS = [
+    ('Office Manager', 40), ('HR Manager', 30), ('Controller', 20), ('Payroll Specialist', 20),
+    ('Director of Human Resources', 15), ('VP of Sales', 12), ('Accountant', 15), ('Sales Associate', 15),
+    ('Assistant to the CEO', 4), ('Executive Assistant', 8), ('Operations Manager', 14), ('Bookkeeper', 12),
+]
+PEO_WEIGHTS = [
+    ('ADP TotalSource', 30), ('Insperity', 20), ('TriNet', 15), ('Justworks', 10), ('Paychex', 10),
+    ('Oasis', 5), ('Vensure', 4), ('Rippling PEO', 3), (None, 3),
+]
+STATES = ['TX', 'FL', 'CA', 'NY', 'GA', 'NC', 'AZ', 'OH', 'IL', 'PA']
+INDUSTRIES = ['Construction', 'Retail', 'Professional Services', 'Healthcare', 'Manufacturing', 'Hospitality']
+DATE_VALUES = ['01/15/2025', '2025-03-01', '7/4/2024', '12/31/2025', 'not a date', None]
+FILLER_COLUMNS = 15  # miEdge exports carry many columns the app never reads
+PUSH_MODES = ['collections', 'bulk']
+
+
+def _weighted(rng, weights, rows):
+    values = [value for value, _ in weights]
+    p = np.array([weight for _, weight in weights], dtype=float)
+    return rng.choice(np.array(values, dtype=object), size=rows, p=p / p.sum())
+
+
+def _blanked(rng, values, share):
+    values = np.asarray(values, dtype=object)
+    values[rng.random(len(values)) < share] = None
+    return values
+
+
+def make_export(rows, seed=16):
+    rng = np.random.default_rng(seed)
+    companies = max(1, rows // 3)
+    company_ids = rng.integers(0, companies, rows)
+    row_ids = np.arange(rows).astype(str)
+    executive_share = 1 / 6
+
+    data = {}
+    for header, _, transform in LEAD_FIELD_MAP:
+        for name in (header if isinstance(header, tuple) else (header,)):
+            if name and name not in data:
+                data[name] = _blanked(rng, [f"{name} {value}" for value in rng.integers(0, 5000, rows)], 0.2)
+            if transform == 'date':
+                data[name] = _weighted(rng, [(value, 1) for value in DATE_VALUES], rows)
+
+    is_executive = rng.random(rows) < executive_share
+    titles = _weighted(rng, OTHER_TITLE_WEIGHTS, rows)
+    titles[is_executive] = _weighted(rng, EXECUTIVE_TITLE_WEIGHTS, int(is_executive.sum()))
+    data.update({
+        'MSID': (company_ids * 10 + rng.integers(0, 10, rows)).astype(str),
+        'Contact First Name': np.array([f"First{i}" for i in row_ids], dtype=object),
+        'Contact Last Name': np.array([f"Last{i}" for i in row_ids], dtype=object),
+        'Contact Company name': np.array([f"Company {c} LLC" for c in company_ids], dtype=object),
+        'Contact Email': np.array([f"contact{i}@company{c}.example.com" for i, c in zip(row_ids, company_ids)], dtype=object),
+        'Contact Phone Number': np.array([f"555-{i % 1000:03d}-{i % 10000:04d}" for i in range(rows)], dtype=object),
+        'Job Title': titles,
+        'PEO (Normalized)': _weighted(rng, PEO_WEIGHTS, rows),
+        'Contact State': rng.choice(STATES, rows),
+        'Industry': rng.choice(INDUSTRIES, rows),
+        'Employees': rng.integers(5, 500, rows),
+        'Contact Zip': rng.integers(10000, 99999, rows),
+        'Contact Zip4': _blanked(rng, rng.integers(1000, 9999, rows).astype(str), 0.6),
+    })
+    for column in range(FILLER_COLUMNS):
+        data[f"Extra Field {column + 1}"] = _blanked(rng, [f"value {value}" for value in rng.integers(0, 100, rows)], 0.3)
+    return pd.DataFrame(data)
+
+
+def timed(results, stage, func, rows_in=None):
+    start = time.perf_counter()
+    value = func()
+    seconds = time.perf_counter() - start
+    frame = value[0] if isinstance(value, tuple) else value
+    rows_out = len(frame) if isinstance(frame, (pd.DataFrame, list)) else None
+    results[stage] = {'seconds': round(seconds, 4), 'rows_in': rows_in, 'rows_out': rows_out}
+    print(f"  {stage:<20} {seconds:9.3f}s  {rows_in if rows_in is not None else '':>9} -> {rows_out if rows_out is not None else ''}")
+    return value
+
+
+def push_leads(df, mode, latency):
+    sf, fake = connect(users={f"005BENCH{i:07d}": f"Sales User {i}" for i in range(6)}, latency=latency)
+    job = PushJob('bench', mode)
+    run_push(job, sf, df, 'Lead', SalesforceMetadataCache(), mode, resume=False, match_on=())
+    snapshot = job.snapshot()
+    return {'api_calls': fake.request_count, 'created': snapshot['success_count'], 'failed': snapshot['failed_count']}
+
+
+def run_size(rows, workdir, push_rows, latency, push_modes):
+    print(f"{rows} rows")
+    path = os.path.join(workdir, f"miedge-{rows}.csv")
+    make_export(rows).to_csv(path, index=False)
+    file_bytes = os.path.getsize(path)
+    stages = {}
+
+    with open(path, 'rb') as source:
+        upload_hash = content_hash(source.read())
+
+        df, total_rows = timed(stages, 'csv_parse', lambda: read_miedge_csv(source), rows)
+        classifier = ExecutiveTitleClassifier()
+        timed(stages, 'executive_filter', lambda df=df: df[classifier.classify(df['Job Title'])], total_rows)
+        del df
+
+        options = timed(stages, 'title_options', lambda: LeadPipeline().title_options(upload_hash, source), rows)
+        stages['title_options']['rows_out'] = len(options['preselected_titles']) + len(options['unselected_titles'])
+        selection = (options['preselected_titles'], options['peos'])
+        filtered, _ = timed(stages, 'filtered_ingest',
+                            lambda: read_miedge_csv(source, chunk_filter=lambda chunk: filter_leads(chunk, *selection)), rows)
+
+    keys = timed(stages, 'company_keys', lambda: company_keys(filtered['Contact Company name'], fuzzy=True), len(filtered))
+    stages['company_keys']['rows_out'] = int(keys.nunique())
+    filtered['__company_key'] = keys
+    selected = timed(stages, 'company_selection', lambda: select_one_lead_per_company(filtered), len(filtered))
+    owners = ['005BENCH0000000'] * len(selected)
+    timed(stages, 'payload_mapping', lambda: build_lead_payloads(fill_blank(selected), owners), len(selected))
+
+    to_push = selected.head(push_rows)
+    for mode in push_modes:
+        start = time.perf_counter()
+        outcome = push_leads(to_push, mode, latency)
+        seconds = time.perf_counter() - start
+        stages[f"push_{mode}"] = {'seconds': round(seconds, 4), 'rows_in': len(to_push), 'rows_out': outcome['created'], **outcome}
+        print(f"  {'push_' + mode:<20} {seconds:9.3f}s  {len(to_push):>9} -> {outcome['created']} ({outcome['api_calls']} API calls)")
+
+    os.remove(path)
+    return {'rows': rows, 'file_bytes': file_bytes, 'stages': stages}
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as handle:
+        baseline = {run['rows']: run['stages'] for run in json.load(handle)['runs']}
+    print(f"\ncompared to {baseline_path} (ratio > 1 is slower):")
+    for run in results['runs']:
+        before = baseline.get(run['rows'])
+        if not before:
+            continue
+        for stage, timing in run['stages'].items():
+            if stage in before and before[stage]['seconds']:
+                ratio = timing['seconds'] / before[stage]['seconds']
+                flag = '  <-- slower' if ratio > 1.2 else ''
+                print(f"  {run['rows']:>8} {stage:<20} {before[stage]['seconds']:9.3f}s -> {timing['seconds']:9.3f}s  x{ratio:.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--push-rows', type=int, default=2000, help='leads pushed per mode (0 skips the push)')
+    parser.add_argument('--push-modes', nargs='+', default=PUSH_MODES, choices=['single', 'collections', 'bulk'])
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every fake API call')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='earlier --output file to compare against')
+    args = parser.parse_args()
+
+    results = {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.platform(),
+        'config': {'push_rows': args.push_rows, 'push_modes': args.push_modes, 'latency': args.latency},
+        'runs': [],
+    }
+    push_modes = args.push_modes if args.push_rows else []
+    with tempfile.TemporaryDirectory(prefix='miedge-bench-') as workdir:
+        for rows in args.rows:
+            results['runs'].append(run_size(rows, workdir, args.push_rows, args.latency, push_modes))
+
+    with open(args.output, 'w') as handle:
+        json.dump(results, handle, indent=2)
+    print(f"\nwrote {args.output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,394 @@
+"""
+Offline stand-in for the Salesforce REST, sObject Collections and Bulk API 2.0 endpoints used by the app.
+
+The fake is a requests transport adapter mounted on a simple_salesforce session,
+so the real client code paths run unchanged without network access:
+
+    sf, fake = connect()
+    results = bulk_insert(sf, 'Lead', records, poll_interval=0)
+
+Run `python fake_salesforce.py` for a quick end to end check of the bulk job lifecycle.
+"""
+import csv
+import io
+import itertools
+import json
+import re
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlparse
+
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from simple_salesforce import Salesforce
+
+FAKE_INSTANCE_URL = 'https://fake.my.salesforce.com'
+API_PATH = re.compile(r'^/services/data/v[\d.]+/(?P<path>.*)$')
+MAX_URI_LENGTH = 16384  # Salesforce answers longer request URIs with 414
+IN_QUERY = re.compile(r'^SELECT\s+(?P<fields>.+?)\s+FROM\s+(?P<object>\w+)\s+WHERE\s+(?P<field>[\w.]+)\s+IN\s*\((?P<values>.*)\)\s*$',
+                      re.IGNORECASE | re.DOTALL)
+SOQL_LITERAL = re.compile(r"'((?:[^'\\]|\\.)*)'")
+
+
+class FakeSalesforceAdapter(BaseAdapter):
+    def __init__(self, users=None, latency=0.0, reject=None, outage=None, picklists=None, api_limit=15000, api_used=0,
+                 throttle=None, stuck_jobs=False, job_row_limit=None):
+        super().__init__()
+        # users: {user_id: name} returned for the round robin User query
+        # picklists: {field name: (values, restricted)} served by the Lead describe
+        # latency: seconds to sleep per request, to mimic a real org
+        # reject: optional callable(record) -> (error_code, message) or None
+        # outage: optional callable(method, path) -> True to answer with a 503
+        # api_limit, api_used: the org's daily API requests, reported in Sforce-Limit-Info and /limits;
+        # requests beyond the limit are refused with REQUEST_LIMIT_EXCEEDED
+        # throttle: optional callable(method, path) -> True to refuse a request on the concurrent request limit
+        # stuck_jobs: Bulk API jobs never get past InProgress (a stuck org queue) until this is set back to False
+        # job_row_limit: a Bulk API job fails after processing this many rows; the rest are unprocessed records
+        self.users = users or {}
+        self.latency = latency
+        self.reject = reject
+        self.outage = outage
+        self.api_limit = api_limit
+        self.api_used = api_used
+        self.throttle = throttle
+        self.stuck_jobs = stuck_jobs
+        self.job_row_limit = job_row_limit
+        self.picklists = picklists or {}
+        self.records = {}
+        self.jobs = {}
+        self.request_count = 0
+        self.in_flight = 0
+        self.max_in_flight = 0  # Most requests the org was answering at once
+        self.updates = 0
+        self._emails = set()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    # =======================
+    # Transport
+    # =======================
+    def send(self, request, **kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return self._send(request)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _send(self, request):
+        if self.latency:
+            time.sleep(self.latency)
+
+        url = urlparse(request.url)
+        match = API_PATH.match(url.path)
+        with self._lock:
+            self.request_count += 1
+            if not match:
+                return self._response(request, 404, [{'errorCode': 'NOT_FOUND', 'message': url.path}])
+            if len(request.url) > MAX_URI_LENGTH:
+                return self._response(request, 414, [{'errorCode': 'URI_TOO_LONG', 'message': 'Request-URI Too Long'}])
+            path = match.group('path').rstrip('/')
+            if self.outage and self.outage(request.method, path):
+                return self._response(request, 503, [{'errorCode': 'SERVER_UNAVAILABLE', 'message': 'Service Unavailable'}])
+            if self.throttle and self.throttle(request.method, path):
+                return self._response(request, 403, [{'errorCode': 'REQUEST_LIMIT_EXCEEDED',
+                                                      'message': 'ConcurrentPerOrgLongTxn Limit exceeded.'}])
+            if self.api_used >= self.api_limit:
+                return self._response(request, 403, [{'errorCode': 'REQUEST_LIMIT_EXCEEDED',
+                                                      'message': 'TotalRequests Limit exceeded.'}])
+            self.api_used += 1
+            return self._route(request, request.method, path, parse_qs(url.query))
+
+    def close(self):
+        pass
+
+    def _response(self, request, status, body=None, content_type='application/json'):
+        response = Response()
+        response.status_code = status
+        response.request = request
+        response.url = request.url
+        response.encoding = 'utf-8'
+        response.headers = CaseInsensitiveDict({'Content-Type': content_type,
+                                                'Sforce-Limit-Info': f"api-usage={self.api_used}/{self.api_limit}"})
+        if body is None:
+            response._content = b''
+        elif isinstance(body, bytes):
+            response._content = body
+        else:
+            response._content = json.dumps(body).encode('utf-8')
+        return response
+
+    def _body(self, request):
+        body = request.body or b''
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        return body
+
+    def _route(self, request, method, path, params):
+        parts = path.split('/')
+
+        if path == 'limits' and method == 'GET':
+            return self._response(request, 200, {'DailyApiRequests': {'Max': self.api_limit,
+                                                                      'Remaining': self.api_limit - self.api_used}})
+
+        if parts[0] == 'sobjects' and len(parts) == 2 and method == 'POST':
+            record = json.loads(self._body(request))
+            outcome = self._insert(parts[1], record)
+            if outcome['success']:
+                return self._response(request, 201, {'id': outcome['id'], 'success': True, 'errors': []})
+            return self._response(request, 400, [outcome['error']])
+
+        if parts[0] == 'sobjects' and len(parts) == 4 and method == 'PATCH':
+            # Single record upsert: sobjects/<object>/<external id field>/<value>
+            outcome = self._upsert(parts[1], parts[2], dict(json.loads(self._body(request)), **{parts[2]: unquote(parts[3])}))
+            if not outcome['success']:
+                return self._response(request, 400, [outcome['error']])
+            if outcome['created']:
+                return self._response(request, 201, {'id': outcome['id'], 'success': True, 'errors': [], 'created': True})
+            return self._response(request, 204)
+
+        if parts[0] == 'sobjects' and parts[2:] == ['describe'] and method == 'GET':
+            return self._response(request, 200, self._describe(parts[1]))
+
+        if parts[:2] == ['composite', 'sobjects'] and (method == 'POST' and len(parts) == 2
+                                                       or method == 'PATCH' and len(parts) == 4):
+            body = json.loads(self._body(request))
+            results = []
+            for record in body['records']:
+                record = dict(record)
+                object_name = record.pop('attributes')['type']
+                if method == 'PATCH':
+                    outcome = self._upsert(object_name, parts[3], record)
+                else:
+                    outcome = self._insert(object_name, record)
+                if outcome['success']:
+                    results.append({'id': outcome['id'], 'success': True, 'errors': [],
+                                    **({'created': outcome['created']} if 'created' in outcome else {})})
+                else:
+                    error = outcome['error']
+                    results.append({'success': False, 'errors': [
+                        {'statusCode': error['errorCode'], 'message': error['message'], 'fields': []}
+                    ]})
+            return self._response(request, 200, results)
+
+        if parts[0] == 'query' and method == 'GET':
+            return self._response(request, 200, self._query(params.get('q', [''])[0]))
+
+        if parts[:2] == ['jobs', 'ingest']:
+            return self._route_ingest(request, method, parts[2:])
+
+        return self._response(request, 404, [{'errorCode': 'NOT_FOUND', 'message': path}])
+
+    # =======================
+    # Records and Queries
+    # =======================
+    def _insert(self, object_name, record):
+        rejected = self.reject(record) if self.reject else None
+        if rejected:
+            code, message = rejected
+            return {'success': False, 'error': {'errorCode': code, 'message': message, 'fields': []}}
+
+        email = (record.get('Email') or '').strip().lower()
+        if email and email in self._emails:
+            return {'success': False, 'error': {
+                'errorCode': 'DUPLICATES_DETECTED',
+                'message': 'Use one of these records?',
+                'fields': []
+            }}
+        if email:
+            self._emails.add(email)
+
+        record_id = f"00Q{next(self._ids):012d}"
+        self.records[record_id] = dict(record, attributes={'type': object_name})
+        return {'success': True, 'id': record_id}
+
+    def _upsert(self, object_name, external_id_field, record):
+        external_id = record.get(external_id_field)
+        if not external_id:
+            return {'success': False, 'error': {'errorCode': 'MISSING_ARGUMENT',
+                                                'message': f'{external_id_field} not specified', 'fields': []}}
+        for record_id, existing in self.records.items():
+            if existing['attributes']['type'] == object_name and existing.get(external_id_field) == external_id:
+                existing.update(record)
+                self.updates += 1
+                return {'success': True, 'id': record_id, 'created': False}
+
+        outcome = self._insert(object_name, record)
+        if outcome['success']:
+            outcome['created'] = True
+        return outcome
+
+    def _describe(self, object_name):
+        fields = [{'name': 'Email', 'type': 'email', 'picklistValues': []},
+                  {'name': 'msid__c', 'type': 'string', 'externalId': True, 'picklistValues': []}]
+        for name, (values, restricted) in self.picklists.items():
+            fields.append({
+                'name': name,
+                'type': 'picklist',
+                'restrictedPicklist': restricted,
+                'picklistValues': [{'value': value, 'active': True} for value in values]
+            })
+        return {'name': object_name, 'fields': fields}
+
+    def _query(self, soql):
+        lookup = IN_QUERY.match(soql.strip())
+        if re.search(r'\bFROM\s+User\b', soql, re.IGNORECASE):
+            rows = [{'attributes': {'type': 'User'}, 'Id': user_id, 'Name': name}
+                    for user_id, name in self.users.items()]
+        elif lookup:
+            rows = self._lookup(lookup)
+        else:
+            rows = []
+        return {'totalSize': len(rows), 'done': True, 'records': rows}
+
+    def _lookup(self, lookup):
+        # SELECT <fields> FROM <object> WHERE <field> IN ('a', 'b'); text comparison is case-insensitive like SOQL
+        object_name = lookup.group('object')
+        wanted = {re.sub(r'\\(.)', r'\1', value).lower() for value in SOQL_LITERAL.findall(lookup.group('values'))}
+        fields = [field.strip() for field in lookup.group('fields').split(',')]
+
+        rows = []
+        for record_id, record in self.records.items():
+            if record['attributes']['type'].lower() != object_name.lower():
+                continue
+            value = _field_value(record, lookup.group('field'))
+            if value is None or str(value).lower() not in wanted:
+                continue
+            row = {'attributes': {'type': record['attributes']['type']}}
+            for field in fields:
+                if field == 'Id':
+                    row['Id'] = record_id
+                elif '.' in field:
+                    parent, name = field.split('.', 1)
+                    row[parent] = {name: _field_value(record, field)}
+                else:
+                    row[field] = record.get(field)
+            rows.append(row)
+        return rows
+
+    # =======================
+    # Bulk API 2.0 Ingest Jobs
+    # =======================
+    def _route_ingest(self, request, method, parts):
+        if not parts and method == 'POST':
+            spec = json.loads(self._body(request))
+            job_id = f"750{next(self._ids):012d}"
+            self.jobs[job_id] = {
+                'id': job_id,
+                'object': spec['object'],
+                'operation': spec['operation'],
+                'externalIdFieldName': spec.get('externalIdFieldName'),
+                'state': 'Open',
+                'numberRecordsProcessed': 0,
+                'numberRecordsFailed': 0,
+                'data': b'',
+                'results': None,
+                'unprocessed': []
+            }
+            return self._response(request, 200, self._job_info(self.jobs[job_id]))
+
+        job = self.jobs.get(parts[0]) if parts else None
+        if job is None:
+            return self._response(request, 404, [{'errorCode': 'NOT_FOUND', 'message': 'Unknown job'}])
+
+        if parts[1:] == ['batches'] and method == 'PUT':
+            if job['state'] != 'Open':
+                return self._response(request, 400, [{'errorCode': 'INVALIDJOBSTATE', 'message': job['state']}])
+            job['data'] = self._body(request)
+            return self._response(request, 201)
+
+        if len(parts) == 1 and method == 'PATCH':
+            job['state'] = json.loads(self._body(request))['state']
+            return self._response(request, 200, self._job_info(job))
+
+        if len(parts) == 1 and method == 'GET':
+            self._advance_job(job)
+            return self._response(request, 200, self._job_info(job))
+
+        if len(parts) == 2 and method == 'GET':
+            return self._job_results(request, job, parts[1])
+
+        return self._response(request, 405, [{'errorCode': 'METHOD_NOT_ALLOWED', 'message': method}])
+
+    def _job_info(self, job):
+        return {key: value for key, value in job.items() if key not in ('data', 'results', 'unprocessed')}
+
+    def _advance_job(self, job):
+        # Each status check moves the job one step: UploadComplete -> InProgress -> JobComplete
+        if job['state'] == 'UploadComplete':
+            job['state'] = 'InProgress'
+        elif job['state'] == 'InProgress' and not self.stuck_jobs:
+            rows = list(csv.DictReader(io.StringIO(job['data'].decode('utf-8'))))
+            if self.job_row_limit is not None and len(rows) > self.job_row_limit:
+                rows, job['unprocessed'] = rows[:self.job_row_limit], rows[self.job_row_limit:]
+            if job['operation'] == 'upsert':
+                # Blank cells leave existing values alone, as in Bulk API 2.0
+                job['results'] = [(row, self._upsert(job['object'], job['externalIdFieldName'],
+                                                     {field: value for field, value in row.items() if value != ''}))
+                                  for row in rows]
+            else:
+                job['results'] = [(row, self._insert(job['object'], row)) for row in rows]
+            job['numberRecordsProcessed'] = len(rows)
+            job['numberRecordsFailed'] = sum(1 for _, outcome in job['results'] if not outcome['success'])
+            job['state'] = 'Failed' if job['unprocessed'] else 'JobComplete'
+            if job['unprocessed']:
+                job['errorMessage'] = f"Job stopped after {len(rows)} records: limit reached"
+
+    def _job_results(self, request, job, result_type):
+        results = job['results'] or []
+        # Real jobs do not return results in upload order, so neither does the fake
+        results = list(reversed(results))
+        sample = results[0][0] if results else (job['unprocessed'] or [{}])[0]
+        fieldnames = list(sample.keys())
+
+        if result_type == 'successfulResults':
+            prefix = ['sf__Id', 'sf__Created']
+            rows = [dict(row, sf__Id=outcome['id'], sf__Created='true' if outcome.get('created', True) else 'false')
+                    for row, outcome in results if outcome['success']]
+        elif result_type == 'failedResults':
+            prefix = ['sf__Id', 'sf__Error']
+            rows = [dict(row, sf__Id='', sf__Error=f"{outcome['error']['errorCode']}:{outcome['error']['message']}")
+                    for row, outcome in results if not outcome['success']]
+        elif result_type == 'unprocessedrecords':
+            prefix = []
+            rows = list(reversed(job['unprocessed']))
+        else:
+            return self._response(request, 404, [{'errorCode': 'NOT_FOUND', 'message': result_type}])
+
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=prefix + fieldnames, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(rows)
+        return self._response(request, 200, buffer.getvalue().encode('utf-8'), content_type='text/csv')
+
+
+def _field_value(record, field):
+    # 'Account.Name' reads the nested parent record, as SOQL relationship fields do
+    value = record
+    for name in field.split('.'):
+        value = value.get(name) if isinstance(value, dict) else None
+    return value
+
+
+def connect(**adapter_options):
+    adapter = FakeSalesforceAdapter(**adapter_options)
+    sf_instance = Salesforce(instance_url=FAKE_INSTANCE_URL, session_id='00DFAKE!offline-session')
+    sf_instance.session.mount(FAKE_INSTANCE_URL, adapter)
+    return sf_instance, adapter
+
+
+if __name__ == '__main__':
+    from salesforce_push import bulk_insert
+
+    sf, fake = connect()
+    sample = [
+        {'FirstName': 'Ada', 'LastName': 'Lovelace', 'Company': 'Analytical, Inc.', 'Email': 'ada@example.com'},
+        {'FirstName': 'Grace', 'LastName': 'Hopper', 'Company': 'Navy', 'Email': 'grace@example.com'},
+        {'FirstName': 'Ada', 'LastName': 'Again', 'Company': 'Analytical, Inc.', 'Email': 'ada@example.com'},
+    ]
+    for record, result in zip(sample, bulk_insert(sf, 'Lead', sample, poll_interval=0)):
+        print(record['Email'], result)
+    print(f"{fake.request_count} requests, {len(fake.records)} records created")
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+# =======================
+# Frame Store Settings
+# =======================
+FRAME_STORE_PATH = os.environ.get('MIEDGE_FRAME_STORE') or os.path.join(tempfile.gettempdir(), 'miedge_frames')
+FRAME_STORE_RETENTION_DAYS = 7  # Uploads not read for this long are deleted
+
+
+def step_name(key):
+    # A file name for a step's result: 'name' as is, ('leads', *parameters) -> 'leads-<digest>'
+    if isinstance(key, str):
+        return key
+    step, *params = key
+    digest = hashlib.blake2b(json.dumps(params, default=str).encode('utf-8'), digest_size=8).hexdigest()
+    return f"{step}-{digest}"
+
+
+class FrameStore:
+    """
+    Parsed and filtered upload frames on disk as Parquet, one directory per upload
+    content hash, so a rerun after a server restart (or a resumed session, or the
+    nightly CLI run on the same export) memory-maps the frames instead of re-parsing
+    the CSV. Writes are atomic; a frame Parquet can't hold is simply not stored.
+    """
+
+    def __init__(self, path=FRAME_STORE_PATH, retention_days=FRAME_STORE_RETENTION_DAYS):
+        self.path = path
+        self.retention_days = retention_days
+        os.makedirs(path, exist_ok=True)
+        self._expire_old_uploads()
+
+    def _expire_old_uploads(self):
+        cutoff = time.time() - self.retention_days * 24 * 60 * 60
+        for entry in os.scandir(self.path):
+            if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def _file(self, upload_hash, key, suffix):
+        return os.path.join(self.path, upload_hash, step_name(key) + suffix)
+
+    def _write(self, path, write):
+        # Write next to the target and rename over it, so readers never see half a file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(handle)
+        try:
+            write(temporary)
+            os.replace(temporary, path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+    def _touch(self, upload_hash):
+        # Reading an upload keeps it from expiring
+        try:
+            os.utime(os.path.join(self.path, upload_hash))
+        except OSError:
+            pass
+
+    def load_frame(self, upload_hash, key):
+        path = self._file(upload_hash, key, '.parquet')
+        if not os.path.exists(path):
+            return None
+        self._touch(upload_hash)
+        return pd.read_parquet(path, memory_map=True)
+
+    def save_frame(self, upload_hash, key, df):
+        # True when stored; mixed-type object columns and full disks are skipped, not fatal
+        try:
+            self._write(self._file(upload_hash, key, '.parquet'), lambda path: df.to_parquet(path))
+        except (pa.ArrowException, ValueError, TypeError, OSError):
+            return False
+        return True
+
+    def load_meta(self, upload_hash, key):
+        path = self._file(upload_hash, key, '.json')
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as handle:
+            return json.load(handle)
+
+    def save_meta(self, upload_hash, key, meta):
+        def write(path):
+            with open(path, 'w', encoding='utf-8') as handle:
+                json.dump(meta, handle, default=str)
+        try:
+            self._write(self._file(upload_hash, key, '.json'), write)
+        except (TypeError, ValueError, OSError):
+            return False
+        return True
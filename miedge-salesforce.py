@@ -2,12 +2,18 @@ import os
 os.environ["STREAMLIT_WATCHDOG"] = "none"
 import streamlit as st
 import pandas as pd
-import re
 import requests
 from simple_salesforce import Salesforce
-import io
 import warnings
 import os
+from frame_store import FrameStore
+from miedge_pipeline import (COMPANY_COLUMNS, PREVIEW_PAGE_SIZES, LeadPipeline, batch_hash, build_lead_payloads,
+                             content_hash, fill_blank)
+from push_jobs import INSERT, UPSERT, PushJobManager, push_key, retry_failed, run_push
+from salesforce_duplicates import DEFAULT_MATCH_KINDS, FLAG, OFF, SKIP, DuplicateIndex
+from salesforce_metadata import SalesforceMetadataCache
+from salesforce_push import MAX_PUSH_WORKERS, PUSH_WORKERS
+from stage_metrics import StageMetrics, instrument_session, record_response
 
 st.set_page_config(
     page_title="ESI miEdge-Salesforce Integration",  # This sets the title in the browser tab
@@ -44,14 +50,55 @@ def initiate_salesforce_auth():
     auth_link = f"{AUTH_URL}?response_type=code&client_id={CLIENT_ID}&redirect_uri={REDIRECT_URI}"
     st.write(f"[🔗 Click here to connect to Salesforce]({auth_link})")
 
+@st.cache_resource
+def get_metadata_cache():
+    # One cache per server process, shared by every rerun and session; entries are keyed by org
+    return SalesforceMetadataCache()
+
+
+def get_stage_metrics():
+    # Timings for this session's sign-in and upload steps; each push keeps its own on the job
+    if 'stage_metrics' not in st.session_state:
+        st.session_state.stage_metrics = StageMetrics()
+    return st.session_state.stage_metrics
+
+
+def show_stage_metrics(title, metrics, key):
+    rows = metrics.summary()
+    if not rows:
+        return
+    with st.expander(title):
+        st.caption("Wall time, Salesforce API calls, bytes sent and per-record latency for each step.")
+        st.dataframe(pd.DataFrame(rows), hide_index=True)
+        st.download_button(
+            label="📥 Download Timing Log (JSON lines)",
+            data=metrics.to_json_lines(),
+            file_name='stage_timings.jsonl',
+            mime='application/x-ndjson',
+            key=key
+        )
+
+
+def lazy_download_button(label, make_data, file_name, mime, key):
+    """
+    A download whose file is only built once asked for: the first click prepares it
+    (make_data() -> bytes), after which the download button itself is shown. Reruns
+    before that never serialize anything.
+    """
+    prepared = st.session_state.setdefault('prepared_downloads', set())
+    if key in prepared:
+        st.download_button(label=label, data=make_data(), file_name=file_name, mime=mime, key=key)
+    elif st.button(f"📄 Prepare: {label.lstrip('📥 ')}", key=f"prepare_{key}"):
+        prepared.add(key)
+        st.rerun()
+
+
 def get_valid_picklist_values(sf_instance, object_name, field_name):
-    describe = sf_instance.__getattr__(object_name).describe()
-    for field in describe['fields']:
-        if field['name'] == field_name:
-            valid_values = set(value['value'] for value in field['picklistValues'])
-            st.write(f"✅ Valid values for `{field_name}`: {valid_values}")  # This goes to the Streamlit app interface
-            return valid_values
-    return set()
+    with get_stage_metrics().stage('metadata.picklists'):
+        valid_values = get_metadata_cache().picklist_values(sf_instance, object_name, field_name)
+    if valid_values:
+        st.write(f"✅ Valid values for `{field_name}`: {valid_values}")  # This goes to the Streamlit app interface
+    return valid_values
 
 
 # =======================
@@ -66,12 +113,14 @@ def get_salesforce_token(auth_code):
         'redirect_uri': REDIRECT_URI
     }
 
-    response = requests.post(TOKEN_URL, data=data)
+    with get_stage_metrics().stage('auth.token'):
+        response = requests.post(TOKEN_URL, data=data, hooks={'response': record_response})
     if response.status_code == 200:
         token_data = response.json()
         st.success("✅ Successfully authenticated with Salesforce!")
         
         sf_instance = Salesforce(instance_url=token_data['instance_url'], session_id=token_data['access_token'])
+        instrument_session(sf_instance.session)  # Count and time every API call made through this connection
         st.session_state['salesforce'] = sf_instance  # 💾 Save Salesforce connection
 
         valid_providers = get_valid_picklist_values(sf_instance, 'Lead', 'Current_Provider__c')
@@ -83,285 +132,206 @@ def get_salesforce_token(auth_code):
         st.error(f"❌ Salesforce Authentication Failed: {response.text}")
         return None
 
-# =======================
-# Helper Function to Detect C-Level Titles
-# =======================
-def is_executive_title(title):
-    patterns = [
-        r'\bCEO\b', r'\bCFO\b', r'\bCTO\b', r'\bCIO\b', r'\bCOO\b', r'\bPresident\b',  r'\bCAO\b', r'\bOwner\b', r'\bCMO\b', r'\bCHRO\b', r'\bCLO\b', r'\bCPO\b', r'\bCRO\b', r'\bFounder\b', r'\bChairman\b', r'\bMD\b']
-
-    exclusion_patterns = [
-        r'\bHR\b', r'\bHuman Resources\b', r'\barchitect\b', r'\bcreative\b', r'\bcontent\b', r'\binnovation\b', r'\bscientist\b', r'\bnurse\b', r'\bmedical\b', r'\bpeople\b', r'\bPayroll\b', r'\bBenefits\b', r'\bAccounting\b', r'\bConstruction\b', r'\bEngineer\b', r'\bengineering\b', r'\bclinical\b',
-        r'\blending\b', r'\bresearch\b', r'\bclient\b', r'\bengine\b', r'\blearning\b', r'\bgovernment\b', r'\bloan\b',
-        r'\bmember\b', r'\btechnical\b', r'\bproperty\b', r'\bpolicy\b', r'\brevenue\b', r'\bgeology\b', r'\banalyst\b',
-        r'\baccountant\b', r'\bhealthcare\b', r'\bhealth\b', r'\bsecurity\b', r'\bcloud\b', r'\bclinic\b', r'\blegal\b', r'\bdrug\b', r'\bdiversity\b',
-        r'\bleasing\b', r'\bpastry\b', r'\butilities\b', r'\btreasurer\b', r'\bcontract\b', r'\blisting\b', r'\bgrants\b',
-        r'\bleadership\b', r'\bsports\b', r'\bquality\b', r'\btoxicology\b', r'\bpulmonary\b', r'\bmanufacturer\b',
-        r'\bindustry\b', r'\bchemistry\b', r'\bbiology\b', r'\blaboratory\b', r'\bspace\b', r'\bexecutive administrator\b',
-        r'\bpulmonary\b', r'\bvirtual\b', r'\bquality\b', r'\bphaermaceuticl\b', r'\bscience\b', r'\bsciences\b', r'\bprofessional\b',
-        r'\bparalegal\b', r'\bmembership\b', r'\bdonor\b', r'\bcurriculum\b', r'\bbioanalytics\b'
-    ]
-
-    if any(re.search(pattern, str(title), re.IGNORECASE) for pattern in patterns):
-        if not any(re.search(excl_pattern, str(title), re.IGNORECASE) for excl_pattern in exclusion_patterns):
-            return True
-
-    return False
-
 # =======================
 # Function to Push Data to Salesforce
 # =======================
 import streamlit as st
-import time  # For simulating delays in progress
-
-def clean_date(date_str):
-    if pd.isna(date_str) or date_str.strip() == '':
-        return None  # Salesforce accepts null dates
-    try:
-        # Try parsing date from various formats
-        parsed_date = pd.to_datetime(date_str, errors='coerce')
-        if pd.isna(parsed_date):
-            return None
-        return parsed_date.strftime('%Y-%m-%d')  # Convert to YYYY-MM-DD
-    except Exception as e:
-        st.warning(f"⚠️ Could not parse date: {date_str}")
-        return None
 
+PUSH_MODES = {
+    "Automatic (picked from the upload size and the org's remaining API requests)": "auto",
+    "Single record (one API call per lead)": "single",
+    "sObject Collections (200 leads per call)": "collections",
+    "Bulk API 2.0 (large uploads)": "bulk",
+}
 
-def push_to_salesforce(sf_instance, df, selected_object):
+DUPLICATE_MODES = {
+    "Skip them": SKIP,
+    "Push anyway, but flag them": FLAG,
+    "Don't check": OFF,
+}
+MATCH_LABELS = {"Email": "email", "Phone": "phone", "Company": "company"}
 
-    
-    st.session_state.sales_users = get_active_sales_users(sf_instance)
-    st.session_state.round_robin_index = 0  # Start from the first user
-    st.write("📋 Final Round Robin Users:", st.session_state.sales_users)
 
+def show_existing_records(sf_instance, df, match_on):
+    # Up-front duplicate counts for the rows about to be pushed; a few SOQL queries, no writes
+    payloads = build_lead_payloads(fill_blank(df), [''] * len(df))
+    index = DuplicateIndex.load(sf_instance, payloads, match_on)
+    counts = index.summarize(payloads)
+    if counts['total']:
+        details = ", ".join(f"{kind}: {counts[kind]}" for kind in index.match_on if counts[kind])
+        st.warning(f"🔎 {counts['total']} of {len(payloads)} leads already exist in Salesforce ({details}).")
+    else:
+        st.success(f"🔎 None of the {len(payloads)} leads were found in Salesforce.")
 
-    sales_users = list(st.session_state.sales_users.keys())
-    total_users = len(sales_users)
-    st.write("📋 Total Users:", total_users)
 
-    assign_owner = total_users > 0
-    
-    df_cleaned = df.fillna('')
-
-    total_records = len(df_cleaned)
-    success_count = 0
-    failed_count = 0
-    duplicate_count = 0
-
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    success_counter = st.empty()
-    duplicate_counter = st.empty()
-    failed_counter = st.empty()
-    failed_messages = []
-    # Add list to track assignments
-    assignment_log = []
-
-
-    status_text.text("🚀 Starting upload to Salesforce... PLEASE KEEP THIS WINDOW OPEN DURING THE OPERATION! If the session disconnects at any point, just click on the '🚀 Push Filtered Data to Salesforce' button again")
-
-    for idx, (_, row) in enumerate(df_cleaned.iterrows()):
-        # Extract and map fields from DataFrame
-        if assign_owner:
-            owner_id = sales_users[st.session_state.round_robin_index]
-            user_name = st.session_state.sales_users.get(owner_id, owner_id)
-            st.session_state.round_robin_index = (st.session_state.round_robin_index + 1) % total_users
-            st.write("📋 Owner id", owner_id)
-            if owner_id == "0051U00000AVuYnQAL" or owner_id == "005Ql000003g6NRIAY" :
-                st.warning("⚠️ Skipping Barry (0051U00000AVuYnQAL) as lead owner.")
-                continue
-        else:
-            owner_id = "0051U00000AZSVcQAP"
-            st.warning("⚠️ No valid Salesforce users for round robin assignment. Default owner will be used (likely whoever connected OAuth).")
-        st.write("📋 Owner id2", owner_id)       
-        
-        Salutation = row.get('Contact Prefix (e.g. Dr, Prof etc.)', '') or ''
-        first_name = row.get('Contact First Name', '') or ''
-        MiddleName = row.get('Contact Middle Name (or initial)', '') or ''
-        last_name = row.get('Contact Last Name', '') or ''
-        company = row.get('Contact Company name', '') or 'Unknown'
-        email = row.get('Contact Email', '') or ''
-        phone = row.get('Contact Phone Number', '') or ''
-        job_title = row.get('Job Title', '') or ''
-        valid_providers = st.session_state.get('valid_providers', set())
-        current_provider = row.get('PEO (Normalized)', '').strip()
-        Current_Provider__c = current_provider if current_provider in valid_providers else 'Unknown' #check on this
-        NumberOfEmployees = row.get('Employees', '') or ''
-        website = row.get('Website', '') or ''
-        industry = (row.get('Industry', '') or '')[:255] #picklist
-        Company_Phone__c = row.get('Phone Number', '') or ''
-        LinkedIn__c = row.get('LinkedIn', '') or ''
-        LeadSourceOther = row.get('PEO (Normalized)', '') or ''
-        # Address = row.get('Address 1', '') or ''
-        Facebook__c = row.get('Facebook', '') or ''
-        Twitter__c = row.get('Twitter', '') or ''
-        # msid__c = row.get('MSID', '') or ''
-        naics_Description__c = row.get('NAICS Description', '')[:150] or ''
-        Company_NAICS_Code__c = row.get('NAICS Code', '') or ''
-        osha = row.get('OSHA', '') or ''
-        whd = row.get('WHD', '') or ''
-        Fidelity_Bond__c = row.get('Fidelity Bond', '') or ''
-        Revenue_Range__c = row.get('Revenue Range', '') or ''
-        Benefits_Broker__c = row.get('Benefits Broker', '') or ''
-        Accounting_Firm__c = row.get('Accounting Firm', '') or ''
-        Workers_Compensation_Carrier__c = row.get("Workers' Compensation Carrier", '') or ''
-        Workers_Comp_Renewal_Date__c = clean_date(row.get("Workers' Compensation Renewal Date", '') or '')
-        bipd = row.get("BIPD Carrier", '') or ''
-        bipd_renewal = clean_date(row.get("BIPD Renewal", '') or '')
-        Bond_Carrier__c = row.get("Bond Carrier", '') or ''
-        Bond_Renewal__c = clean_date(row.get("Bond Renewal", '') or '')
-        Business_Travel__c = row.get("Business Travel", '') or ''
-        Business_Travel_Carrier__c = row.get("Business Travel Carrier", '') or ''
-        Business_Travel_Renewal__c = clean_date(row.get("Business Travel Renewal", '') or '')
-        Actuary_Name__c = row.get("Actuary Name", '') or ''
-        Actuary_Firm_Name__c = row.get("Actuary Firm Name", '') or ''
-        Motor_Carrier_Operation__c = row.get("Motor Carrier Operation", '') or ''
-        Drivers__c = row.get('Drivers', '') or ''
-        Mileage__c = row.get('Mileage', '') or ''
-        dot = row.get('DOT', '') or ''
-        Ex_Mod__c = row.get('Ex. Mod.', '') or ''
-        Ex_Mod_changed_in_last_30_days__c = row.get('Ex Mod changed in last 30 days', '') or ''
-        # Prepare data payload for Salesforce
-        data = {
-            'Salutation': Salutation,
-            'FirstName': first_name,
-            'MiddleName': MiddleName,
-            'LastName': last_name,
-            'Company': company,
-            'Email': email,
-            'Phone': phone,
-            'Title': job_title,
-            'LeadSource': 'miEdge',
-            'OwnerId': owner_id,
-            'Current_Provider__c': Current_Provider__c,
-            'NumberOfEmployees': NumberOfEmployees,
-            'Website': website,
-            'Industry': industry,
-            'Company_Phone__c': Company_Phone__c,
-            'LinkedIn__c': LinkedIn__c,
-            'Street': row.get('Contact Address', '') or '',
-            'City': row.get('Contact City', '') or '',
-            'State': row.get('Contact State', '') or '',
-            'PostalCode': f"{row.get('Contact Zip', '')}-{row.get('Contact Zip4', '')}" if row.get('Contact Zip4', '') else row.get('Contact Zip', ''),
-            'Facebook__c': Facebook__c,
-            'Twitter__c': Twitter__c,
-            'NAICS_Description__c': naics_Description__c,
-            'Primary_NAICS__c': Company_NAICS_Code__c,
-            'OSHA__c': osha,
-            'Lead_Source_Other__c': LeadSourceOther,
-            'WHD__c': whd,
-            'Fidelity_Bond__c': Fidelity_Bond__c,
-            'Revenue_Range__c': Revenue_Range__c,
-            'Benefits_Broker__c': Benefits_Broker__c,
-            'Accounting_Firm__c': Accounting_Firm__c,
-            'Workers_Compensation_Carrier__c': Workers_Compensation_Carrier__c,
-            'Workers_Comp_Renewal_Date__c': Workers_Comp_Renewal_Date__c,
-            'BIPD_Carrier__c': bipd,
-            'BIPD_Renewal__c': bipd_renewal,
-            'Bond_Carrier__c': Bond_Carrier__c,
-            'Bond_Renewal__c': Bond_Renewal__c,
-            'Business_Travel__c': Business_Travel__c,
-            'Business_Travel_Carrier__c': 	Business_Travel_Carrier__c,
-            'Business_Travel_Renewal__c': Business_Travel_Renewal__c,
-            'Actuary_Name__c': Actuary_Name__c,
-            'Actuary_Firm_Name__c': Actuary_Firm_Name__c,
-            'Motor_Carrier_Operation__c': Motor_Carrier_Operation__c,
-            'Drivers__c': Drivers__c,
-            'Mileage__c': Mileage__c,
-            'DOT__c': dot,
-            'Ex_Mod__c': Ex_Mod__c,
-            'Ex_Mod_changed_in_last_30_days__c': Ex_Mod_changed_in_last_30_days__c,
-
-        }   
-
-        try:
-            st.write(f"➡️ Assigning lead to user: {owner_id}")
-            # Push data to Salesforce
-            sf_instance.__getattr__(selected_object).create(data, headers={"Sforce-Auto-Assign": "FALSE"})
-            success_count += 1
-
-            # Append assignment log if success
-            assignment_log.append({
-                "Full Name": f"{first_name} {MiddleName} {last_name}".strip(),
-                "Job Title": job_title,
-                "Company": company,
-                "Assigned To": user_name,
-                'Phone': phone,
-                "Email": email,
-                "Number of Employees": NumberOfEmployees,
-                "Current Provider": current_provider             
-            })
-
-        except Exception as e:
-            error_message = str(e)
-
-            # Handle duplicate errors
-            if 'DUPLICATES_DETECTED' in error_message:
-                duplicate_count += 1
-            else:
-                failed_count += 1
-                failed_messages.append(f"Row {idx+1}: {error_message}")
+@st.cache_resource
+def get_lead_pipeline():
+    # Parsed and filtered uploads, shared by every rerun and session; keyed by file content and
+    # kept on disk as Parquet, so a restarted server doesn't re-parse a file it has seen
+    return LeadPipeline(store=FrameStore())
 
-        # Update dynamic counters and progress
-        progress = min((idx + 1) / total_records, 1.0)
-        progress_bar.progress(progress)
 
-        success_counter.markdown(f"✅ **Successful Uploads:** {success_count}")
-        duplicate_counter.markdown(f"⚠️ **Duplicates Skipped:** {duplicate_count}")
-        failed_counter.markdown(f"❌ **Failed Records:** {failed_count}")
+def get_upload_hash(uploaded_file):
+    # Hash each upload once, not on every rerun
+    hashes = st.session_state.setdefault('upload_hashes', {})
+    if uploaded_file.file_id not in hashes:
+        hashes[uploaded_file.file_id] = content_hash(uploaded_file.getbuffer())
+    return hashes[uploaded_file.file_id]
 
-        # Simulate delay for demonstration purposes (remove in production)
-        time.sleep(0.1)
-    
-    # Final status
-    status_text.text("✅ Upload Complete!")
+
+@st.cache_resource
+def get_push_jobs():
+    # One worker pool per server process: pushes outlive the script run (and page) that started them
+    return PushJobManager()
+
+
+def push_to_salesforce(sf_instance, df, selected_object, push_mode="single", workers=PUSH_WORKERS, resume=True,
+                       duplicate_mode=SKIP, match_on=DEFAULT_MATCH_KINDS, operation=INSERT):
+    job = get_push_jobs().submit(
+        f"{len(df)} {selected_object} records ({push_mode}, {operation})", run_push,
+        sf_instance, df, selected_object, get_metadata_cache(), push_mode, workers, resume,
+        duplicate_mode, match_on, operation,
+        key=push_key(sf_instance, df, selected_object, operation))
+
+    # Remember the job in the URL too, so a refreshed page picks the upload back up
+    st.session_state.push_job_id = job.id
+    st.query_params["push_job"] = job.id
+    return job
+
+
+def retry_failed_push(sf_instance, source):
+    # Only the rows that failed, from the payloads the push already built; no re-upload or re-filter
+    job = get_push_jobs().submit(
+        f"retry of {len(source.retry_rows)} failed {source.object_name} records", retry_failed,
+        sf_instance, source, key=('retry', source.id))
+    st.session_state.push_job_id = job.id
+    st.query_params["push_job"] = job.id
+    return job
+
+
+@st.fragment(run_every=1)
+def push_progress(job):
+    snapshot = job.snapshot()
+    if not snapshot['active']:
+        # Redraw the whole page once so the final summary replaces the progress bar
+        st.rerun()
+
+    st.text(snapshot['status_message'])
+    total = snapshot['total']
+    st.progress(snapshot['done'] / total if total else 0.0)
+    st.text(f"✅ Success: {snapshot['success_count']}   ⚠️ Duplicates: {snapshot['duplicate_count']}   ❌ Failed: {snapshot['failed_count']}   📊 Processed: {snapshot['done']}/{total}")
+
+
+def show_push_job(job):
+    st.markdown(f"### 🚚 Salesforce Upload: {job.label}")
+
+    if job.active:
+        push_progress(job)
+        return
+
+    snapshot = job.snapshot()
+    st.text(snapshot['status_message'])
+    for level, message in snapshot['notices']:
+        getattr(st, level)(message)
+    show_stage_metrics("⏱️ Upload Timings", job.metrics, key=f"push_metrics_{snapshot['id']}")
+    if snapshot['log']:
+        with st.expander(f"📋 Upload Diagnostics ({snapshot['log_lines']} lines)"):
+            if snapshot['log_lines'] > len(snapshot['log']):
+                st.caption(f"Showing the last {len(snapshot['log'])} lines.")
+            st.text("\n".join(snapshot['log']))
 
     # Display final counts
-    st.success(f"✅ Successfully pushed {success_count} records to Salesforce.")
-    if duplicate_count > 0:
-        st.warning(f"⚠️ Skipped {duplicate_count} duplicate records.")
-    if failed_count > 0:
-        st.error(f"❌ {failed_count} records failed due to other errors.")
+    st.success(f"✅ Successfully pushed {snapshot['success_count']} records to Salesforce.")
+    if snapshot['updated_count'] > 0:
+        st.success(f"🔁 Updated {snapshot['updated_count']} existing records with changed fields.")
+    if snapshot['unchanged_count'] > 0:
+        st.info(f"⏭️ {snapshot['unchanged_count']} existing records were already up to date and were not sent.")
+    if snapshot['duplicate_count'] > 0:
+        st.warning(f"⚠️ Skipped {snapshot['duplicate_count']} duplicate records.")
+    if snapshot['failed_count'] > 0:
+        st.error(f"❌ {snapshot['failed_count']} records failed due to other errors.")
         with st.expander("🛠 See Details for Failed Records"):
-            st.text("\n".join(failed_messages))
-    # Generate download link for assignment log
-    assignment_df = pd.DataFrame(assignment_log)
-
+            st.text("\n".join(snapshot['failed_messages']))
+        if snapshot['retry_count'] and st.session_state.get('salesforce'):
+            if st.button(f"🔁 Retry the {snapshot['retry_count']} Failed Rows Only", key=f"retry_failed_{snapshot['id']}"):
+                retry_failed_push(st.session_state.salesforce, job)
+                st.rerun()
+    # Generate download link for assignment log, once asked for
     # Optional: merge with original filtered data for a full export
     #merged_export = df.iloc[[entry['Index'] for entry in assignment_log]].copy()
     #merged_export.insert(1, 'Assigned To', [entry['Assigned To'] for entry in assignment_log])  # insert into column B
 
     st.markdown("### 📦 Download Full Assignment Log")
-    st.download_button(
+    lazy_download_button(
         label="📥 Download Assigned Leads as CSV",
-        data=assignment_df.to_csv(index=False).encode('utf-8'),
+        make_data=lambda: pd.DataFrame(snapshot['assignment_log']).to_csv(index=False).encode('utf-8'),
         file_name='assigned_leads_master.csv',
-        mime='text/csv'
+        mime='text/csv',
+        key=f"assignment_log_{snapshot['id']}"
     )
 
 
-def job_title_selector(df):
-    st.write("### 🛠 Select Job Titles to Keep")
+ALL_COLUMNS = "All columns"
+FILE_ORDER = "File order"
 
-    # Extract unique job titles
-    unique_job_titles = sorted(df['Job Title'].dropna().unique().tolist())
-    unique_peos = sorted(df['PEO (Normalized)'].dropna().unique().tolist())
 
-    # Pre-select executive titles
-    preselected_titles = [title for title in unique_job_titles if is_executive_title(title)]
-    unselected_titles = [title for title in unique_job_titles if title not in preselected_titles]
+def paged_dataframe(pager, key):
+    """
+    One page of a frame, with sorting, filtering and paging done on the server by the
+    FramePager: the browser only receives the rows on screen, however large the frame.
+    """
+    columns = [str(column) for column in pager.df.columns]
+    filter_col, column_col, sort_col, order_col = st.columns([3, 2, 2, 1])
+    query = filter_col.text_input("🔎 Filter rows", key=f"{key}_query", placeholder="Text to look for")
+    column = column_col.selectbox("In column", [ALL_COLUMNS] + columns, key=f"{key}_column")
+    sort_by = sort_col.selectbox("Sort by", [FILE_ORDER] + columns, key=f"{key}_sort")
+    descending = order_col.checkbox("Desc.", key=f"{key}_descending")
+
+    column = None if column == ALL_COLUMNS else pager.df.columns[columns.index(column)]
+    sort_by = None if sort_by == FILE_ORDER else pager.df.columns[columns.index(sort_by)]
+    positions = pager.positions(query, column, sort_by, descending)
+
+    size_col, page_col = st.columns([1, 1])
+    page_size = size_col.selectbox("Rows per page", PREVIEW_PAGE_SIZES, key=f"{key}_page_size")
+    pages = max(1, -(-len(positions) // page_size))
+    # A new filter or sort starts again from the first page
+    page = page_col.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1,
+                                 key=f"{key}_page_{content_hash(repr((query, column, sort_by, descending, page_size)).encode('utf-8'))}")
+
+    st.dataframe(pager.page(positions, page - 1, page_size))
+    first = (page - 1) * page_size
+    st.caption(f"Rows {min(first + 1, len(positions))}–{min(first + page_size, len(positions))} of "
+               f"{len(positions)} matching ({len(pager)} in total).")
+
 
-    # Add emojis for visual distinction
-    preselected_titles_display = [f" {title}" for title in preselected_titles]
-    unselected_titles_display = [f" {title}" for title in unselected_titles]
+def show_summary(summary, title):
+    # Rows per PEO and per title class, side by side
+    with st.expander(title):
+        peo_col, class_col = st.columns(2)
+        peo_col.dataframe(summary['peos'], hide_index=True)
+        class_col.dataframe(summary['title_classes'], hide_index=True)
 
-    # Combine lists to show preselected on top
-    combined_titles_display = preselected_titles_display + unselected_titles_display
-    combined_titles_values = preselected_titles + unselected_titles
 
+TITLE_PAGE_SIZE = 50  # Job titles sent to the browser at a time
+TITLE_KINDS = {"All titles": None, "Executive titles": True, "Other titles": False}
+
+
+def job_title_selector(options, upload_hash):
+    st.write("### 🛠 Select Job Titles to Keep")
+
+    # Distinct job titles with counts and executive class, and PEOs (see LeadPipeline.title_options)
+    catalog = options['catalog']
+    unique_peos = options['peos']
     preselected_peos = unique_peos
 
+    # The selection lives in session state, so the browser only ever gets one page of titles.
+    # A new upload starts from its executive titles, as before.
+    selection_state = st.session_state.get('title_selection')
+    if selection_state is None or selection_state['upload'] != upload_hash:
+        selection_state = {'upload': upload_hash, 'titles': set(catalog.executive_titles), 'version': 0}
+        st.session_state.title_selection = selection_state
+    selection = selection_state['titles']
+
     # Apply custom CSS for scrollable multiselect dropdown
     st.markdown("""
         <style>
@@ -385,17 +355,52 @@ def job_title_selector(df):
         </style>
     """, unsafe_allow_html=True)
 
-    # Create a mapping between displayed titles and original titles
-    display_to_title = dict(zip(combined_titles_display, combined_titles_values))
-
     # Use expander for dropdown effect
-    with st.expander(f"🔽 Show/Hide Job Titles ({len(preselected_titles)} pre-selected)"):
-        selected_display_titles = st.multiselect(
-            "✅ Pre-selected C-Level and Executive Titles. To add a title, click anywhere in the dropdown. To remove a title, click X",
-            options=combined_titles_display,  # All titles shown with emojis
-            default=preselected_titles_display,  # Preselect executive titles
-            key="job_titles"
+    with st.expander(f"🔽 Show/Hide Job Titles ({len(catalog.executive_titles)} C-Level and Executive titles pre-selected, {len(catalog)} in total)"):
+        search_column, kind_column = st.columns([3, 1])
+        query = search_column.text_input("🔍 Search job titles (starts with or contains):", key="title_search")
+        kind_label = kind_column.selectbox("Show:", list(TITLE_KINDS.keys()), key="title_kind")
+        matches = catalog.search(query, TITLE_KINDS[kind_label])
+
+        pages = max(1, -(-len(matches) // TITLE_PAGE_SIZE))
+        page = st.number_input(f"Page (of {pages}, {len(matches)} matching titles):", min_value=1, max_value=pages,
+                               value=1, step=1, key=f"title_page_{query}_{kind_label}")
+        rows = catalog.rows(matches[(page - 1) * TITLE_PAGE_SIZE:page * TITLE_PAGE_SIZE])
+        page_df = pd.DataFrame({
+            'Keep': [title in selection for title, _, _ in rows],
+            'Job Title': [title for title, _, _ in rows],
+            'Rows': [count for _, count, _ in rows],
+            'Executive': [is_executive for _, _, is_executive in rows],
+        })
+        # Keyed by the page shown, so ticks never carry over to another page's rows
+        edited_df = st.data_editor(
+            page_df,
+            disabled=['Job Title', 'Rows', 'Executive'],
+            hide_index=True,
+            use_container_width=True,
+            key=f"title_editor_{upload_hash}_{selection_state['version']}_{query}_{kind_label}_{page}"
         )
+        for title, keep in zip(edited_df['Job Title'], edited_df['Keep']):
+            if keep:
+                selection.add(title)
+            else:
+                selection.discard(title)
+
+        select_column, clear_column, reset_column = st.columns(3)
+        changed = False
+        if select_column.button(f"✅ Keep all {len(matches)} matching", key="title_select_matches"):
+            selection.update(catalog.titles[position] for position in matches)
+            changed = True
+        if clear_column.button(f"❌ Drop all {len(matches)} matching", key="title_clear_matches"):
+            selection.difference_update(catalog.titles[position] for position in matches)
+            changed = True
+        if reset_column.button("↩️ Back to the executive titles", key="title_reset"):
+            selection.clear()
+            selection.update(catalog.executive_titles)
+            changed = True
+        if changed:
+            selection_state['version'] += 1  # Fresh editors, so no stale tick overrides the bulk change
+            st.rerun()
 
     with st.expander(f"🔽 PEO (Normalized) Filter - ({len(preselected_peos)} pre-selected)"):
         selected_peos = st.multiselect(
@@ -405,112 +410,18 @@ def job_title_selector(df):
             key="peo_filter"
         )
 
-    # Map back selected display titles to original titles
-    selected_titles = [display_to_title[title] for title in selected_display_titles]
+    # Selected titles in selector order: executive titles first
+    selected_titles = catalog.ordered(selection)
 
     st.write(f" **Selected: {len(selected_titles)} Job Titles**")
     st.write(f"✅ {len(selected_peos)} PEOs selected.")
     return selected_titles, selected_peos
 
-def get_active_sales_users(sf_instance):
-    query = """
-    SELECT Id, Name FROM User
-    WHERE Profile.Name = 'Sales User' AND IsActive = TRUE
-    """
-    results = sf_instance.query_all(query)
-
-    excluded_names = {"Terry Hookstra"}
-    excluded_ids = {"005Ql00000CV3qkIAD"}
-    user_dict = {
-        user['Id']: user['Name']
-        for user in results['records']
-        if user['Id'] not in excluded_ids and user['Name'] not in excluded_names
-    }
-    return user_dict
-
-EXECUTIVE_PRIORITY = {
-    'CEO': ['ceo', 'chief executive'],
-    'President': ['president'],
-    'COO': ['coo', 'chief operating'],
-    'CFO': ['cfo', 'chief financial'],
-    'CTO': ['cto', 'chief technology'],
-    'CIO': ['cio', 'chief information'],
-    'CMO': ['cmo', 'chief marketing'],
-    'Owner': ['owner', 'principal'],
-    'Founder': ['founder', 'co founder'],
-    'Chairman': ['chairman'],
-    'MD': ['managing director'],
-    'CAO': ['cao'],
-    'CRO': ['cro'],
-    'CHRO': ['chro'],
-    'CLO': ['clo'],
-    'CPO': ['cpo']
-}
-
-
-def job_title_rank(title):
-    if not title or pd.isna(title):
-        return 999
-
-    title = str(title).lower()
-
-    # Non-executive titles should rank last
-    if not is_executive_title(title):
-        return 999
-
-    for idx, keywords in enumerate(EXECUTIVE_PRIORITY.values()):
-        if any(k in title for k in keywords):
-            return idx
-
-    return 998
-
-
-def select_one_lead_per_company(df):
-    if df.empty:
-        return df.drop(columns=['__company_key'], errors='ignore')
-
-    selected_rows = []
-
-    for company, group in df.groupby('__company_key', dropna=False):
-        group = group.copy()
-
-        # Add ranking
-        group['job_rank'] = group['Job Title'].apply(job_title_rank)
-
-        # Sort by best title first, then keep stable order
-        group = group.sort_values(by=['job_rank'])
-
-        # Always take the top row
-        selected_rows.append(group.iloc[0])
-
-    if not selected_rows:
-        return df.drop(columns=['__company_key'], errors='ignore')
-
-    return pd.DataFrame(selected_rows).drop(columns=['job_rank', '__company_key'], errors='ignore')
-
-def get_company_column(df):
-    preferred_columns = [
-        'Contact Company name',
-        'Company',
-        'Company Name',
-        'Name'
-    ]
-
-    for col in preferred_columns:
-        if col in df.columns:
-            return col
-
-    return None
-
-def normalize_company(name):
-    if pd.isna(name) or not str(name).strip():
-        return "unknown_company"
-    return str(name).strip().lower()
-
-
 # =======================
 # Main Streamlit App
 # =======================
+PREVIEW_ROWS = 1000  # Raw rows shown after upload; the full file is only ever streamed
+
 def main():
     st.markdown("""
         <div style="display: flex; align-items: center; gap: 12px;">
@@ -629,14 +540,19 @@ def main():
         st.session_state.auth_code = None
 
     # Capture OAuth2 Authorization Code from URL
-    query_params = st.experimental_get_query_params()
-    auth_code = query_params.get("code", [None])[0]
+    auth_code = st.query_params.get("code")
    
 
     # Save the auth_code in session_state to avoid losing it on rerun
     if auth_code and st.session_state.auth_code is None:
         st.session_state.auth_code = auth_code
 
+    # Uploads run in the background; pick up the one this session (or the refreshed URL) started
+    push_job_id = st.session_state.get('push_job_id') or st.query_params.get("push_job")
+    push_job = get_push_jobs().get(push_job_id) if push_job_id else None
+    if push_job is not None:
+        show_push_job(push_job)
+
     # ================================
     # Step 1: Salesforce Authentication
     # ================================
@@ -673,84 +589,103 @@ def main():
     if st.session_state.salesforce:
         st.success("✅ Connected to Salesforce!")
 
-        # File uploader
-        uploaded_file = st.file_uploader("📤 Upload CSV File", type=["csv"])
+        if st.button("🔄 Refresh Salesforce Picklists and Sales Users"):
+            get_metadata_cache().invalidate(st.session_state.salesforce)
+            st.success("✅ Salesforce metadata will be reloaded on the next push.")
+
+        # File uploader; several regional extracts are merged into one upload
+        uploaded_files = st.file_uploader(
+            "📤 Upload CSV Files",
+            type=["csv"],
+            accept_multiple_files=True,
+            help="Several miEdge exports are parsed side by side and merged, so a company found in more than one file still gets a single lead."
+        )
 
-        if uploaded_file is not None:
+        if uploaded_files:
             try:
-                # Read the uploaded file
-                file_content = uploaded_file.getvalue()
-                if uploaded_file.name.endswith('.csv'):
-                    df = pd.read_csv(io.StringIO(file_content.decode('utf-8')), on_bad_lines='skip')
+                # Each step is cached by the file's content, so reruns that don't change the
+                # selection (e.g. the number of leads to push) don't touch the file again
+                pipeline = get_lead_pipeline()
+                metrics = get_stage_metrics()
+                with metrics.stage('upload.hash'):
+                    if len(uploaded_files) == 1:
+                        source = uploaded_files[0]
+                        upload_hash = get_upload_hash(source)
+                    else:
+                        source = uploaded_files
+                        upload_hash = batch_hash([get_upload_hash(uploaded_file) for uploaded_file in uploaded_files])
+                is_csv = all(uploaded_file.name.endswith('.csv') for uploaded_file in uploaded_files)
+                with metrics.stage('upload.preview'):
+                    preview_df, columns = pipeline.preview(upload_hash, source, PREVIEW_ROWS, is_csv)
+
+                if isinstance(source, list):
+                    st.success(f"✅ {len(source)} Files Uploaded, Parsed and Merged Successfully!")
+                    st.write("### 📚 Uploaded Files:")
+                    st.dataframe(preview_df, hide_index=True)
                 else:
-                    df = pd.read_excel(io.BytesIO(file_content))
-
-                st.success("✅ File Uploaded and Parsed Successfully!")
-                st.write("### 🔍 Preview Uploaded Data:")
-                st.dataframe(df)
+                    st.success("✅ File Uploaded and Parsed Successfully!")
+                    st.write(f"### 🔍 Preview Uploaded Data (first {len(preview_df)} rows):")
+                    paged_dataframe(pipeline.pager((upload_hash, 'preview'), preview_df), key="preview")
 
                 # Extract and filter job titles
-                if 'Job Title' in df.columns:
-                    selected_titles, selected_peos = job_title_selector(df)
-
-
-                    # Filter DataFrame based on selection
-                   # Optional PEO filter stays
-                    # Start with all rows
-                    filtered_df = df.copy()
-
-                    # Apply selected job title filter
-                    if selected_titles:
-                        filtered_df = filtered_df[
-                            filtered_df['Job Title']
-                            .fillna('')
-                            .astype(str)
-                            .isin(selected_titles)
-                        ].copy()
-
-                    # Keep only true executive titles
-                    filtered_df = filtered_df[
-                        filtered_df['Job Title'].apply(is_executive_title)
-                    ].copy()
-
-                    # Only apply PEO filter if there are actual PEO values selected
-                    if selected_peos and 'PEO (Normalized)' in filtered_df.columns:
-                        filtered_df = filtered_df[
-                            filtered_df['PEO (Normalized)']
-                            .fillna('')
-                            .astype(str)
-                            .str.strip()
-                            .isin(selected_peos)
-                        ].copy()
+                if 'Job Title' in columns:
+                    with metrics.stage('upload.title_options'):
+                        title_options = pipeline.title_options(upload_hash, source, is_csv)
+                    total_rows = title_options['total_rows']
+                    show_summary(title_options['summary'], f"📊 Rows per PEO and Title Class (all {total_rows} rows)")
+                    selected_titles, selected_peos = job_title_selector(title_options, upload_hash)
 
                     # Use the real company column for one-lead-per-company grouping
-                    company_col = get_company_column(filtered_df)
-
-                    if company_col is None:
+                    if not any(column in columns for column in COMPANY_COLUMNS):
                         st.error("❌ Could not find a company column. Expected one of: Contact Company name, Company, Company Name, Name.")
                         st.stop()
 
-                    filtered_df['__company_key'] = filtered_df[company_col].apply(normalize_company)
+                    fold_domains = st.checkbox(
+                        "🌐 Treat companies that share a website domain as one company",
+                        value=False,
+                        key='fold_domains',
+                        help="Company names are already matched loosely (\"Acme, Inc.\" and \"ACME\" are one company); "
+                             "this also groups rows whose websites are on the same domain.",
+                        disabled='Website' not in columns,
+                    )
+                    fuzzy_companies = st.checkbox(
+                        "🔤 Also treat company names one typo apart as one company",
+                        value=False,
+                        key='fuzzy_companies',
+                        help="Groups names that differ by one dropped or swapped letter in one word "
+                             "(\"Acme Plumbng\" and \"Acme Plumbing\"). Names with a different word "
+                             "(\"North Texas Bank\" and \"North Texas Tank\") or number are never grouped.",
+                    )
 
-                    # Enforce one top executive per company
-                    filtered_df = select_one_lead_per_company(filtered_df)
+                    # Filter by the selection and keep one top executive per company
+                    with metrics.stage('upload.select_leads'):
+                        filtered_df = pipeline.select_leads(upload_hash, source, selected_titles, selected_peos,
+                                                            is_csv, fold_domains, fuzzy_companies)
 
                     st.session_state.filtered_df = filtered_df
 
-                    st.write(f"### ✅ Filtered Data (Showing {len(filtered_df)} of {len(df)} rows):")
-                    st.dataframe(filtered_df)
-
-
-                    # Download filtered data
-                    def convert_df_to_csv(df):
-                        return df.to_csv(index=False).encode('utf-8')
-
-                    csv_data = convert_df_to_csv(filtered_df)
-                    st.download_button(
+                    st.write(f"### ✅ Filtered Data (Showing {len(filtered_df)} of {total_rows} rows):")
+                    if fuzzy_companies:
+                        st.caption(f"🔤 {filtered_df.attrs.get('fuzzy_merges', 0)} company groups were merged "
+                                   "because their names were one typo apart.")
+                    selection_key = content_hash(repr((upload_hash, sorted(selected_titles), sorted(selected_peos),
+                                                       fold_domains, fuzzy_companies)).encode('utf-8'))
+                    show_summary(pipeline.summary((upload_hash, 'leads', selection_key), filtered_df),
+                                 "📊 Filtered Leads per PEO and Title Class")
+                    paged_dataframe(pipeline.pager((upload_hash, 'leads', selection_key), filtered_df), key="filtered")
+
+
+                    # Download filtered data; the CSV is only rendered once asked for
+                    def filtered_csv():
+                        with metrics.stage('upload.to_csv'):
+                            return pipeline.to_csv(upload_hash, source, selected_titles, selected_peos, filtered_df, is_csv,
+                                                   fold_domains, fuzzy_companies)
+                    lazy_download_button(
                         label="📥 Download Filtered Data as CSV",
-                        data=csv_data,
+                        make_data=filtered_csv,
                         file_name='filtered_executive_data.csv',
-                        mime='text/csv'
+                        mime='text/csv',
+                        key=f"filtered_csv_{selection_key}"
                     )
 
                     # Push to Salesforce
@@ -766,14 +701,67 @@ def main():
                         key="num_to_push"
                     )
 
+                    push_mode_label = st.selectbox(
+                        "⚙️ Upload Mode:",
+                        list(PUSH_MODES.keys()),
+                        key="push_mode"
+                    )
+
+                    push_workers = PUSH_WORKERS
+                    if PUSH_MODES[push_mode_label] == "single":
+                        push_workers = st.number_input(
+                            "🧵 Parallel requests:",
+                            min_value=1,
+                            max_value=MAX_PUSH_WORKERS,
+                            value=PUSH_WORKERS,
+                            step=1,
+                            key="push_workers"
+                        )
+
+                    operation = INSERT
+                    if PUSH_MODES[push_mode_label] != "single":
+                        if st.checkbox(
+                            "🔁 Update existing leads by MSID (upsert): only changed fields are sent, new MSIDs are created",
+                            value=False,
+                            key="upsert_by_msid"
+                        ):
+                            operation = UPSERT
+
+                    resume_push = st.checkbox(
+                        "♻️ Resume an interrupted push of this file instead of starting over",
+                        value=True,
+                        key="resume_push"
+                    )
+
+                    duplicate_mode_label = st.selectbox(
+                        "🔎 Leads already in Salesforce (Lead or Contact):",
+                        list(DUPLICATE_MODES.keys()),
+                        key="duplicate_mode"
+                    )
+                    match_labels = st.multiselect(
+                        "Match existing records on:",
+                        list(MATCH_LABELS.keys()),
+                        default=["Email", "Phone"],
+                        key="duplicate_match_on"
+                    )
+                    match_on = tuple(MATCH_LABELS[label] for label in match_labels)
+
                     df_to_push = filtered_df.head(num_to_push)
+                    if DUPLICATE_MODES[duplicate_mode_label] != OFF and match_on:
+                        if st.button("🔎 Check for Leads Already in Salesforce"):
+                            show_existing_records(st.session_state.salesforce, df_to_push, match_on)
+
                     if st.button("🚀 Push Filtered Data to Salesforce"):
-                        push_to_salesforce(st.session_state.salesforce, df_to_push, selected_object)
+                        push_to_salesforce(st.session_state.salesforce, df_to_push, selected_object, PUSH_MODES[push_mode_label], push_workers, resume_push,
+                                           DUPLICATE_MODES[duplicate_mode_label], match_on, operation)
+                        st.rerun()  # Show the upload panel straight away
                 else:
                     st.error("❌ The uploaded file does not contain a 'Job Title' column.")
             except Exception as e:
                 st.error(f"❌ Error processing the uploaded file: {e}")
 
+    show_stage_metrics("⏱️ Timing Diagnostics", get_stage_metrics(), key="session_metrics")
+
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
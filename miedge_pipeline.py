@@ -0,0 +1,1137 @@
+import bisect
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+from functools import lru_cache
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+# =======================
+# miEdge CSV -> Salesforce Lead Field Mapping
+# =======================
+# (CSV header, Salesforce API name, transform)
+#   text            value or '' when blank
+#   default:<v>     value or <v> when blank
+#   truncate:<n>    text cut to n characters
+#   date            parsed to YYYY-MM-DD, None when blank or unparseable
+#   const:<v>       the same value for every lead
+#   owner           the round robin owner passed to build_lead_payloads
+#   provider        stripped PEO when it is a valid Current_Provider__c picklist value, else PROVIDER_PLACEHOLDER
+#   zip             'Zip-Zip4' when a Zip4 is present, else Zip (header is a (zip, zip4) pair)
+PROVIDER_PLACEHOLDER = 'Unknown'
+
+LEAD_FIELD_MAP = [
+    ('Contact Prefix (e.g. Dr, Prof etc.)', 'Salutation', 'text'),
+    ('Contact First Name', 'FirstName', 'text'),
+    ('Contact Middle Name (or initial)', 'MiddleName', 'text'),
+    ('Contact Last Name', 'LastName', 'text'),
+    ('Contact Company name', 'Company', 'default:Unknown'),
+    ('Contact Email', 'Email', 'text'),
+    ('Contact Phone Number', 'Phone', 'text'),
+    ('Job Title', 'Title', 'text'),
+    (None, 'LeadSource', 'const:miEdge'),
+    (None, 'OwnerId', 'owner'),
+    ('PEO (Normalized)', 'Current_Provider__c', 'provider'),
+    ('Employees', 'NumberOfEmployees', 'text'),
+    ('Website', 'Website', 'text'),
+    ('Industry', 'Industry', 'truncate:255'),  # picklist
+    ('Phone Number', 'Company_Phone__c', 'text'),
+    ('LinkedIn', 'LinkedIn__c', 'text'),
+    ('Contact Address', 'Street', 'text'),
+    ('Contact City', 'City', 'text'),
+    ('Contact State', 'State', 'text'),
+    (('Contact Zip', 'Contact Zip4'), 'PostalCode', 'zip'),
+    ('Facebook', 'Facebook__c', 'text'),
+    ('Twitter', 'Twitter__c', 'text'),
+    ('MSID', 'msid__c', 'text'),  # External ID for upserts; dropped when the org has no such field
+    ('NAICS Description', 'NAICS_Description__c', 'truncate:150'),
+    ('NAICS Code', 'Primary_NAICS__c', 'text'),
+    ('OSHA', 'OSHA__c', 'text'),
+    ('PEO (Normalized)', 'Lead_Source_Other__c', 'text'),
+    ('WHD', 'WHD__c', 'text'),
+    ('Fidelity Bond', 'Fidelity_Bond__c', 'text'),
+    ('Revenue Range', 'Revenue_Range__c', 'text'),
+    ('Benefits Broker', 'Benefits_Broker__c', 'text'),
+    ('Accounting Firm', 'Accounting_Firm__c', 'text'),
+    ("Workers' Compensation Carrier", 'Workers_Compensation_Carrier__c', 'text'),
+    ("Workers' Compensation Renewal Date", 'Workers_Comp_Renewal_Date__c', 'date'),
+    ('BIPD Carrier', 'BIPD_Carrier__c', 'text'),
+    ('BIPD Renewal', 'BIPD_Renewal__c', 'date'),
+    ('Bond Carrier', 'Bond_Carrier__c', 'text'),
+    ('Bond Renewal', 'Bond_Renewal__c', 'date'),
+    ('Business Travel', 'Business_Travel__c', 'text'),
+    ('Business Travel Carrier', 'Business_Travel_Carrier__c', 'text'),
+    ('Business Travel Renewal', 'Business_Travel_Renewal__c', 'date'),
+    ('Actuary Name', 'Actuary_Name__c', 'text'),
+    ('Actuary Firm Name', 'Actuary_Firm_Name__c', 'text'),
+    ('Motor Carrier Operation', 'Motor_Carrier_Operation__c', 'text'),
+    ('Drivers', 'Drivers__c', 'text'),
+    ('Mileage', 'Mileage__c', 'text'),
+    ('DOT', 'DOT__c', 'text'),
+    ('Ex. Mod.', 'Ex_Mod__c', 'text'),
+    ('Ex Mod changed in last 30 days', 'Ex_Mod_changed_in_last_30_days__c', 'text'),
+]
+
+
+def clean_date(date_str):
+    if pd.isna(date_str) or date_str.strip() == '':
+        return None  # Salesforce accepts null dates
+    try:
+        # Try parsing date from various formats
+        parsed_date = pd.to_datetime(date_str, errors='coerce')
+        if pd.isna(parsed_date):
+            return None
+        return parsed_date.strftime('%Y-%m-%d')  # Convert to YYYY-MM-DD
+    except Exception:
+        return None
+
+
+# =======================
+# Renewal Date Normalization
+# =======================
+# Formats tried, in order, on a whole column at once. Only four digit years: for
+# anything else (two digit years, month names, timestamps) clean_date's inference
+# decides, so results match it exactly.
+DATE_FORMATS = ['%m/%d/%Y', '%Y-%m-%d', '%m-%d-%Y', '%Y/%m/%d']
+DATE_CACHE_SIZE = 65536  # Distinct date strings remembered across pushes
+
+
+class DateNormalizer:
+    def __init__(self, formats=DATE_FORMATS, cache_size=DATE_CACHE_SIZE):
+        self.formats = list(formats)
+        self.cache_size = cache_size
+        self._cache = {}  # stripped text -> 'YYYY-MM-DD' or None
+        self._lock = threading.Lock()  # Pushes run on several threads and share DATES
+
+    def _parse(self, values):
+        # Parse distinct stripped strings, one vectorized pass per format
+        parsed = pd.Series(pd.NaT, index=values, dtype='datetime64[ns]')
+        for date_format in self.formats:
+            missing = parsed.isna()
+            if not missing.any():
+                break
+            todo = parsed.index[missing]
+            parsed[missing] = pd.to_datetime(pd.Series(todo, index=todo), format=date_format, errors='coerce')
+
+        iso = parsed.dt.strftime('%Y-%m-%d')
+        results = dict(zip(values, iso.where(parsed.notna(), None)))
+        for value in parsed.index[parsed.isna()]:
+            results[value] = clean_date(value)
+        return results
+
+    def to_iso(self, series, report=None):
+        """
+        Map a column of date text to 'YYYY-MM-DD' strings, None when blank or unparseable.
+
+        Each distinct string is parsed once and remembered. Unparseable non-blank values
+        are counted into `report` ({value: count}) when one is given. Safe to call from
+        several threads: the shared cache is only read and filled under a lock, and this
+        call's own lookup never depends on it keeping an entry.
+        """
+        text = fill_blank(series).astype(str).str.strip()
+        uniques = text.unique()
+        with self._lock:
+            lookup = {value: self._cache[value] for value in uniques if value in self._cache}
+        new = [value for value in uniques if value and value not in lookup]
+        if new:
+            parsed = self._parse(new)  # Outside the lock, so threads parse in parallel
+            lookup.update(parsed)
+            with self._lock:
+                if len(self._cache) + len(parsed) > self.cache_size:
+                    self._cache.clear()
+                self._cache.update(parsed)
+
+        iso = text.map(lookup)
+        if report is not None:
+            bad = text[iso.isna() & text.astype(bool)]
+            for value, count in bad.value_counts().items():
+                report[value] = report.get(value, 0) + int(count)
+        return iso.astype(object).where(iso.notna(), None)
+
+
+DATES = DateNormalizer()
+
+
+def fill_blank(data):
+    """
+    fillna('') for a frame or column, including the categorical columns read_miedge_csv
+    produces, which refuse '' as a fill value because it is not one of their categories.
+    """
+    if isinstance(data, pd.Series):
+        if isinstance(data.dtype, pd.CategoricalDtype):
+            data = data.astype(object)
+        return data.fillna('')
+
+    categorical = data.select_dtypes('category').columns
+    if len(categorical):
+        data = data.astype(dict.fromkeys(categorical, object))
+    return data.fillna('')
+
+
+def _column(df, header):
+    if header in df.columns:
+        return fill_blank(df[header])
+    return pd.Series('', index=df.index, dtype=object)
+
+
+def _or_blank(series, blank=''):
+    # Column-wise equivalent of `row.get(header, '') or blank`
+    return series.where(series.astype(bool), blank)
+
+
+def _map_unique(series, func):
+    # Run func once per distinct value instead of once per row
+    uniques = series.unique()
+    return series.map(dict(zip(uniques, (func(value) for value in uniques))))
+
+
+def _apply_transform(df, header, transform, owners, valid_providers, date_report=None):
+    kind, _, arg = transform.partition(':')
+
+    if kind == 'const':
+        return pd.Series(arg, index=df.index, dtype=object)
+    if kind == 'owner':
+        return pd.Series(list(owners), index=df.index, dtype=object)
+    if kind == 'zip':
+        zip_code, zip4 = _column(df, header[0]), _column(df, header[1])
+        joined = zip_code.astype(str) + '-' + zip4.astype(str)
+        return zip_code.where(~zip4.astype(bool), joined)
+
+    series = _column(df, header)
+    if kind == 'text':
+        return _or_blank(series)
+    if kind == 'default':
+        return _or_blank(series, arg)
+    if kind == 'truncate':
+        return _or_blank(series).astype(str).str[:int(arg)]
+    if kind == 'date':
+        report = date_report.setdefault(header, {}) if date_report is not None else None
+        return DATES.to_iso(series, report)
+    if kind == 'provider':
+        provider = series.astype(str).str.strip()
+        return provider.where(provider.isin(valid_providers), PROVIDER_PLACEHOLDER)
+
+    raise ValueError(f"Unknown transform '{transform}' for {header}")
+
+
+def lead_placeholders(field_map=LEAD_FIELD_MAP):
+    """
+    {Salesforce field: the value build_lead_payloads fills in when the extract has none},
+    e.g. Company 'Unknown'. An upsert diff treats these as blank, so a refresh with a
+    blank company never overwrites the company already on the lead.
+    """
+    placeholders = {}
+    for _, target, transform in field_map:
+        kind, _, arg = transform.partition(':')
+        if kind == 'default':
+            placeholders[target] = arg
+        elif kind == 'provider':
+            placeholders[target] = PROVIDER_PLACEHOLDER
+    return placeholders
+
+
+LEAD_PLACEHOLDERS = lead_placeholders()
+
+
+def build_lead_payloads(df, owners, valid_providers=(), date_report=None):
+    """
+    Map a miEdge frame to Salesforce Lead payloads, one dict per row, in row order.
+
+    `owners` holds the OwnerId for each row of `df`. When `date_report` is a dict it
+    collects the unparseable values of each date column: {header: {value: count}}.
+    """
+    if df.empty:
+        return []
+
+    valid_providers = set(valid_providers)
+    targets = [target for _, target, _ in LEAD_FIELD_MAP]
+    # tolist() unboxes each column to native Python values in one go, which is
+    # several times faster than DataFrame.to_dict('records') boxing value by value
+    columns = [
+        _apply_transform(df, header, transform, owners, valid_providers, date_report).tolist()
+        for header, _, transform in LEAD_FIELD_MAP
+    ]
+    return [dict(zip(targets, values)) for values in zip(*columns)]
+
+
+# =======================
+# Executive Title Classification
+# =======================
+EXECUTIVE_PATTERNS = [
+    r'\bCEO\b', r'\bCFO\b', r'\bCTO\b', r'\bCIO\b', r'\bCOO\b', r'\bPresident\b',  r'\bCAO\b', r'\bOwner\b', r'\bCMO\b', r'\bCHRO\b', r'\bCLO\b', r'\bCPO\b', r'\bCRO\b', r'\bFounder\b', r'\bChairman\b', r'\bMD\b']
+
+EXECUTIVE_EXCLUSION_PATTERNS = [
+    r'\bHR\b', r'\bHuman Resources\b', r'\barchitect\b', r'\bcreative\b', r'\bcontent\b', r'\binnovation\b', r'\bscientist\b', r'\bnurse\b', r'\bmedical\b', r'\bpeople\b', r'\bPayroll\b', r'\bBenefits\b', r'\bAccounting\b', r'\bConstruction\b', r'\bEngineer\b', r'\bengineering\b', r'\bclinical\b',
+    r'\blending\b', r'\bresearch\b', r'\bclient\b', r'\bengine\b', r'\blearning\b', r'\bgovernment\b', r'\bloan\b',
+    r'\bmember\b', r'\btechnical\b', r'\bproperty\b', r'\bpolicy\b', r'\brevenue\b', r'\bgeology\b', r'\banalyst\b',
+    r'\baccountant\b', r'\bhealthcare\b', r'\bhealth\b', r'\bsecurity\b', r'\bcloud\b', r'\bclinic\b', r'\blegal\b', r'\bdrug\b', r'\bdiversity\b',
+    r'\bleasing\b', r'\bpastry\b', r'\butilities\b', r'\btreasurer\b', r'\bcontract\b', r'\blisting\b', r'\bgrants\b',
+    r'\bleadership\b', r'\bsports\b', r'\bquality\b', r'\btoxicology\b', r'\bpulmonary\b', r'\bmanufacturer\b',
+    r'\bindustry\b', r'\bchemistry\b', r'\bbiology\b', r'\blaboratory\b', r'\bspace\b', r'\bexecutive administrator\b',
+    r'\bpulmonary\b', r'\bvirtual\b', r'\bquality\b', r'\bphaermaceuticl\b', r'\bscience\b', r'\bsciences\b', r'\bprofessional\b',
+    r'\bparalegal\b', r'\bmembership\b', r'\bdonor\b', r'\bcurriculum\b', r'\bbioanalytics\b'
+]
+
+EXECUTIVE_PRIORITY = {
+    'CEO': ['ceo', 'chief executive'],
+    'President': ['president'],
+    'COO': ['coo', 'chief operating'],
+    'CFO': ['cfo', 'chief financial'],
+    'CTO': ['cto', 'chief technology'],
+    'CIO': ['cio', 'chief information'],
+    'CMO': ['cmo', 'chief marketing'],
+    'Owner': ['owner', 'principal'],
+    'Founder': ['founder', 'co founder'],
+    'Chairman': ['chairman'],
+    'MD': ['managing director'],
+    'CAO': ['cao'],
+    'CRO': ['cro'],
+    'CHRO': ['chro'],
+    'CLO': ['clo'],
+    'CPO': ['cpo']
+}
+
+TITLE_CACHE_SIZE = 65536  # Distinct titles remembered per classifier
+OTHER_EXECUTIVE_CLASS = 'Other executive'  # Executive titles no EXECUTIVE_PRIORITY keyword names
+NOT_EXECUTIVE_CLASS = 'Not executive'
+
+
+class ExecutiveTitleClassifier:
+    def __init__(self, patterns=EXECUTIVE_PATTERNS, exclusion_patterns=EXECUTIVE_EXCLUSION_PATTERNS,
+                 priority=EXECUTIVE_PRIORITY, cache_size=TITLE_CACHE_SIZE):
+        # One alternation per list replaces ~85 separate re.search calls per title
+        self.inclusion = re.compile('|'.join(f'(?:{pattern})' for pattern in patterns), re.IGNORECASE)
+        self.exclusion = re.compile('|'.join(f'(?:{pattern})' for pattern in exclusion_patterns), re.IGNORECASE)
+        self.priority = list(priority.values())
+        self.classes = list(priority)
+        self._is_executive = lru_cache(maxsize=cache_size)(self._match)
+        self._rank = lru_cache(maxsize=cache_size)(self._rank_normalized)
+
+    @staticmethod
+    def normalize(title):
+        return str(title).strip().lower()
+
+    def _match(self, title):
+        return bool(self.inclusion.search(title)) and not self.exclusion.search(title)
+
+    def _rank_normalized(self, title):
+        # Non-executive titles should rank last
+        if not self._is_executive(title):
+            return 999
+
+        for idx, keywords in enumerate(self.priority):
+            if any(k in title for k in keywords):
+                return idx
+
+        return 998
+
+    def is_executive(self, title):
+        return self._is_executive(self.normalize(title))
+
+    def rank(self, title):
+        if not title or pd.isna(title):
+            return 999
+        return self._rank(self.normalize(title))
+
+    def classify(self, series):
+        # Classify each distinct title once, then map the answers back onto every row
+        return _map_unique(series.astype(object), self.is_executive).astype(bool)
+
+    def rank_series(self, series):
+        return _map_unique(series.astype(object), self.rank).astype(int)
+
+    def title_class(self, title):
+        # The EXECUTIVE_PRIORITY class a title ranks under: 'CEO', 'President', ...
+        rank = self.rank(title)
+        if rank < len(self.classes):
+            return self.classes[rank]
+        return OTHER_EXECUTIVE_CLASS if rank == 998 else NOT_EXECUTIVE_CLASS
+
+    def class_series(self, series):
+        return _map_unique(series.astype(object), self.title_class)
+
+
+EXECUTIVE_TITLES = ExecutiveTitleClassifier()
+
+
+def is_executive_title(title):
+    return EXECUTIVE_TITLES.is_executive(title)
+
+
+def job_title_rank(title):
+    return EXECUTIVE_TITLES.rank(title)
+
+
+# =======================
+# One Lead per Company
+# =======================
+COMPANY_COLUMNS = ['Contact Company name', 'Company', 'Company Name', 'Name']
+
+
+def get_company_column(df):
+    for col in COMPANY_COLUMNS:
+        if col in df.columns:
+            return col
+
+    return None
+
+
+def normalize_company(name):
+    if pd.isna(name) or not str(name).strip():
+        return "unknown_company"
+    return str(name).strip().lower()
+
+
+# =======================
+# Company Canonicalization
+# =======================
+UNKNOWN_COMPANY = "unknown_company"
+LEGAL_SUFFIXES = {'inc', 'incorporated', 'corp', 'corporation', 'co', 'company', 'llc', 'llp', 'lllp', 'lp',
+                  'ltd', 'limited', 'plc', 'pc', 'pllc', 'pa'}
+# Hosts many unrelated businesses share, so a match on them says nothing
+SHARED_WEBSITE_DOMAINS = {'facebook.com', 'linkedin.com', 'instagram.com', 'twitter.com', 'x.com', 'google.com',
+                          'sites.google.com', 'business.site', 'yelp.com', 'wix.com', 'squarespace.com'}
+COMPANY_MATCH_THRESHOLD = 0.92  # difflib ratio at which two canonical names count as the same company
+COMPANY_BLOCK_PREFIX = 4  # Names are only compared within buckets sharing this many leading characters ...
+COMPANY_MAX_BLOCK = 50  # ... and buckets larger than this are split on a longer prefix
+
+_COMPANY_DROPPED = re.compile(r"[.']")  # 'L.L.C.' -> 'llc', "O'Neil" -> 'oneil'
+_COMPANY_SEPARATORS = re.compile(r'[\W_]+')
+_DIGITS = re.compile(r'\d+')
+
+
+def canonical_company(name):
+    # 'Acme, Inc.', 'ACME Inc' and 'The Acme Incorporated' -> 'acme'
+    if pd.isna(name) or not str(name).strip():
+        return UNKNOWN_COMPANY
+    text = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode().lower()
+    tokens = _COMPANY_SEPARATORS.split(_COMPANY_DROPPED.sub('', text.replace('&', ' and ')))
+    tokens = [token for token in tokens if token]
+    if len(tokens) > 1 and tokens[0] == 'the':
+        tokens = tokens[1:]
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIXES:
+        tokens.pop()
+    # Names with no Latin letters at all keep their own text
+    return ' '.join(tokens) or str(name).strip().lower()
+
+
+def website_domain(url):
+    # 'https://www.Acme.com/about' -> 'acme.com'; '' when blank or a shared host
+    if pd.isna(url) or not str(url).strip():
+        return ''
+    text = str(url).strip().lower()
+    host = urlparse(text if '://' in text else '//' + text).hostname or ''
+    host = host[4:] if host.startswith('www.') else host
+    return '' if '.' not in host or host in SHARED_WEBSITE_DOMAINS else host
+
+
+def _company_blocks(names, prefix=COMPANY_BLOCK_PREFIX, max_block=COMPANY_MAX_BLOCK):
+    """
+    Buckets of canonical names worth comparing: names sharing the first `prefix`
+    characters of the name, or of its longest word. A bucket over `max_block` names is
+    split on a longer prefix, so comparisons stay near-linear in the number of names.
+    """
+    pending = []
+    for key_of in (lambda name: name, lambda name: max(name.split(), key=len)):
+        buckets = defaultdict(list)
+        for name in names:
+            buckets[key_of(name)[:prefix]].append(name)
+        pending.extend((prefix, bucket, key_of) for bucket in buckets.values())
+
+    while pending:
+        length, bucket, key_of = pending.pop()
+        if len(bucket) < 2:
+            continue
+        if len(bucket) <= max_block:
+            yield bucket
+            continue
+        longer = defaultdict(list)
+        for name in bucket:
+            longer[key_of(name)[:length + prefix]].append(name)
+        if len(longer) == 1:
+            continue  # Can't be split further (e.g. hundreds of 'company 1...'); too common to compare
+        pending.extend((length + prefix, sub_bucket, key_of) for sub_bucket in longer.values())
+
+
+def _one_typo_apart(a, b):
+    # Same words but one, and that one only a letter short or two letters swapped:
+    # 'acme plumbng' ~ 'acme plumbing', but 'north texas bank' is not 'north texas tank'
+    words_a, words_b = a.split(), b.split()
+    if len(words_a) != len(words_b):
+        return False
+    differing = [(x, y) for x, y in zip(words_a, words_b) if x != y]
+    if len(differing) != 1:
+        return False
+    x, y = sorted(differing[0], key=len)
+    if len(y) < 4:
+        return False  # Too short to tell a typo from another word
+    if len(x) == len(y):
+        swapped = [i for i in range(len(x)) if x[i] != y[i]]
+        return len(swapped) == 2 and swapped[1] == swapped[0] + 1 and x[swapped[0]] == y[swapped[1]] \
+            and x[swapped[1]] == y[swapped[0]]
+    return len(y) == len(x) + 1 and any(y[:i] + y[i + 1:] == x for i in range(len(y)))
+
+
+def _similar_companies(a, b, profiles, threshold=COMPANY_MATCH_THRESHOLD):
+    # 'store 12' never matches 'store 13', and a changed word is a different company.
+    # profiles: {name: (its numbers, its character counts)}, so the cheap checks reuse them
+    digits_a, chars_a = profiles[a]
+    digits_b, chars_b = profiles[b]
+    if digits_a != digits_b or not _one_typo_apart(a, b):
+        return False
+    # Characters in common bound difflib's ratio from above, at a fraction of its cost
+    if 2 * sum((chars_a & chars_b).values()) < threshold * (len(a) + len(b)):
+        return False
+    return SequenceMatcher(None, a, b, autojunk=False).ratio() >= threshold
+
+
+def company_keys(names, websites=None, fuzzy=False, threshold=COMPANY_MATCH_THRESHOLD, report=None):
+    """
+    A company group key per row, aligned with `names`. Rows share a key when their
+    names canonicalize alike and, when `websites` is given, when they share a website
+    domain. With `fuzzy`, canonical names one typo apart are grouped too (compared only
+    within blocking buckets, never all pairs), and `report['fuzzy_merges']` counts the
+    groups merged that way. Blank names all group as UNKNOWN_COMPANY.
+    """
+    canonical = _map_unique(fill_blank(names).astype(str), canonical_company)
+    parent = {name: name for name in canonical.unique()}
+    parent.pop(UNKNOWN_COMPANY, None)  # Never merged with anything
+
+    def find(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    def union(a, b):
+        a, b = find(a), find(b)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    if websites is not None:
+        domains = _map_unique(fill_blank(websites).astype(str), website_domain)
+        pairs = pd.DataFrame({'name': canonical.to_numpy(), 'domain': domains.to_numpy()})
+        pairs = pairs[(pairs['domain'] != '') & (pairs['name'] != UNKNOWN_COMPANY)].drop_duplicates()
+        for _, group in pairs.groupby('domain')['name']:
+            first, *others = group.tolist()
+            for name in others:
+                union(first, name)
+
+    fuzzy_merges = 0
+    profiles = {}
+    for bucket in _company_blocks(list(parent)) if fuzzy else ():
+        for name in bucket:
+            if name not in profiles:
+                profiles[name] = (_DIGITS.findall(name), Counter(name))
+        bucket = sorted(bucket, key=len)
+        for i, a in enumerate(bucket):
+            for b in bucket[i + 1:]:
+                # Sorted by length: past this point no longer name can reach the threshold
+                if 2 * len(a) / (len(a) + len(b)) < threshold:
+                    break
+                if find(a) != find(b) and _similar_companies(a, b, profiles, threshold):
+                    union(a, b)
+                    fuzzy_merges += 1
+    if report is not None:
+        report['fuzzy_merges'] = fuzzy_merges
+
+    roots = {name: find(name) for name in parent}
+    roots[UNKNOWN_COMPANY] = UNKNOWN_COMPANY
+    return canonical.map(roots)
+
+
+def select_one_lead_per_company(df):
+    if df.empty:
+        return df.drop(columns=['__company_key'], errors='ignore')
+
+    # Rank each distinct title once, then pick every company's best row in one stable sort:
+    # companies in key order, best title first, ties keep file order
+    order = pd.DataFrame({
+        'company': df['__company_key'].to_numpy(),
+        'rank': EXECUTIVE_TITLES.rank_series(df['Job Title']).to_numpy(),
+        'position': np.arange(len(df))
+    })
+    order = order.sort_values(['company', 'rank', 'position'], kind='mergesort')
+    best = order.drop_duplicates('company')['position'].to_numpy()
+
+    return df.iloc[best].drop(columns=['__company_key'], errors='ignore')
+
+
+# =======================
+# Streaming miEdge CSV Ingest
+# =======================
+INGEST_CHUNK_ROWS = 50000
+
+# Low-cardinality columns are stored as category; free text is pinned to str so pandas
+# skips type inference. Everything else (zips, counts, phone numbers) keeps the inferred
+# types the payload mapping has always seen.
+CATEGORY_COLUMNS = ['PEO (Normalized)', 'Contact State', 'Industry']
+TEXT_COLUMNS = ['MSID', 'Job Title', 'Contact Prefix (e.g. Dr, Prof etc.)', 'Contact First Name',
+                'Contact Middle Name (or initial)', 'Contact Last Name', 'Contact Email'] + COMPANY_COLUMNS
+
+
+def _ingest_columns():
+    # Every header the payload mapping, title filter and company grouping read
+    columns = set(COMPANY_COLUMNS) | {'Job Title', 'PEO (Normalized)'}
+    for header, _, _ in LEAD_FIELD_MAP:
+        if isinstance(header, tuple):
+            columns.update(header)
+        elif header is not None:
+            columns.add(header)
+    return columns
+
+
+INGEST_COLUMNS = _ingest_columns()
+INGEST_DTYPES = {**dict.fromkeys(TEXT_COLUMNS, str), **dict.fromkeys(CATEGORY_COLUMNS, 'category')}
+
+
+def read_csv_header(source):
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return list(pd.read_csv(source, nrows=0, encoding='utf-8').columns)
+
+
+def read_miedge_csv(source, columns=None, chunk_filter=None, chunksize=INGEST_CHUNK_ROWS):
+    """
+    Stream a miEdge export in chunks and return (kept rows, total rows read).
+
+    Only `columns` (default: the columns the app uses) are parsed, and `chunk_filter`
+    runs on each chunk as it is read, so peak memory follows the filtered result
+    rather than the raw file. `source` is a path or a binary buffer such as a
+    Streamlit upload; it is read straight from bytes, without decoding a full copy.
+    The original row numbers are kept as the index.
+    """
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    wanted = set(columns) if columns is not None else INGEST_COLUMNS
+
+    reader = pd.read_csv(source, usecols=lambda column: column in wanted, dtype=INGEST_DTYPES,
+                         chunksize=chunksize, on_bad_lines='skip', encoding='utf-8')
+    kept = []
+    total_rows = 0
+    with reader:
+        for chunk in reader:
+            total_rows += len(chunk)
+            kept.append(chunk_filter(chunk) if chunk_filter else chunk)
+
+    if not kept:
+        return pd.DataFrame(columns=[column for column in read_csv_header(source) if column in wanted]), 0
+
+    return _restore_categories(pd.concat(kept)), total_rows
+
+
+def _restore_categories(df):
+    # Chunks (or files) with different categories concatenate to object; restore one shared categorical
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    return df
+
+
+def filter_leads(df, selected_titles=None, selected_peos=None):
+    """
+    The upload filters, applied to one chunk at a time by read_miedge_csv: selected job
+    titles, true executive titles only, then selected PEOs.
+    """
+    # Apply selected job title filter
+    if selected_titles:
+        df = df[fill_blank(df['Job Title']).astype(str).isin(selected_titles)]
+
+    # Keep only true executive titles
+    df = df[EXECUTIVE_TITLES.classify(df['Job Title'])]
+
+    # Only apply PEO filter if there are actual PEO values selected
+    if selected_peos and 'PEO (Normalized)' in df.columns:
+        df = df[fill_blank(df['PEO (Normalized)']).astype(str).str.strip().isin(selected_peos)]
+
+    return df
+
+
+# =======================
+# Multi-file Batch Ingest
+# =======================
+INGEST_PROCESSES = min(4, os.cpu_count() or 1)  # Files parsed at once; each file is parsed by one process
+SOURCE_FILE_COLUMN = 'Source File'  # Added to batch rows, so a merged lead can be traced to its export
+
+
+def parse_export(source, name='The uploaded file'):
+    """
+    Parse and classify one export in a single streamed pass: (its executive rows, job
+    title row counts, PEO row counts, total rows). Only executive rows are kept, since
+    filter_leads never keeps any other row; every selection is filtered from them.
+    """
+    if 'Job Title' not in read_csv_header(source):
+        raise ValueError(f"{name} does not contain a 'Job Title' column.")
+    title_counts = []
+    peo_counts = []
+
+    def keep_executives(chunk):
+        title_counts.append(chunk['Job Title'].dropna().value_counts())
+        if 'PEO (Normalized)' in chunk.columns:
+            peo_counts.append(chunk['PEO (Normalized)'].dropna().astype(object).value_counts())
+        return chunk[EXECUTIVE_TITLES.classify(chunk['Job Title'])]
+
+    df, total_rows = read_miedge_csv(source, chunk_filter=keep_executives)
+    return df, _sum_counts(title_counts), _sum_counts(peo_counts), total_rows
+
+
+def _sum_counts(counts):
+    # value_counts of several chunks (or files) -> one, indexed by value
+    return pd.concat(counts).groupby(level=0).sum() if counts else pd.Series(dtype='int64')
+
+
+def export_rows(source, labels, offset=0):
+    """
+    The rows of a CSV export labelled `labels` (row numbers, plus `offset` for a later file
+    of a batch), with every column of the file rather than only the ones the app parses.
+    """
+    labels = pd.Index(labels)
+    rows, _ = read_miedge_csv(source, read_csv_header(source),
+                              chunk_filter=lambda chunk: chunk[(chunk.index + offset).isin(labels)])
+    return rows.set_axis(rows.index + offset)
+
+
+def _ingest_file(name, data):
+    # One export of a batch, parsed in a worker process
+    executives, title_counts, peo_counts, total_rows = parse_export(io.BytesIO(data), name)
+    executives[SOURCE_FILE_COLUMN] = name
+    return executives, title_counts, peo_counts, total_rows
+
+
+def _process_context():
+    # Forking a threaded server (Streamlit) can deadlock; a fork server started with
+    # this module preloaded is both safe and quick to start workers from
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context()
+
+
+def ingest_files(files, processes=INGEST_PROCESSES):
+    """
+    Parse and classify several miEdge exports at once, one file per worker process, and
+    merge them into one batch: {'frame': executive rows of every file in upload order,
+    'title_counts', 'peo_counts', 'total_rows', 'files': per-file row counts}. `files` is a
+    list of (name, bytes). Company grouping then runs across the merged rows, so a
+    company in two regional extracts still gets a single lead.
+    """
+    names = [name for name, _ in files]
+    if processes <= 1 or len(files) <= 1:
+        results = [_ingest_file(name, data) for name, data in files]
+    else:
+        with ProcessPoolExecutor(max_workers=min(processes, len(files)), mp_context=_process_context()) as pool:
+            results = list(pool.map(_ingest_file, names, [data for _, data in files]))
+
+    # Row numbers run on from one file into the next, so each row's label still leads back
+    # to its file and line (see export_rows)
+    offsets = np.cumsum([0] + [total for _, _, _, total in results[:-1]])
+    frame = _restore_categories(pd.concat([executives.set_axis(executives.index + offset)
+                                           for (executives, _, _, _), offset in zip(results, offsets)]))
+    # Exports that name the company column differently are merged into the first one found
+    company_col = get_company_column(frame)
+    for column in COMPANY_COLUMNS:
+        if company_col is not None and column != company_col and column in frame.columns:
+            frame[company_col] = frame[company_col].fillna(frame[column])
+
+    return {
+        'frame': frame,
+        'title_counts': _sum_counts([counts for _, counts, _, _ in results]),
+        'peo_counts': _sum_counts([counts for _, _, counts, _ in results]),
+        'total_rows': sum(total for _, _, _, total in results),
+        'files': pd.DataFrame({
+            'File': names,
+            'Rows': [total for _, _, _, total in results],
+            'Executive Rows': [len(executives) for executives, _, _, _ in results],
+        }),
+    }
+
+
+# =======================
+# Job Title Catalog
+# =======================
+TITLE_SEARCH_CACHE = 32  # Recent searches remembered per catalog, so paging through results is free
+
+
+class TitleCatalog:
+    """
+    Every distinct job title in an upload with its row count and executive class, in
+    selector order (executive titles first, each group alphabetical). Prefix searches
+    use a sorted index; substring searches scan the lowercased titles once, never the rows.
+    """
+
+    def __init__(self, titles, classifier=EXECUTIVE_TITLES, counted=False):
+        # titles: one job title per row, or with counted=True row counts indexed by title
+        counts = titles if counted else titles.dropna().value_counts()
+        names = sorted(counts.index.tolist())
+        executive = classifier.classify(pd.Series(names, dtype=object)).tolist()
+
+        self.executive_titles = [title for title, is_exec in zip(names, executive) if is_exec]
+        self.other_titles = [title for title, is_exec in zip(names, executive) if not is_exec]
+        self.titles = self.executive_titles + self.other_titles
+        self.counts = counts.to_dict()
+        self._executive = set(self.executive_titles)
+        self._position = {title: position for position, title in enumerate(self.titles)}
+        self._lowered = [title.lower() for title in self.titles]
+        self._prefix_index = None  # (sorted lowercased titles, their positions), built on the first search
+        self._searches = OrderedDict()
+
+    def __len__(self):
+        return len(self.titles)
+
+    def is_executive(self, title):
+        return title in self._executive
+
+    def search(self, query='', executive=None):
+        """
+        Positions of the titles matching `query` (case-insensitive), prefix matches first,
+        then other substring matches, each in selector order. `executive` True or False
+        keeps only that class.
+        """
+        query = (query or '').strip().lower()
+        key = (query, executive)
+        if key in self._searches:
+            self._searches.move_to_end(key)
+            return self._searches[key]
+
+        if not query:
+            positions = list(range(len(self.titles)))
+        else:
+            if self._prefix_index is None:
+                ordered = sorted(range(len(self._lowered)), key=self._lowered.__getitem__)
+                self._prefix_index = ([self._lowered[position] for position in ordered], ordered)
+            keys, key_positions = self._prefix_index
+            start = bisect.bisect_left(keys, query)
+            end = bisect.bisect_left(keys, query + '\uffff')
+            prefix = sorted(key_positions[start:end])
+            seen = set(prefix)
+            positions = prefix + [position for position, lowered in enumerate(self._lowered)
+                                  if query in lowered and position not in seen]
+        if executive is not None:
+            positions = [position for position in positions if (self.titles[position] in self._executive) == executive]
+
+        self._searches[key] = positions
+        if len(self._searches) > TITLE_SEARCH_CACHE:
+            self._searches.popitem(last=False)
+        return positions
+
+    def rows(self, positions):
+        # (title, row count, executive) for each position
+        return [(self.titles[position], self.counts[self.titles[position]], self.titles[position] in self._executive)
+                for position in positions]
+
+    def ordered(self, titles):
+        # `titles` in selector order; titles not in the upload are dropped
+        return sorted((title for title in titles if title in self._position), key=self._position.__getitem__)
+
+
+# =======================
+# Paged Preview
+# =======================
+PREVIEW_PAGE_SIZES = [25, 50, 100, 250]  # Rows sent to the browser per page
+PAGER_CACHE = 16  # Sort and filter choices whose row order is remembered per pager
+BLANK_LABEL = '(blank)'
+
+
+def count_table(counts, label):
+    # Row counts indexed by value -> a [label, 'Rows'] table, largest first
+    counts = counts[counts > 0].sort_values(ascending=False, kind='mergesort')
+    return pd.DataFrame({label: counts.index.astype(str), 'Rows': counts.to_numpy()})
+
+
+def title_class_counts(title_counts):
+    # Row counts per distinct title -> row counts per executive class
+    classes = EXECUTIVE_TITLES.class_series(pd.Series(title_counts.index, dtype=object))
+    return pd.Series(title_counts.to_numpy()).groupby(classes.to_numpy()).sum()
+
+
+def lead_summary(df):
+    # Rows per PEO and per title class, for the tables shown above a preview
+    peos = (fill_blank(df['PEO (Normalized)']).replace('', BLANK_LABEL) if 'PEO (Normalized)' in df.columns
+            else pd.Series(BLANK_LABEL, index=df.index))
+    return {
+        'peos': count_table(peos.value_counts(), 'PEO'),
+        'title_classes': count_table(EXECUTIVE_TITLES.class_series(df['Job Title']).value_counts(), 'Title Class'),
+    }
+
+
+class FramePager:
+    """
+    Sort, filter and page a frame on the server, so the browser only ever receives the
+    page on screen, however large the frame. Row orders for recent sort and filter
+    choices are remembered, so paging through them is a slice.
+    """
+
+    def __init__(self, df, cache_size=PAGER_CACHE):
+        self.df = df
+        self.cache_size = cache_size
+        self._orders = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.df)
+
+    def _matches(self, query, column):
+        # Positions of rows with `query` in `column` (or any column); each distinct value is checked once
+        if not query:
+            return np.arange(len(self.df))
+        mask = np.zeros(len(self.df), dtype=bool)
+        for name in [column] if column else self.df.columns:
+            values = self.df[name].astype(object)
+            uniques = pd.Series(pd.unique(values), dtype=object).dropna()
+            hits = uniques[uniques.astype(str).str.lower().str.contains(query, regex=False)]
+            if len(hits):
+                mask |= values.isin(hits).to_numpy()
+        return np.flatnonzero(mask)
+
+    def positions(self, query='', column=None, sort_by=None, descending=False):
+        """
+        Row positions matching `query` (case-insensitive substring), sorted by `sort_by`
+        with blanks last, ties in file order. Without `sort_by` rows keep file order.
+        """
+        query = (query or '').strip().lower()
+        key = (query, column, sort_by, descending)
+        with self._lock:
+            if key in self._orders:
+                self._orders.move_to_end(key)
+                return self._orders[key]
+
+        positions = self._matches(query, column)
+        if sort_by:
+            values = self.df[sort_by].iloc[positions].reset_index(drop=True)
+            if values.dtype == object:
+                values = values.map(str, na_action='ignore')  # Mixed values sort as text
+            order = values.sort_values(ascending=not descending, kind='mergesort', na_position='last').index
+            positions = positions[order.to_numpy()]
+
+        with self._lock:
+            self._orders[key] = positions
+            if len(self._orders) > self.cache_size:
+                self._orders.popitem(last=False)
+        return positions
+
+    def page(self, positions, page, page_size):
+        # Rows of page `page` (from 0) of `positions`
+        return self.df.iloc[positions[page * page_size:(page + 1) * page_size]]
+
+
+# =======================
+# Memoized Upload Pipeline
+# =======================
+PIPELINE_CACHE_ENTRIES = 16  # Step results kept across reruns, least recently used dropped first
+# Part of every stored frame's key: bump it whenever a change to parsing, filtering or
+# company grouping changes what a step returns, so frames stored by older code are not reused
+PIPELINE_VERSION = 2
+
+
+def content_hash(data):
+    # data: bytes or a buffer (e.g. UploadedFile.getbuffer()), hashed without copying
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def batch_hash(upload_hashes):
+    # A batch's key: its files' content hashes, in upload order
+    return content_hash("\n".join(upload_hashes).encode('utf-8'))
+
+
+class LeadPipeline:
+    """
+    parse -> classify -> filter -> dedupe for an upload, with every step's result cached
+    by the upload's content hash and the step's parameters. A rerun that only changes
+    something downstream (such as how many leads to push) gets the same frames back
+    without touching the file. Returned frames are shared; callers must not modify them.
+
+    `source` may also be a list of uploads, ingested together as one batch (see
+    ingest_files) under the hash of their hashes (see batch_hash). With a `store`
+    (a FrameStore), parsed and filtered CSV frames also outlive the process.
+    """
+
+    def __init__(self, max_entries=PIPELINE_CACHE_ENTRIES, store=None):
+        self.max_entries = max_entries
+        self.store = store
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _step(self, key, compute):
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+
+        result = compute()
+        with self._lock:
+            self._results[key] = result
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        return result
+
+    def _workbook(self, upload_hash, source):
+        # Excel can't be streamed, so a workbook is parsed once and every step reads the frame
+        return self._step((upload_hash, 'workbook'),
+                          lambda: pd.read_excel(io.BytesIO(source.getvalue())))
+
+    def _parsed(self, upload_hash, source):
+        """
+        A CSV upload (or batch) parsed and classified once: {'frame': executive rows,
+        'title_counts', 'peo_counts', 'total_rows', 'files': per-file row counts of a batch}.
+        Read back from the store when an earlier run left it there.
+        """
+        stored_key = ('parsed', PIPELINE_VERSION)
+
+        def compute():
+            if self.store is not None:
+                meta = self.store.load_meta(upload_hash, stored_key)
+                frame = self.store.load_frame(upload_hash, stored_key) if meta else None
+                if frame is not None:
+                    return {
+                        'frame': frame,
+                        'title_counts': pd.Series(meta['title_counts'], dtype='int64'),
+                        'peo_counts': pd.Series(meta['peo_counts'], dtype='int64'),
+                        'total_rows': meta['total_rows'],
+                        'files': pd.DataFrame(meta['files']) if meta['files'] is not None else None,
+                    }
+
+            if isinstance(source, list):
+                parsed = ingest_files([(upload.name, upload.getvalue()) for upload in source])
+            else:
+                frame, title_counts, peo_counts, total_rows = parse_export(source)
+                parsed = {'frame': frame, 'title_counts': title_counts, 'peo_counts': peo_counts,
+                          'total_rows': total_rows, 'files': None}
+
+            # Metadata goes last, so a stored upload always has its frame
+            if self.store is not None and self.store.save_frame(upload_hash, stored_key, parsed['frame']):
+                self.store.save_meta(upload_hash, stored_key, {
+                    'title_counts': {title: int(rows) for title, rows in parsed['title_counts'].items()},
+                    'peo_counts': {peo: int(rows) for peo, rows in parsed['peo_counts'].items()},
+                    'total_rows': int(parsed['total_rows']),
+                    'files': parsed['files'].to_dict('list') if parsed['files'] is not None else None,
+                })
+            return parsed
+        return self._step((upload_hash, 'parsed'), compute)
+
+    def preview(self, upload_hash, source, rows, is_csv=True):
+        # (first rows of the raw upload, every column name); for a batch, its per-file row counts instead
+        def compute():
+            if isinstance(source, list):
+                batch = self._parsed(upload_hash, source)
+                return batch['files'], list(batch['frame'].columns)
+            if not is_csv:
+                df = self._workbook(upload_hash, source)
+                return df.head(rows), list(df.columns)
+            columns = read_csv_header(source)
+            source.seek(0)
+            return pd.read_csv(source, nrows=rows, on_bad_lines='skip', encoding='utf-8'), columns
+        return self._step((upload_hash, 'preview', rows), compute)
+
+    def title_options(self, upload_hash, source, is_csv=True):
+        """
+        Parse and classify: the TitleCatalog of distinct job titles, which of them are
+        pre-selected (the executive ones), the PEOs, the row count, and rows per PEO
+        and per title class across the whole upload.
+        """
+        def compute():
+            if is_csv or isinstance(source, list):
+                parsed = self._parsed(upload_hash, source)
+                title_counts, peo_counts, total_rows = parsed['title_counts'], parsed['peo_counts'], parsed['total_rows']
+            else:
+                df = self._workbook(upload_hash, source)
+                title_counts = df['Job Title'].dropna().value_counts()
+                peo_counts = df['PEO (Normalized)'].dropna().astype(object).value_counts()
+                total_rows = len(df)
+            catalog = TitleCatalog(title_counts, counted=True)
+
+            return {
+                'catalog': catalog,
+                'preselected_titles': catalog.executive_titles,
+                'unselected_titles': catalog.other_titles,
+                'peos': sorted(peo_counts.index.tolist()),
+                'total_rows': total_rows,
+                'summary': {
+                    'peos': count_table(peo_counts, 'PEO'),
+                    'title_classes': count_table(title_class_counts(title_counts), 'Title Class'),
+                },
+            }
+        return self._step((upload_hash, 'title_options'), compute)
+
+    def select_leads(self, upload_hash, source, selected_titles, selected_peos, is_csv=True, fold_domains=False,
+                     fuzzy_companies=False):
+        """
+        Filter and dedupe: the rows matching the selection, one top executive per
+        company (see company_keys; `fold_domains` also groups rows by website domain,
+        `fuzzy_companies` groups names one typo apart, counted in
+        `leads.attrs['fuzzy_merges']`). Selections are sets, so their order does not matter.
+        """
+        selected_titles = tuple(sorted(set(selected_titles or ())))
+        selected_peos = tuple(sorted(set(selected_peos or ())))
+        stored_key = ('leads', PIPELINE_VERSION, selected_titles, selected_peos, fold_domains, fuzzy_companies)
+
+        def compute():
+            from_csv = is_csv or isinstance(source, list)
+            if from_csv and self.store is not None:
+                stored = self.store.load_frame(upload_hash, stored_key)
+                if stored is not None:
+                    return stored
+
+            rows = self._parsed(upload_hash, source)['frame'] if from_csv else self._workbook(upload_hash, source)
+            df = filter_leads(rows, list(selected_titles), list(selected_peos)).copy()
+
+            # Use the real company column for one-lead-per-company grouping
+            company_col = get_company_column(df)
+            if company_col is None:
+                raise ValueError("Could not find a company column. Expected one of: " + ", ".join(COMPANY_COLUMNS) + ".")
+            websites = df['Website'] if fold_domains and 'Website' in df.columns else None
+            report = {}
+            df['__company_key'] = company_keys(df[company_col], websites, fuzzy_companies, report=report)
+
+            # Enforce one top executive per company
+            leads = select_one_lead_per_company(df)
+            leads.attrs['fuzzy_merges'] = report['fuzzy_merges']  # Kept in the Parquet file too
+            if from_csv and self.store is not None:
+                self.store.save_frame(upload_hash, stored_key, leads)
+            return leads
+        return self._step((upload_hash, 'select_leads', selected_titles, selected_peos, fold_domains, fuzzy_companies),
+                          compute)
+
+    def pager(self, key, df):
+        # A FramePager for a frame this pipeline returned; `key` names it, e.g. (upload_hash, 'preview')
+        return self._step(('pager',) + tuple(key), lambda: FramePager(df))
+
+    def summary(self, key, df):
+        # lead_summary of a frame this pipeline returned, computed once per `key`
+        return self._step(('summary',) + tuple(key), lambda: lead_summary(df))
+
+    def full_rows(self, upload_hash, source, df, is_csv=True):
+        """
+        A select_leads result with every column of the export(s), for downloads: CSVs are
+        only parsed for the columns the app uses, so the rest are read back here. Columns
+        the pipeline added or merged (the batch source file and company) keep df's values.
+        """
+        if not is_csv and not isinstance(source, list):
+            return df  # A workbook is read whole already
+        if isinstance(source, list):
+            counts = self._parsed(upload_hash, source)['files']['Rows']
+            offsets = np.cumsum([0] + counts.tolist()[:-1])
+            full = pd.concat([export_rows(upload, df.index, offset) for upload, offset in zip(source, offsets)])
+        else:
+            full = export_rows(source, df.index)
+        full = full.loc[df.index]
+        for column in df.columns:
+            full[column] = df[column]
+        return full
+
+    def to_csv(self, upload_hash, source, selected_titles, selected_peos, df, is_csv=True, fold_domains=False,
+               fuzzy_companies=False):
+        # CSV bytes of a select_leads result with all the upload's columns, rendered once per selection
+        key = (upload_hash, 'csv', tuple(sorted(set(selected_titles or ()))), tuple(sorted(set(selected_peos or ()))),
+               fold_domains, fuzzy_companies)
+        return self._step(key, lambda: self.full_rows(upload_hash, source, df, is_csv).to_csv(index=False)
+                          .encode('utf-8'))
@@ -0,0 +1,228 @@
+"""
+Headless miEdge -> Salesforce uploads, for cron jobs and containers.
+
+    python -m miedge_sf push export.csv --mode bulk --titles exec
+    python -m miedge_sf push east.csv west.csv --titles CEO President --peos Insperity --limit 500
+
+Runs the same parse -> filter -> dedupe pipeline and push engine as the Streamlit
+app, without importing Streamlit. Progress, notices and the final result are written
+to stdout as JSON lines; the exit code is 0 only when every lead went through.
+
+Login uses a connected app, configured through the environment:
+
+    SF_CLIENT_ID                  connected app consumer key (always required)
+    SF_USERNAME, SF_PRIVATE_KEY_FILE
+                                  JWT bearer flow, with the certificate's private key
+    SF_CLIENT_SECRET, SF_REFRESH_TOKEN
+                                  refresh token flow, used when no JWT key is set
+    SF_DOMAIN                     'login' (default) or 'test' for a sandbox
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+
+import requests
+from simple_salesforce import Salesforce
+
+from frame_store import FrameStore
+from miedge_pipeline import LeadPipeline, batch_hash, content_hash
+from push_jobs import INSERT, UPSERT, PushJobManager, push_key, run_push
+from salesforce_duplicates import DEFAULT_MATCH_KINDS, FLAG, MATCH_KINDS, OFF, SKIP
+from salesforce_limits import AUTO
+from salesforce_metadata import SalesforceMetadataCache
+from salesforce_push import MAX_PUSH_WORKERS, PUSH_WORKERS
+from stage_metrics import instrument_session, record_response
+
+PUSH_MODES = [AUTO, 'single', 'collections', 'bulk']
+DUPLICATE_MODES = [SKIP, FLAG, OFF]
+EXECUTIVE_SELECTION = 'exec'  # --titles value for every executive title in the upload, the app's default
+PROGRESS_SECONDS = 5  # Default gap between progress lines while a push runs
+# PushJob snapshot fields written with each progress line, and with the final result
+PROGRESS_FIELDS = ['id', 'state', 'status_message', 'total', 'done', 'success_count', 'updated_count',
+                   'unchanged_count', 'duplicate_count', 'failed_count']
+RESULT_FIELDS = PROGRESS_FIELDS + ['failed_messages', 'assignment_log', 'retry_count', 'metrics']
+
+
+class LoginError(Exception):
+    pass
+
+
+def emit(event, **fields):
+    # One JSON object per line, flushed so a log collector sees it straight away
+    print(json.dumps({'event': event, 'at': round(time.time(), 3), **fields}, default=str), flush=True)
+
+
+# =======================
+# Connected App Login
+# =======================
+def token_url(domain):
+    return f"https://{domain}.salesforce.com/services/oauth2/token"
+
+
+def login(environ=os.environ):
+    """
+    A Salesforce connection from the connected-app settings in `environ`: JWT bearer when
+    a private key is configured, otherwise the refresh token flow. Returns (connection,
+    flow name).
+    """
+    client_id = environ.get('SF_CLIENT_ID')
+    domain = environ.get('SF_DOMAIN', 'login')
+    if not client_id:
+        raise LoginError("SF_CLIENT_ID is not set.")
+
+    if environ.get('SF_PRIVATE_KEY_FILE'):
+        if not environ.get('SF_USERNAME'):
+            raise LoginError("SF_USERNAME is required for JWT login.")
+        sf_instance = Salesforce(username=environ['SF_USERNAME'], consumer_key=client_id,
+                                 privatekey_file=environ['SF_PRIVATE_KEY_FILE'], domain=domain)
+        flow = 'jwt'
+    elif environ.get('SF_REFRESH_TOKEN'):
+        data = {
+            'grant_type': 'refresh_token',
+            'client_id': client_id,
+            'client_secret': environ.get('SF_CLIENT_SECRET', ''),
+            'refresh_token': environ['SF_REFRESH_TOKEN'],
+        }
+        response = requests.post(token_url(domain), data=data, hooks={'response': record_response})
+        if response.status_code != 200:
+            raise LoginError(f"Salesforce Authentication Failed: {response.text}")
+        token_data = response.json()
+        sf_instance = Salesforce(instance_url=token_data['instance_url'], session_id=token_data['access_token'])
+        flow = 'refresh_token'
+    else:
+        raise LoginError("Set SF_USERNAME and SF_PRIVATE_KEY_FILE (JWT) or SF_REFRESH_TOKEN (refresh token).")
+
+    instrument_session(sf_instance.session)  # Count and time every API call made through this connection
+    return sf_instance, flow
+
+
+# =======================
+# Filter
+# =======================
+def load_uploads(paths):
+    # The files as named in-memory uploads, the way the app receives them
+    uploads = []
+    for path in paths:
+        with open(path, 'rb') as handle:
+            upload = io.BytesIO(handle.read())
+        upload.name = os.path.basename(path)
+        uploads.append(upload)
+    return uploads
+
+
+def select_leads(paths, titles, peos, fold_domains=False, fuzzy_companies=False, pipeline=None):
+    """
+    The leads the app would offer for push from `paths` with this selection: (leads,
+    rows read). `titles` is a list of job titles, or [EXECUTIVE_SELECTION] for every
+    executive title; empty `peos` keeps every PEO.
+    """
+    pipeline = pipeline or LeadPipeline(store=FrameStore())
+    uploads = load_uploads(paths)
+    if len(uploads) == 1:
+        source = uploads[0]
+        upload_hash = content_hash(source.getbuffer())
+    else:
+        source = uploads
+        upload_hash = batch_hash([content_hash(upload.getbuffer()) for upload in uploads])
+    is_csv = all(upload.name.endswith('.csv') for upload in uploads)
+
+    options = pipeline.title_options(upload_hash, source, is_csv)
+    if titles == [EXECUTIVE_SELECTION]:
+        titles = options['preselected_titles']
+    else:
+        missing = [title for title in titles if title not in options['catalog'].counts]
+        if missing:
+            emit('notice', level='warning', message=f"Job titles not found in the upload: {', '.join(missing)}")
+    leads = pipeline.select_leads(upload_hash, source, titles, peos, is_csv, fold_domains, fuzzy_companies)
+    return leads, options['total_rows']
+
+
+# =======================
+# Push Command
+# =======================
+def push_command(args):
+    started = time.perf_counter()
+    leads, total_rows = select_leads(args.files, args.titles, args.peos, args.fold_domains, args.fuzzy_companies)
+    fuzzy_merges = leads.attrs.get('fuzzy_merges', 0)
+    if args.limit:
+        leads = leads.head(args.limit)
+    emit('filtered', files=args.files, total_rows=total_rows, leads=len(leads), fuzzy_merges=fuzzy_merges,
+         seconds=round(time.perf_counter() - started, 3))
+    if args.dry_run or leads.empty:
+        return 0
+
+    sf_instance, flow = login()
+    emit('login', flow=flow, instance_url=sf_instance.base_url.split('/services/')[0])
+
+    operation = UPSERT if args.upsert else INSERT
+    jobs = PushJobManager(max_workers=1)
+    job = jobs.submit(
+        f"{len(leads)} {args.object} records ({args.mode}, {operation})", run_push,
+        sf_instance, leads, args.object, SalesforceMetadataCache(), args.mode, args.workers, not args.no_resume,
+        args.duplicates, tuple(args.match_on), operation,
+        key=push_key(sf_instance, leads, args.object, operation))
+
+    notices_seen = 0
+    last_progress = None
+    while True:
+        snapshot = job.snapshot()
+        for level, message in snapshot['notices'][notices_seen:]:
+            emit('notice', level=level, message=message)
+        notices_seen = len(snapshot['notices'])
+        if not snapshot['active']:
+            break
+        if last_progress is None or time.monotonic() - last_progress >= args.progress_seconds:
+            last_progress = time.monotonic()
+            emit('progress', **{name: snapshot[name] for name in PROGRESS_FIELDS})
+        time.sleep(0.2)
+
+    emit('result', **{name: snapshot[name] for name in RESULT_FIELDS})
+    return 0 if snapshot['state'] == 'finished' and not snapshot['failed_count'] else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m miedge_sf', description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    push = commands.add_parser('push', help='filter miEdge exports and push the leads to Salesforce')
+    push.add_argument('files', nargs='+', help='miEdge CSV exports; several are merged into one push')
+    push.add_argument('--mode', choices=PUSH_MODES, default=AUTO)
+    push.add_argument('--titles', nargs='+', default=[EXECUTIVE_SELECTION],
+                      help=f"job titles to keep, or '{EXECUTIVE_SELECTION}' for every executive title")
+    push.add_argument('--peos', nargs='*', default=[], help='PEOs to keep (default: all)')
+    push.add_argument('--fold-domains', action='store_true', help='treat companies sharing a website domain as one')
+    push.add_argument('--fuzzy-companies', action='store_true',
+                      help='also treat company names one typo apart as one company')
+    push.add_argument('--limit', type=int, help='push at most this many leads')
+    push.add_argument('--object', default='Lead')
+    push.add_argument('--upsert', action='store_true', help='update existing leads by MSID (collections or bulk)')
+    push.add_argument('--workers', type=int, default=PUSH_WORKERS, help='parallel requests in single mode')
+    push.add_argument('--no-resume', action='store_true', help='start over instead of resuming an interrupted push')
+    push.add_argument('--duplicates', choices=DUPLICATE_MODES, default=SKIP,
+                      help='leads already in Salesforce: skip, flag, or off (no check)')
+    push.add_argument('--match-on', nargs='+', choices=MATCH_KINDS, default=list(DEFAULT_MATCH_KINDS))
+    push.add_argument('--progress-seconds', type=float, default=PROGRESS_SECONDS)
+    push.add_argument('--dry-run', action='store_true', help='filter and report, without logging in or pushing')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.upsert and args.mode == 'single':
+        parser.error("--upsert needs --mode collections, bulk or auto")
+    if not 1 <= args.workers <= MAX_PUSH_WORKERS:
+        parser.error(f"--workers must be between 1 and {MAX_PUSH_WORKERS}")
+
+    try:
+        return push_command(args)
+    except Exception as e:
+        emit('error', message=str(e), type=type(e).__name__)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import time
+
+import pandas as pd
+
+# =======================
+# Push Checkpoint Settings
+# =======================
+CHECKPOINT_PATH = os.environ.get('MIEDGE_CHECKPOINT_DB') or os.path.join(
+    tempfile.gettempdir(), 'miedge_push_checkpoints.sqlite3')
+CHECKPOINT_FLUSH_ROWS = 50  # Results buffered before a commit; at most this many rows are re-sent after a crash
+CHECKPOINT_RETENTION_DAYS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pushes (
+    upload_key TEXT PRIMARY KEY,
+    object_name TEXT NOT NULL,
+    total_rows INTEGER NOT NULL,
+    round_robin_index INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    completed_at REAL
+);
+CREATE TABLE IF NOT EXISTS push_rows (
+    upload_key TEXT NOT NULL,
+    row_index INTEGER NOT NULL,
+    row_hash TEXT NOT NULL,
+    owner_id TEXT NOT NULL,
+    owner_name TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    record_id TEXT,
+    error TEXT,
+    bulk_job_id TEXT,
+    PRIMARY KEY (upload_key, row_index)
+);
+"""
+
+# Row statuses; anything other than pending has already been through Salesforce
+PENDING = 'pending'
+CREATED = 'created'
+UPDATED = 'updated'  # Upserts that changed an existing record
+UNCHANGED = 'unchanged'  # Upserts skipped because the record already matched
+DUPLICATE = 'duplicate'
+FAILED = 'failed'
+SUCCESS_STATUSES = {CREATED, UPDATED, UNCHANGED}
+
+
+def row_hashes(df):
+    return [f"{value:016x}" for value in pd.util.hash_pandas_object(df, index=False).to_numpy()]
+
+
+def upload_key(df, *scope):
+    # Same rows, columns and scope (org, object) -> same key, so a re-push finds its checkpoint
+    digest = hashlib.sha256()
+    for part in scope:
+        digest.update(str(part).encode('utf-8') + b'\0')
+    digest.update('\0'.join(map(str, df.columns)).encode('utf-8') + b'\0')
+    digest.update(''.join(row_hashes(df)).encode('ascii'))
+    return digest.hexdigest()
+
+
+def result_status(result):
+    if result['success']:
+        if result.get('unchanged'):
+            return UNCHANGED
+        return CREATED if result.get('created', True) else UPDATED
+    if 'DUPLICATES_DETECTED' in (result['error'] or ''):
+        return DUPLICATE
+    return FAILED
+
+
+class PushCheckpoint:
+    def __init__(self, key, path=CHECKPOINT_PATH):
+        self.key = key
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self._buffer = []
+        self._expire_old_pushes()
+
+    def _expire_old_pushes(self):
+        cutoff = time.time() - CHECKPOINT_RETENTION_DAYS * 24 * 60 * 60
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM push_rows WHERE upload_key IN (SELECT upload_key FROM pushes WHERE started_at < ?)",
+                (cutoff,))
+            self.conn.execute("DELETE FROM pushes WHERE started_at < ?", (cutoff,))
+
+    def load(self):
+        push = self.conn.execute(
+            "SELECT object_name, total_rows, round_robin_index, completed_at FROM pushes WHERE upload_key = ?",
+            (self.key,)).fetchone()
+        if push is None:
+            return None
+
+        rows = self.conn.execute(
+            "SELECT row_index, row_hash, owner_id, owner_name, status, record_id, error, bulk_job_id "
+            "FROM push_rows WHERE upload_key = ? ORDER BY row_index",
+            (self.key,)).fetchall()
+        columns = ['row_index', 'row_hash', 'owner_id', 'owner_name', 'status', 'record_id', 'error', 'bulk_job_id']
+        return {
+            'object_name': push[0],
+            'total_rows': push[1],
+            'round_robin_index': push[2],
+            'completed': push[3] is not None,
+            'completed_at': push[3],
+            'rows': [dict(zip(columns, row)) for row in rows]
+        }
+
+    def start(self, object_name, total_rows, round_robin_index, rows):
+        # rows: (row index, row hash, owner id, owner name) for every row that will be pushed
+        self.discard()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO pushes (upload_key, object_name, total_rows, round_robin_index, started_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.key, object_name, total_rows, round_robin_index, time.time()))
+            self.conn.executemany(
+                "INSERT INTO push_rows (upload_key, row_index, row_hash, owner_id, owner_name) VALUES (?, ?, ?, ?, ?)",
+                [(self.key, *row) for row in rows])
+
+    def discard(self):
+        self._buffer = []
+        with self.conn:
+            self.conn.execute("DELETE FROM push_rows WHERE upload_key = ?", (self.key,))
+            self.conn.execute("DELETE FROM pushes WHERE upload_key = ?", (self.key,))
+
+    def mark_bulk_job(self, row_indexes, job_id):
+        # Written straight away: a job keeps running on Salesforce even if this session dies
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE push_rows SET bulk_job_id = ? WHERE upload_key = ? AND row_index = ?",
+                [(job_id, self.key, row_index) for row_index in row_indexes])
+
+    def record(self, row_index, result):
+        self._buffer.append((result_status(result), result['id'], result['error'], self.key, row_index))
+        if len(self._buffer) >= CHECKPOINT_FLUSH_ROWS:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE push_rows SET status = ?, record_id = ?, error = ? WHERE upload_key = ? AND row_index = ?",
+                self._buffer)
+        self._buffer = []
+
+    def complete(self):
+        self.flush()
+        with self.conn:
+            self.conn.execute("UPDATE pushes SET completed_at = ? WHERE upload_key = ?", (time.time(), self.key))
+
+    def close(self):
+        self.flush()
+        self.conn.close()
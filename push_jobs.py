@@ -0,0 +1,631 @@
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from miedge_pipeline import LEAD_PLACEHOLDERS, build_lead_payloads, fill_blank
+from push_checkpoint import (CREATED, FAILED, PENDING, SUCCESS_STATUSES, UNCHANGED, UPDATED, PushCheckpoint, result_status,
+                             row_hashes, upload_key)
+from salesforce_duplicates import DEFAULT_MATCH_KINDS, OFF, SKIP, DuplicateIndex, duplicate_error
+from salesforce_limits import AUTO, QuotaExhausted, choose_push_mode, estimate_calls, org_quota
+from salesforce_metadata import org_key, validate_picklists
+from salesforce_push import (PUSH_WORKERS, BulkJobTimeout, bulk_insert, bulk_upsert, collections_insert,
+                             collections_upsert, concurrent_insert, resume_bulk_job)
+from salesforce_retry import RetryQueue
+from salesforce_upsert import CREATE, EXTERNAL_ID_FIELD, MISSING_ID, UNCHANGED as UNCHANGED_RECORD, plan_upsert
+from stage_metrics import StageMetrics, instrument_session
+
+# =======================
+# Background Push Settings
+# =======================
+# Pushes running at once across all sessions. Their requests to one org share that
+# org's ApiQuota slots, so together they stay under Salesforce's concurrent request limit.
+MAX_CONCURRENT_PUSHES = 3
+FINISHED_JOB_RETENTION_SECONDS = 6 * 60 * 60
+
+# Per-row events are handed to the job in batches: every PROGRESS_FLUSH_ROWS results or
+# PROGRESS_FLUSH_SECONDS, whichever comes first
+PROGRESS_FLUSH_ROWS = 100
+PROGRESS_FLUSH_SECONDS = 0.25
+LOG_MAX_LINES = 2000  # Diagnostics kept per job; older lines are dropped
+
+SKIPPED_OWNER_IDS = {"0051U00000AVuYnQAL", "005Ql000003g6NRIAY"}  # Barry
+DEFAULT_OWNER_ID = "0051U00000AZSVcQAP"
+
+# Push operations
+INSERT = 'insert'
+UPSERT = 'upsert'
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+INTERRUPTED = 'interrupted'
+
+
+# =======================
+# Push Job State
+# =======================
+class PushJob:
+    def __init__(self, job_id, label, key=None):
+        self.id = job_id
+        self.label = label
+        self.key = key
+        self.state = QUEUED
+        self.status_message = "⏳ Waiting for a free upload slot..."
+        self.total = 0
+        self.done = 0
+        self.success_count = 0
+        self.updated_count = 0
+        self.unchanged_count = 0
+        self.duplicate_count = 0
+        self.failed_count = 0
+        self.failed_messages = []
+        self.assignment_log = []  # (row index, log entry)
+        self.notices = []  # (level, message) shown above the results, e.g. ('warning', '...')
+        self.log = deque(maxlen=LOG_MAX_LINES)  # Most recent per-row diagnostics
+        self.log_lines = 0  # Diagnostics written, including the ones dropped from log
+        self.metrics = StageMetrics()  # Time, API calls and latency per push stage
+        # What "retry failed rows" needs: the rows that still failed, with their payloads, and where they came from
+        self.retry_rows = []  # (row index, payload, log entry)
+        self.checkpoint_key = None
+        self.object_name = None
+        self.operation = None
+        self.push_mode = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.state in (QUEUED, RUNNING)
+
+    def update(self, **fields):
+        with self._lock:
+            for name, value in fields.items():
+                setattr(self, name, value)
+
+    def notice(self, level, message):
+        with self._lock:
+            self.notices.append((level, message))
+
+    def add_progress(self, results, log):
+        # results: (row index, assignment log entry, error message or None, checkpoint status)
+        with self._lock:
+            self.log.extend(log)
+            self.log_lines += len(log)
+            for idx, log_entry, error_message, status in results:
+                self.done += 1
+                if status == UPDATED:
+                    self.updated_count += 1
+                elif status == UNCHANGED:
+                    self.unchanged_count += 1
+                elif error_message is None:
+                    self.success_count += 1
+                    # Keyed by row so parallel uploads keep file order
+                    self.assignment_log.append((idx, log_entry))
+                # Handle duplicate errors
+                elif 'DUPLICATES_DETECTED' in error_message:
+                    self.duplicate_count += 1
+                else:
+                    self.failed_count += 1
+                    self.failed_messages.append(f"Row {idx+1}: {error_message}")
+
+    def snapshot(self):
+        # A consistent copy for the UI thread to render from
+        with self._lock:
+            return {
+                'id': self.id,
+                'label': self.label,
+                'state': self.state,
+                'active': self.active,
+                'status_message': self.status_message,
+                'total': self.total,
+                'done': self.done,
+                'success_count': self.success_count,
+                'updated_count': self.updated_count,
+                'unchanged_count': self.unchanged_count,
+                'duplicate_count': self.duplicate_count,
+                'failed_count': self.failed_count,
+                'failed_messages': list(self.failed_messages),
+                'assignment_log': [entry for _, entry in sorted(self.assignment_log, key=lambda item: item[0])],
+                'notices': list(self.notices),
+                'log': list(self.log),
+                'log_lines': self.log_lines,
+                'metrics': self.metrics.summary(),
+                'retry_count': len(self.retry_rows),
+            }
+
+
+class ProgressReporter:
+    """
+    Collects the push engine's per-row events and hands them to the PushJob in batches,
+    so a 10k-row push takes the job lock (and copies into it) a few hundred times, not
+    tens of thousands. Used from the push thread only.
+    """
+
+    def __init__(self, job, flush_rows=PROGRESS_FLUSH_ROWS, flush_seconds=PROGRESS_FLUSH_SECONDS):
+        self.job = job
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._results = []
+        self._log = []
+        self._flushed_at = time.monotonic()
+
+    def write(self, message):
+        self._log.append(message)
+        self._maybe_flush()
+
+    def record_result(self, idx, log_entry, error_message=None, status=CREATED):
+        self._results.append((idx, log_entry, error_message, status))
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if (len(self._results) >= self.flush_rows
+                or time.monotonic() - self._flushed_at >= self.flush_seconds):
+            self.flush()
+
+    def flush(self):
+        if self._results or self._log:
+            self.job.add_progress(self._results, self._log)
+            self._results = []
+            self._log = []
+        self._flushed_at = time.monotonic()
+
+
+class PushJobManager:
+    def __init__(self, max_workers=MAX_CONCURRENT_PUSHES):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='salesforce-push')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, label, target, *args, key=None, **kwargs):
+        """
+        Queue target(job, *args, **kwargs) on a worker thread and return its PushJob.
+
+        While a job with the same key is queued or running, that job is returned instead
+        of starting a second push of the same rows.
+        """
+        with self._lock:
+            self._prune()
+            if key is not None:
+                for job in self._jobs.values():
+                    if job.key == key and job.active:
+                        return job
+            job = PushJob(uuid.uuid4().hex[:12], label, key)
+            self._jobs[job.id] = job
+
+        self._executor.submit(self._run, job, target, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, target, args, kwargs):
+        job.update(state=RUNNING, status_message="🚀 Starting upload to Salesforce...")
+        try:
+            target(job, *args, **kwargs)
+        except BulkJobTimeout as e:
+            # The job keeps its place in the checkpoint, so the next push collects its results
+            job.update(state=INTERRUPTED, finished_at=time.time(), status_message="⏸️ Waiting on Salesforce.")
+            job.notice('warning', f"⏳ {e}, so this upload stopped waiting after {job.done} of {job.total} leads. "
+                                  f"Salesforce keeps working on it: click '🚀 Push Filtered Data to Salesforce' again "
+                                  f"later to collect its results without sending those leads twice.")
+        except Exception as e:
+            # Rows without a result stay pending in the checkpoint and are picked up by the next push
+            job.update(state=INTERRUPTED, finished_at=time.time(), status_message="⏸️ Upload interrupted.")
+            job.notice('error', f"❌ Upload interrupted after {job.done} of {job.total} leads: {e}. Click '🚀 Push Filtered Data to Salesforce' again to resume.")
+        else:
+            job.update(state=FINISHED, finished_at=time.time(), status_message="✅ Upload Complete!")
+
+    def _prune(self):
+        cutoff = time.time() - FINISHED_JOB_RETENTION_SECONDS
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+
+# =======================
+# Push Engine
+# =======================
+def _checkpoint_scope(sf_instance, selected_object, operation):
+    # Upserts get their own checkpoint, so a file that was inserted before can still be upserted
+    if operation == UPSERT:
+        return org_key(sf_instance), selected_object, UPSERT
+    return org_key(sf_instance), selected_object
+
+
+def push_key(sf_instance, df, selected_object, operation=INSERT):
+    return upload_key(fill_blank(df), *_checkpoint_scope(sf_instance, selected_object, operation))
+
+
+def run_push(job, sf_instance, df, selected_object, metadata, push_mode="single", workers=PUSH_WORKERS, resume=True,
+             duplicate_mode=SKIP, match_on=DEFAULT_MATCH_KINDS, operation=INSERT):
+    reporter = ProgressReporter(job)
+    instrument_session(sf_instance.session)
+    try:
+        with job.metrics.stage('push'):
+            _run_push(job, reporter, sf_instance, df, selected_object, metadata, push_mode, workers, resume,
+                      duplicate_mode, match_on, operation)
+    finally:
+        reporter.flush()
+
+
+def retry_failed(job, sf_instance, source, workers=PUSH_WORKERS):
+    """
+    Send the rows a finished push (or an earlier retry) `source` still had failed, from
+    the payloads it already built, and record the outcomes in the same checkpoint.
+    """
+    entries = list(source.retry_rows)
+    reporter = ProgressReporter(job)
+    quota = org_quota(sf_instance)
+    retries = RetryQueue(len(entries))
+    checkpoint = PushCheckpoint(source.checkpoint_key)
+    failed_rows = []
+    # Retries are few, so they never need a Bulk API job
+    push_mode = "single" if source.push_mode == "single" else "collections"
+    send_stage = f"push.send_{push_mode}"
+
+    def handle_result(entry, result):
+        job.metrics.record_latency(send_stage, result.get('seconds'))
+        if retries.offer(entry, result):
+            return
+        checkpoint.record(entry[0], result)
+        status = result_status(result)
+        reporter.record_result(entry[0], entry[2], result['error'], status)
+        if status == FAILED:
+            failed_rows.append(entry)
+
+    instrument_session(sf_instance.session)
+    job.update(total=len(entries), status_message=f"🔁 Sending {len(entries)} failed leads again...")
+    try:
+        with job.metrics.stage(send_stage):
+            send_entries(sf_instance, source.object_name, entries, push_mode, source.operation, handle_result,
+                         workers=workers, quota=quota)
+        with job.metrics.stage('push.retry'):
+            send_retries(job, reporter, sf_instance, source.object_name, retries, push_mode, source.operation,
+                         handle_result, workers, quota)
+    finally:
+        reporter.flush()
+        checkpoint.close()
+        job.update(retry_rows=sorted(failed_rows, key=lambda entry: entry[0]), checkpoint_key=source.checkpoint_key,
+                   object_name=source.object_name, operation=source.operation, push_mode=push_mode)
+
+
+def check_existing(job, reporter, checkpoint, sf_instance, to_send, duplicate_mode, match_on):
+    """
+    Look up the rows about to be sent in Salesforce and return the ones to send.
+
+    In skip mode, rows matching an existing Lead or Contact are recorded as duplicates
+    without an API call each; in flag mode they are logged and sent anyway.
+    """
+    index = DuplicateIndex.load(sf_instance, [data for _, data, _ in to_send], match_on)
+    kept = []
+    matched = dict.fromkeys(index.match_on, 0)
+    for entry in to_send:
+        found = index.match(entry[1])
+        if found is None:
+            kept.append(entry)
+            continue
+        matched[found[0]] += 1
+        if duplicate_mode == SKIP:
+            result = {'success': False, 'id': None, 'error': duplicate_error(found)}
+            checkpoint.record(entry[0], result)
+            reporter.record_result(entry[0], entry[2], result['error'])
+        else:
+            reporter.write(f"🔎 Row {entry[0]+1} matches existing {found[1]} {found[2]} on {found[0]}")
+            kept.append(entry)
+
+    total = sum(matched.values())
+    if total:
+        details = ", ".join(f"{kind}: {count}" for kind, count in matched.items() if count)
+        action = "Skipped them without sending." if duplicate_mode == SKIP else "Pushing them anyway; see the diagnostics for the rows."
+        job.notice('warning', f"🔎 {total} of {len(to_send)} leads already exist in Salesforce ({details}). {action}")
+    else:
+        job.notice('info', f"🔎 None of the {len(to_send)} leads were found in Salesforce ({index.query_count} lookups).")
+    return kept
+
+
+def plan_upserts(job, reporter, checkpoint, sf_instance, selected_object, to_send):
+    """
+    Diff the rows about to be sent against the records already under their MSIDs and
+    return (rows to send, row indexes of new records). Unchanged rows are recorded
+    without an API call; changed ones are cut down to the fields that differ.
+    """
+    plan = plan_upsert(sf_instance, selected_object, [data for _, data, _ in to_send], placeholders=LEAD_PLACEHOLDERS)
+    kept = []
+    new_rows = set()
+    counts = {}
+    for (idx, _, log_entry), (action, record, existing_id) in zip(to_send, plan):
+        counts[action] = counts.get(action, 0) + 1
+        if action == UNCHANGED_RECORD:
+            result = {'success': True, 'id': existing_id, 'error': None, 'created': False, 'unchanged': True}
+        elif action == MISSING_ID:
+            result = {'success': False, 'id': None, 'error': f"No MSID to upsert on ({EXTERNAL_ID_FIELD} is blank)"}
+        else:
+            if action == CREATE:
+                new_rows.add(idx)
+            kept.append((idx, record, log_entry))
+            continue
+        checkpoint.record(idx, result)
+        reporter.record_result(idx, log_entry, result['error'], result_status(result))
+
+    job.notice('info', f"🔁 Upsert on {EXTERNAL_ID_FIELD}: {counts.get(CREATE, 0)} new, {len(kept) - counts.get(CREATE, 0)} changed "
+                       f"(only changed fields are sent), {counts.get(UNCHANGED_RECORD, 0)} unchanged, "
+                       f"{counts.get(MISSING_ID, 0)} without an MSID.")
+    return kept, new_rows
+
+
+def send_entries(sf_instance, selected_object, entries, push_mode, operation, on_result, on_progress=None, on_job=None,
+                 workers=PUSH_WORKERS, quota=None):
+    # Send (row index, payload, log entry) entries; on_result(entry, result) is called for each
+    records = [data for _, data, _ in entries]
+
+    def on_record(position, result):
+        on_result(entries[position], result)
+
+    if push_mode == "bulk" and operation == UPSERT:
+        bulk_upsert(sf_instance, selected_object, EXTERNAL_ID_FIELD, records, on_progress=on_progress,
+                    on_result=on_record, on_job=on_job, quota=quota)
+    elif push_mode == "bulk":
+        bulk_insert(sf_instance, selected_object, records, on_progress=on_progress,
+                    on_result=on_record, on_job=on_job, quota=quota)
+    elif operation == UPSERT:
+        collections_upsert(sf_instance, selected_object, EXTERNAL_ID_FIELD, records,
+                           on_progress=on_progress, on_result=on_record, quota=quota)
+    elif push_mode == "collections":
+        collections_insert(sf_instance, selected_object, records, on_progress=on_progress, on_result=on_record,
+                           quota=quota)
+    else:
+        concurrent_insert(sf_instance, selected_object, records, on_result=on_record, workers=workers, quota=quota)
+
+
+def send_retries(job, reporter, sf_instance, selected_object, retries, push_mode, operation, on_result,
+                 workers=PUSH_WORKERS, quota=None):
+    # Drain the retry queue; retries are few, so batched modes re-send them through Collections
+    retry_mode = "single" if push_mode == "single" else "collections"
+    for attempt, batch in enumerate(retries.rounds(), start=1):
+        job.update(status_message=f"🔁 Retry {attempt}: sending {len(batch)} leads again after temporary Salesforce errors...")
+        reporter.write(f"🔁 Retry {attempt}: rows {', '.join(str(entry[0] + 1) for entry in batch[:20])}{', ...' if len(batch) > 20 else ''}")
+        send_entries(sf_instance, selected_object, batch, retry_mode, operation, on_result, workers=workers, quota=quota)
+    if retries.used:
+        job.notice('info', f"🔁 Sent {retries.used} leads again after temporary Salesforce errors.")
+    if retries.exhausted:
+        job.notice('warning', f"🔁 Stopped retrying after {retries.budget} re-sends; the remaining temporary failures are listed as failed.")
+
+
+def plan_push_mode(job, sf_instance, quota, push_mode, records, operation):
+    """
+    Resolve AUTO to the mode that suits `records` leads and the org's remaining API
+    requests, and move a chosen mode to a cheaper one when it would eat into the reserve.
+    Raises QuotaExhausted when even Bulk API would.
+    """
+    try:
+        quota.refresh(sf_instance)
+    except Exception as e:
+        job.notice('info', f"📊 Couldn't read the org's API limits ({e}); watching response headers instead.")
+    available = quota.available()
+    allow_single = operation != UPSERT
+
+    if push_mode == AUTO:
+        chosen = choose_push_mode(records, available, allow_single)
+        job.notice('info', f"⚙️ Automatic upload mode: {chosen} for {records} leads.")
+    elif available is not None and estimate_calls(push_mode, records) > available:
+        chosen = choose_push_mode(records, available, allow_single)
+        if chosen != push_mode:
+            job.notice('warning', f"⚙️ Switched from {push_mode} to {chosen}: {push_mode} would need about "
+                                  f"{estimate_calls(push_mode, records)} API requests and only {available} are available today.")
+    else:
+        chosen = push_mode
+
+    needed = estimate_calls(chosen, records)
+    if available is not None and needed > available:
+        raise QuotaExhausted(f"this upload needs about {needed} Salesforce API requests and only {available} "
+                             f"are left today above the reserve kept for other work")
+    if quota.limit is not None:
+        job.notice('info', f"📊 Salesforce API requests left today: {quota.remaining} of {quota.limit}; "
+                           f"this upload needs about {needed}.")
+    return chosen
+
+
+def _run_push(job, reporter, sf_instance, df, selected_object, metadata, push_mode, workers, resume,
+              duplicate_mode, match_on, operation):
+    metrics = job.metrics
+    with metrics.stage('push.sales_users'):
+        sales_user_names = metadata.sales_users(sf_instance)
+    reporter.write(f"📋 Final Round Robin Users: {sales_user_names}")
+
+    sales_users = list(sales_user_names.keys())
+    total_users = len(sales_users)
+    reporter.write(f"📋 Total Users: {total_users}")
+
+    assign_owner = total_users > 0
+    round_robin_index = 0  # Start from the first user
+
+    df_cleaned = fill_blank(df)
+    total_records = len(df_cleaned)
+
+    # Every row's owner and outcome is checkpointed, so a re-push of the same file resumes instead of re-sending
+    checkpoint = PushCheckpoint(upload_key(df_cleaned, *_checkpoint_scope(sf_instance, selected_object, operation)))
+    saved = checkpoint.load() if resume else None
+
+    if saved and saved['completed']:
+        # Nothing is left to resume; replaying the earlier results would report them as a new push
+        statuses = [row['status'] for row in saved['rows']]
+        finished_on = time.strftime('%Y-%m-%d %H:%M', time.localtime(saved['completed_at']))
+        job.update(total=0)
+        job.notice('warning', f"⚠️ This exact upload was already pushed on {finished_on} "
+                              f"({sum(status in SUCCESS_STATUSES for status in statuses)} of {len(statuses)} leads went "
+                              f"through, {statuses.count(FAILED)} failed). Nothing was sent this time. Untick "
+                              f"'♻️ Resume an interrupted push' to push it again from the start.")
+        return
+
+    if saved:
+        # Reuse the interrupted push's owner plan so the round robin carries on exactly where it was
+        row_positions = [row['row_index'] for row in saved['rows']]
+        owner_ids = [row['owner_id'] for row in saved['rows']]
+        owner_names = [row['owner_name'] for row in saved['rows']]
+        already_done = sum(1 for row in saved['rows'] if row['status'] != PENDING)
+        job.notice('info', f"♻️ Resuming an earlier push of this file: {already_done} of {len(saved['rows'])} leads were already processed and will not be sent again.")
+    else:
+        # Assign owners round robin in file order, then map every kept row in one pass
+        row_positions = []
+        owner_ids = []
+        owner_names = []
+        for idx in range(total_records):
+            if assign_owner:
+                owner_id = sales_users[round_robin_index]
+                user_name = sales_user_names.get(owner_id, owner_id)
+                round_robin_index = (round_robin_index + 1) % total_users
+                reporter.write(f"📋 Owner id {owner_id}")
+                if owner_id in SKIPPED_OWNER_IDS:
+                    reporter.write("⚠️ Skipping Barry (0051U00000AVuYnQAL) as lead owner.")
+                    continue
+            else:
+                owner_id = DEFAULT_OWNER_ID
+                user_name = owner_id
+                reporter.write("⚠️ No valid Salesforce users for round robin assignment. Default owner will be used (likely whoever connected OAuth).")
+            reporter.write(f"📋 Owner id2 {owner_id}")
+            row_positions.append(idx)
+            owner_ids.append(owner_id)
+            owner_names.append(user_name)
+
+        hashes = row_hashes(df_cleaned)
+        checkpoint.start(selected_object, total_records, round_robin_index,
+                         [(idx, hashes[idx], owner_id, user_name)
+                          for idx, owner_id, user_name in zip(row_positions, owner_ids, owner_names)])
+
+    with metrics.stage('push.metadata'):
+        picklists = metadata.picklists(sf_instance, selected_object)
+        valid_providers = metadata.picklist_values(sf_instance, selected_object, 'Current_Provider__c')
+        fields = metadata.describe(sf_instance, selected_object)['fields']
+    date_report = {}
+    with metrics.stage('push.payloads'):
+        payloads = build_lead_payloads(df_cleaned.iloc[row_positions], owner_ids, valid_providers, date_report)
+
+    unreadable_dates = {header: values for header, values in date_report.items() if values}
+    if unreadable_dates:
+        details = "; ".join(
+            f"`{header}`: {sum(values.values())} ({', '.join(list(values)[:5])}{', ...' if len(values) > 5 else ''})"
+            for header, values in unreadable_dates.items())
+        job.notice('warning', f"⚠️ Some dates couldn't be read and were sent blank: {details}")
+
+    # The MSID mapping needs an external ID field; orgs without one get plain inserts as before
+    quota = org_quota(sf_instance)
+    external_id = next((field for field in fields if field['name'] == EXTERNAL_ID_FIELD), None)
+    if operation == UPSERT and not (external_id and external_id.get('externalId')):
+        raise ValueError(f"{selected_object}.{EXTERNAL_ID_FIELD} is not an external ID field in this org, so leads can't be upserted")
+    if external_id is None:
+        for data in payloads:
+            data.pop(EXTERNAL_ID_FIELD, None)
+    if operation == UPSERT and push_mode == "single":
+        push_mode = "collections"  # Upserts go through the batched paths
+    send_stage = f"push.send_{push_mode}"
+
+    # Catch values restricted picklists would reject before they cost an API call each
+    rejected_picklist_values = validate_picklists(payloads, picklists)
+    if rejected_picklist_values:
+        details = "; ".join(f"`{field_name}`: {values}" for field_name, values in rejected_picklist_values.items())
+        job.notice('warning', f"⚠️ Replaced values not allowed by {len(rejected_picklist_values)} Salesforce picklist field(s): {details}")
+
+    pending = []  # (row index, Salesforce payload, assignment log entry)
+    for idx, data, user_name in zip(row_positions, payloads, owner_names):
+        pending.append((idx, data, {
+            "Full Name": f"{data['FirstName']} {data['MiddleName']} {data['LastName']}".strip(),
+            "Job Title": data['Title'],
+            "Company": data['Company'],
+            "Assigned To": user_name,
+            'Phone': data['Phone'],
+            "Email": data['Email'],
+            "Number of Employees": data['NumberOfEmployees'],
+            "Current Provider": str(data['Lead_Source_Other__c']).strip()
+        }))
+    job.update(total=len(pending),
+               status_message="🚀 Uploading to Salesforce... You can leave or refresh this page, the upload keeps running.")
+
+    retries = RetryQueue(len(pending))
+    failed_rows = []
+
+    def handle_result(entry, result):
+        idx, data, log_entry = entry
+        metrics.record_latency(send_stage, result.get('seconds'))
+        if retries.offer(entry, result):
+            return  # Sent again after a back-off; only the final outcome is recorded
+        if push_mode == "single":
+            reporter.write(f"➡️ Assigning lead to user: {data['OwnerId']}")
+        checkpoint.record(idx, result)
+        status = result_status(result)
+        reporter.record_result(idx, log_entry, result['error'], status)
+        if status == FAILED:
+            failed_rows.append(entry)
+
+    def on_batch_progress(processed, state):
+        job.update(status_message=f"📦 {state}: {processed} of {len(to_send)} records processed.")
+
+    # Split rows into already processed, waiting on a bulk job from the earlier run, and still to send
+    saved_rows = {row['row_index']: row for row in saved['rows']} if saved else {}
+    to_send = []
+    open_bulk_jobs = {}
+    for entry in pending:
+        row = saved_rows.get(entry[0])
+        if row and row['status'] != PENDING:
+            reporter.record_result(entry[0], entry[2], None if row['status'] in SUCCESS_STATUSES else row['error'], row['status'])
+            if row['status'] == FAILED:
+                failed_rows.append(entry)
+        elif row and row['bulk_job_id']:
+            open_bulk_jobs.setdefault(row['bulk_job_id'], []).append(entry)
+        else:
+            to_send.append(entry)
+
+    try:
+        for job_id, entries in open_bulk_jobs.items():
+            with metrics.stage('push.resume_bulk'):
+                results = resume_bulk_job(sf_instance, job_id, [data for _, data, _ in entries], on_progress=on_batch_progress,
+                                          external_id_field=EXTERNAL_ID_FIELD if operation == UPSERT else None)
+            if results is None:
+                # The job never got its data, so those rows go out with the rest
+                to_send.extend(entries)
+                continue
+            for entry, result in zip(entries, results):
+                handle_result(entry, result)
+        to_send.sort(key=lambda entry: entry[0])
+
+        updates = []
+        if operation == UPSERT and to_send:
+            job.update(status_message=f"🔁 Comparing with existing leads by {EXTERNAL_ID_FIELD}...")
+            with metrics.stage('push.upsert_plan'):
+                to_send, new_rows = plan_upserts(job, reporter, checkpoint, sf_instance, selected_object, to_send)
+            # Records already matched by MSID aren't new leads, so keep them out of the duplicate check
+            updates = [entry for entry in to_send if entry[0] not in new_rows]
+            to_send = [entry for entry in to_send if entry[0] in new_rows]
+
+        if duplicate_mode != OFF and match_on and to_send:
+            job.update(status_message="🔎 Checking Salesforce for existing records...")
+            with metrics.stage('push.duplicate_check'):
+                to_send = check_existing(job, reporter, checkpoint, sf_instance, to_send, duplicate_mode, match_on)
+        to_send = sorted(to_send + updates, key=lambda entry: entry[0])
+
+        with metrics.stage('push.limits'):
+            push_mode = plan_push_mode(job, sf_instance, quota, push_mode, len(to_send), operation)
+        send_stage = f"push.send_{push_mode}"
+        job.update(status_message="🚀 Uploading to Salesforce... You can leave or refresh this page, the upload keeps running.")
+
+        def on_bulk_job(job_id, start, count):
+            checkpoint.mark_bulk_job([entry[0] for entry in to_send[start:start + count]], job_id)
+
+        # Push data to Salesforce
+        with metrics.stage(send_stage):
+            send_entries(sf_instance, selected_object, to_send, push_mode, operation, handle_result,
+                         on_progress=on_batch_progress, on_job=on_bulk_job, workers=workers, quota=quota)
+
+        send_stage = 'push.retry'
+        with metrics.stage(send_stage):
+            send_retries(job, reporter, sf_instance, selected_object, retries, push_mode, operation, handle_result,
+                         workers, quota)
+        checkpoint.complete()
+    finally:
+        # Buffered results are saved even if the push fails part way
+        checkpoint.close()
+        job.update(retry_rows=sorted(failed_rows, key=lambda entry: entry[0]), checkpoint_key=checkpoint.key,
+                   object_name=selected_object, operation=operation, push_mode=push_mode)
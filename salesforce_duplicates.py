@@ -0,0 +1,171 @@
+import re
+from urllib.parse import quote_plus
+
+from miedge_pipeline import canonical_company
+
+# =======================
+# Pre-push Duplicate Detection
+# =======================
+# query_all sends SOQL as a GET parameter, and Salesforce rejects request URIs over
+# 16,384 bytes, so each IN (...) lookup is cut to stay under this many URL-encoded characters
+SOQL_MAX_ENCODED_LENGTH = 12000
+
+# (match kind, object, field) looked up before a push
+DUPLICATE_LOOKUPS = [
+    ('email', 'Lead', 'Email'),
+    ('email', 'Contact', 'Email'),
+    ('phone', 'Lead', 'Phone'),
+    ('phone', 'Contact', 'Phone'),
+    ('company', 'Lead', 'Company'),
+    ('company', 'Contact', 'Account.Name'),
+]
+MATCH_KINDS = ['email', 'phone', 'company']
+DEFAULT_MATCH_KINDS = ('email', 'phone')
+
+# What a push does with rows that match an existing record
+SKIP = 'skip'
+FLAG = 'flag'
+OFF = 'off'
+
+# Placeholders the payload mapping fills in; never evidence of an existing record
+IGNORED_COMPANIES = {'unknown', 'unknown_company'}
+# Ways the same company is commonly written in Salesforce, looked up besides the file's own
+# spelling; SOQL compares text case-insensitively, so 'ACME Inc' is found as 'acme inc'
+COMPANY_SEARCH_SUFFIXES = ('', ' inc', ' inc.', ', inc.', ' llc', ', llc', ' corp', ' corporation', ' co', ' company',
+                           ' ltd')
+
+
+def normalize_email(value):
+    return str(value or '').strip().lower()
+
+
+def normalize_phone(value):
+    # Last ten digits, so '+1 (555) 123-4567' and '555.123.4567' agree
+    digits = re.sub(r'\D', '', str(value or ''))
+    return digits[-10:] if len(digits) >= 10 else ''
+
+
+def _company_key(value):
+    # The same canonical name lead selection groups companies by, so 'Acme, Inc.' is 'ACME Inc'
+    key = canonical_company(value)
+    return '' if key in IGNORED_COMPANIES else key
+
+
+NORMALIZERS = {'email': normalize_email, 'phone': normalize_phone, 'company': _company_key}
+PAYLOAD_FIELDS = {'email': 'Email', 'phone': 'Phone', 'company': 'Company'}
+
+
+def _phone_variants(value):
+    # Phone is free text in Salesforce, so ask for the value as the file has it and as
+    # Salesforce formats US numbers entered through the UI
+    raw = str(value).strip()
+    variants = {raw}
+    digits = normalize_phone(raw)
+    if digits:
+        variants.update({digits, f"({digits[:3]}) {digits[3:6]}-{digits[6:]}"})
+    return variants
+
+
+def _company_variants(value):
+    # The name as the file has it, and its canonical name with and without common suffixes
+    key = canonical_company(value)
+    return {str(value).strip()} | {key + suffix for suffix in COMPANY_SEARCH_SUFFIXES}
+
+
+def soql_literal(value):
+    return "'" + str(value).replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def chunk_in_clauses(prefix, values, max_length=SOQL_MAX_ENCODED_LENGTH):
+    """
+    Yield complete `prefix IN (...)` queries over `values`, each short enough once
+    URL-encoded to fit in a GET request.
+    """
+    chunk = []
+    length = len(quote_plus(prefix + ' IN ()'))
+    for value in values:
+        literal = soql_literal(value)
+        literal_length = len(quote_plus(literal + ', '))
+        if chunk and length + literal_length > max_length:
+            yield f"{prefix} IN ({', '.join(chunk)})"
+            chunk = []
+            length = len(quote_plus(prefix + ' IN ()'))
+        chunk.append(literal)
+        length += literal_length
+    if chunk:
+        yield f"{prefix} IN ({', '.join(chunk)})"
+
+
+def _record_value(record, field):
+    value = record
+    for name in field.split('.'):
+        value = value.get(name) if isinstance(value, dict) else None
+    return value
+
+
+class DuplicateIndex:
+    """
+    Existing Salesforce Leads and Contacts that share an email, phone or company with
+    the rows about to be pushed, keyed by normalized value for O(1) lookups per row.
+    """
+
+    def __init__(self, match_on=DEFAULT_MATCH_KINDS):
+        self.match_on = tuple(kind for kind in MATCH_KINDS if kind in match_on)
+        self.entries = {kind: {} for kind in MATCH_KINDS}  # kind -> {normalized value: (object, Id)}
+        self.query_count = 0
+
+    @classmethod
+    def load(cls, sf_instance, payloads, match_on=DEFAULT_MATCH_KINDS):
+        index = cls(match_on)
+        wanted = {kind: set() for kind in index.match_on}
+        search = {kind: set() for kind in index.match_on}
+        for payload in payloads:
+            for kind in index.match_on:
+                raw = payload.get(PAYLOAD_FIELDS[kind])
+                key = NORMALIZERS[kind](raw)
+                if not key:
+                    continue
+                wanted[kind].add(key)
+                if kind == 'phone':
+                    search[kind].update(_phone_variants(raw))
+                elif kind == 'company':
+                    search[kind].update(_company_variants(raw))
+                else:
+                    search[kind].add(key)
+
+        for kind, object_name, field in DUPLICATE_LOOKUPS:
+            if kind not in index.match_on or not search[kind]:
+                continue
+            prefix = f"SELECT Id, {field} FROM {object_name} WHERE {field}"
+            for soql in chunk_in_clauses(prefix, sorted(search[kind])):
+                index.query_count += 1
+                for record in sf_instance.query_all(soql)['records']:
+                    key = NORMALIZERS[kind](_record_value(record, field))
+                    if key in wanted[kind]:
+                        index.entries[kind].setdefault(key, (object_name, record['Id']))
+        return index
+
+    def match(self, payload):
+        # (kind, object, Id) of the first existing record this payload matches, or None
+        for kind in self.match_on:
+            key = NORMALIZERS[kind](payload.get(PAYLOAD_FIELDS[kind]))
+            if key and key in self.entries[kind]:
+                object_name, record_id = self.entries[kind][key]
+                return kind, object_name, record_id
+        return None
+
+    def summarize(self, payloads):
+        # {'total': rows matched, 'email': n, 'phone': n, 'company': n}, each row counted once
+        counts = dict.fromkeys(['total', *self.match_on], 0)
+        for payload in payloads:
+            found = self.match(payload)
+            if found:
+                counts['total'] += 1
+                counts[found[0]] += 1
+        return counts
+
+
+def duplicate_error(found):
+    # Worded like Salesforce's own duplicate rule error, so it is counted and checkpointed as a duplicate
+    kind, object_name, record_id = found
+    return f"DUPLICATES_DETECTED: matches existing {object_name} {record_id} on {kind}"
@@ -0,0 +1,232 @@
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from requests.adapters import HTTPAdapter
+
+from salesforce_metadata import org_key
+
+# =======================
+# API Quota Settings
+# =======================
+QUOTA_RESERVE_SHARE = 0.1  # Share of the org's daily API requests a push always leaves for everything else
+LIMIT_PAUSE_SECONDS = 5  # First pause after Salesforce throttles a request; doubles on each repeat
+LIMIT_MAX_PAUSE_SECONDS = 120
+LIMIT_RETRIES = 5  # Times one call is re-sent after a throttling error before it counts as failed
+MIN_RATE_FACTOR = 0.125  # Single-record sends slow to at most an eighth of their normal rate
+RATE_RECOVERY = 1.02  # ... and speed back up by this factor per successful call
+# Shared by every push to the org, however many run at once
+ORG_CONCURRENT_REQUESTS = 25  # Salesforce caps an org at 25 concurrent long running requests
+ORG_RATE_PER_SECOND = 20  # Single-record sends to the org per second, across all pushes
+
+# Push mode choice and call estimates
+AUTO = 'auto'
+SINGLE_MAX_RECORDS = 1  # Collections costs the same single call from two records up
+BULK_MIN_RECORDS = 2000  # From here Bulk API's fixed per-job calls are cheaper than Collections' 200 per call
+COLLECTION_RECORDS_PER_CALL = 200
+BULK_RECORDS_PER_JOB = 100000  # Roughly what fits in one 100 MB job of miEdge leads
+BULK_CALLS_PER_JOB = 10  # Create, upload, close, status polls, successful and failed results
+PUSH_OVERHEAD_CALLS = 3  # Sales users, describe and /limits, when they aren't cached
+
+LIMIT_INFO = re.compile(r'(?:^|[^-])api-usage=(?P<used>\d+)/(?P<max>\d+)')
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class QuotaExhausted(Exception):
+    pass
+
+
+def parse_limit_info(header):
+    # 'api-usage=18/5000' (optionally followed by per-app usage) -> (18, 5000), or None
+    match = LIMIT_INFO.search(header or '')
+    return (int(match.group('used')), int(match.group('max'))) if match else None
+
+
+def is_limit_error(error):
+    # Salesforce answers both its daily limit and its concurrent request limit with REQUEST_LIMIT_EXCEEDED
+    text = str(error or '')
+    return 'REQUEST_LIMIT_EXCEEDED' in text or 'Error Code 429' in text
+
+
+def is_daily_limit_error(error):
+    return 'TotalRequests Limit exceeded' in str(error or '')
+
+
+def estimate_calls(push_mode, records):
+    # API requests a push of `records` leads is expected to make in `push_mode`
+    if records <= 0:
+        return 0
+    if push_mode == 'bulk':
+        sends = math.ceil(records / BULK_RECORDS_PER_JOB) * BULK_CALLS_PER_JOB
+    elif push_mode == 'collections':
+        sends = math.ceil(records / COLLECTION_RECORDS_PER_CALL)
+    else:
+        sends = records
+    return sends + PUSH_OVERHEAD_CALLS
+
+
+def choose_push_mode(records, available=None, allow_single=True):
+    """
+    The push mode for `records` leads: single records for a lone lead, Collections up to
+    BULK_MIN_RECORDS, Bulk API beyond. A mode whose estimate doesn't fit in `available`
+    API requests gives way to the next cheaper one; Bulk API is the last resort.
+    """
+    candidates = []
+    if allow_single and records <= SINGLE_MAX_RECORDS:
+        candidates.append('single')
+    if records < BULK_MIN_RECORDS:
+        candidates.append('collections')
+    candidates.append('bulk')
+    for push_mode in candidates:
+        if available is None or estimate_calls(push_mode, records) <= available:
+            return push_mode
+    return 'bulk'
+
+
+# =======================
+# Per-org Quota Tracking
+# =======================
+class ApiQuota:
+    """
+    One org's daily API usage, kept current from the Sforce-Limit-Info header on every
+    response (and /limits on demand), plus the back-off state throttling errors put a
+    push in, and the org's concurrent request slots and send rate. Shared by every push
+    to the org in this process.
+    """
+
+    def __init__(self, reserve_share=QUOTA_RESERVE_SHARE, concurrent_requests=ORG_CONCURRENT_REQUESTS,
+                 rate=ORG_RATE_PER_SECOND):
+        self.reserve_share = reserve_share
+        self.rate = rate
+        self._slots = threading.BoundedSemaphore(concurrent_requests)
+        self._limiter = TokenBucket(rate, capacity=concurrent_requests)
+        self.used = None
+        self.limit = None
+        self.exhausted = False  # Salesforce refused a request on the daily limit
+        self.rate_factor = 1.0
+        self._pause_seconds = 0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def remaining(self):
+        return None if self.limit is None else max(0, self.limit - self.used)
+
+    def available(self):
+        # Requests a push may still make before it reaches the reserve; None when unknown
+        if self.limit is None:
+            return None
+        return max(0, self.remaining - math.ceil(self.limit * self.reserve_share))
+
+    def observe(self, used, limit):
+        with self._lock:
+            self.used, self.limit = used, limit
+            if used < limit:
+                self.exhausted = False
+
+    def refresh(self, sf_instance):
+        daily = sf_instance.limits()['DailyApiRequests']
+        self.observe(daily['Max'] - daily['Remaining'], daily['Max'])
+        return self.remaining
+
+    def throttled(self, daily=False):
+        with self._lock:
+            if daily:
+                self.exhausted = True
+                return
+            self._pause_seconds = min(LIMIT_MAX_PAUSE_SECONDS, self._pause_seconds * 2 or LIMIT_PAUSE_SECONDS)
+            self._paused_until = time.monotonic() + self._pause_seconds
+            self.rate_factor = max(MIN_RATE_FACTOR, self.rate_factor / 2)
+
+    def recovered(self):
+        with self._lock:
+            self._pause_seconds = 0
+            self.rate_factor = min(1.0, self.rate_factor * RATE_RECOVERY)
+
+    def on_response(self, response, *args, **kwargs):
+        # requests response hook, installed on the org's sessions by org_quota
+        usage = parse_limit_info(response.headers.get('Sforce-Limit-Info'))
+        if usage:
+            self.observe(*usage)
+        if response.status_code == 429 or (response.status_code == 403 and 'REQUEST_LIMIT_EXCEEDED' in response.text):
+            self.throttled(daily=is_daily_limit_error(response.text))
+        elif response.status_code < 400:
+            self.recovered()
+        return response
+
+    def wait(self):
+        """
+        Block while the org is backing off, then return. Raises QuotaExhausted once the
+        org is out of requests (or down to the reserve), so the push stops and can be
+        resumed later instead of spending what is left.
+        """
+        while True:
+            available = self.available()
+            if self.exhausted or available == 0:
+                raise QuotaExhausted(
+                    f"Salesforce API requests are down to the reserve kept for other work "
+                    f"({self.remaining} of {self.limit} left today)")
+            delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(min(delay, 1))
+
+    @contextmanager
+    def request_slot(self):
+        # Hold one of the org's concurrent request slots for a call, paced by the org's shared rate
+        with self._slots:
+            self._limiter.rate = self.rate * self.rate_factor
+            self._limiter.acquire()
+            yield
+
+
+_quotas = {}
+_quotas_lock = threading.Lock()
+
+
+def size_connection_pool(session):
+    """
+    Give the session a connection per request the org allows (requests keeps 10 by
+    default). Done once: pushes sharing the session keep using the same pool rather
+    than swapping it out from under each other, and the replaced default is closed.
+    """
+    with _quotas_lock:
+        current = session.adapters.get('https://')
+        if getattr(current, '_pool_maxsize', 0) >= ORG_CONCURRENT_REQUESTS:
+            return
+        session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=ORG_CONCURRENT_REQUESTS))
+    if current is not None:
+        current.close()
+
+
+def org_quota(sf_instance):
+    # The org's ApiQuota, hooked up to this connection's responses, which get a full-size pool
+    with _quotas_lock:
+        quota = _quotas.setdefault(org_key(sf_instance), ApiQuota())
+        hooks = sf_instance.session.hooks['response']
+        if quota.on_response not in hooks:
+            hooks.append(quota.on_response)
+    size_connection_pool(sf_instance.session)
+    return quota
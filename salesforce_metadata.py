@@ -0,0 +1,128 @@
+import threading
+import time
+
+# =======================
+# Salesforce Metadata Cache
+# =======================
+METADATA_TTL_SECONDS = 60 * 60  # Describe results and the sales team rarely change within an hour
+
+
+def get_active_sales_users(sf_instance):
+    query = """
+    SELECT Id, Name FROM User
+    WHERE Profile.Name = 'Sales User' AND IsActive = TRUE
+    """
+    results = sf_instance.query_all(query)
+
+    excluded_names = {"Terry Hookstra"}
+    excluded_ids = {"005Ql00000CV3qkIAD"}
+    user_dict = {
+        user['Id']: user['Name']
+        for user in results['records']
+        if user['Id'] not in excluded_ids and user['Name'] not in excluded_names
+    }
+    return user_dict
+
+
+def org_key(sf_instance):
+    # The instance host identifies the org, so several connected orgs never share entries
+    return sf_instance.sf_instance
+
+
+class SalesforceMetadataCache:
+    def __init__(self, ttl=METADATA_TTL_SECONDS):
+        self.ttl = ttl
+        self._entries = {}  # (org, kind, name) -> (expires at, value)
+        self._lock = threading.Lock()
+
+    def _get(self, sf_instance, kind, name, loader):
+        key = (org_key(sf_instance), kind, name)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                return entry[1]
+
+        value = loader()
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+        return value
+
+    def invalidate(self, sf_instance=None, kind=None):
+        # No arguments clears everything; otherwise only one org and/or one kind of entry
+        with self._lock:
+            for key in list(self._entries):
+                if sf_instance is not None and key[0] != org_key(sf_instance):
+                    continue
+                if kind is not None and key[1] != kind:
+                    continue
+                del self._entries[key]
+
+    def describe(self, sf_instance, object_name):
+        return self._get(sf_instance, 'describe', object_name,
+                         lambda: sf_instance.__getattr__(object_name).describe())
+
+    def picklists(self, sf_instance, object_name):
+        # {field name: {'values': active picklist values, 'restricted': bool, 'multi': bool}}
+        def load():
+            return {
+                field['name']: {
+                    'values': {value['value'] for value in field['picklistValues'] if value.get('active', True)},
+                    'restricted': bool(field.get('restrictedPicklist')),
+                    'multi': field['type'] == 'multipicklist'
+                }
+                for field in self.describe(sf_instance, object_name)['fields']
+                if field.get('type') in ('picklist', 'multipicklist')
+            }
+        return self._get(sf_instance, 'picklists', object_name, load)
+
+    def picklist_values(self, sf_instance, object_name, field_name):
+        field = self.picklists(sf_instance, object_name).get(field_name)
+        return set(field['values']) if field else set()
+
+    def sales_users(self, sf_instance):
+        # Copy so callers can't mutate the cached round robin list
+        return dict(self._get(sf_instance, 'sales_users', 'User', lambda: get_active_sales_users(sf_instance)))
+
+
+# =======================
+# Picklist Validation
+# =======================
+def validate_picklists(payloads, picklists, restricted_only=True):
+    """
+    Replace picklist values Salesforce would reject, in place.
+
+    Invalid values become 'Unknown' when that is a valid choice for the field, otherwise
+    they are blanked. Returns {field: {rejected value: count}} for reporting.
+    """
+    rejected = {}
+    checked = {
+        name: field for name, field in picklists.items()
+        if field['restricted'] or not restricted_only
+    }
+
+    for payload in payloads:
+        for name, field in checked.items():
+            value = payload.get(name)
+            if value in (None, ''):
+                continue
+            valid = field['values']
+
+            if field['multi']:
+                parts = [part for part in str(value).split(';') if part]
+                kept = [part for part in parts if part in valid]
+                bad = [part for part in parts if part not in valid]
+                if not bad:
+                    continue
+                payload[name] = ';'.join(kept)
+            elif value in valid:
+                continue
+            else:
+                bad = [value]
+                payload[name] = 'Unknown' if 'Unknown' in valid else ''
+
+            counts = rejected.setdefault(name, {})
+            for part in bad:
+                counts[part] = counts.get(part, 0) + 1
+
+    return rejected
@@ -0,0 +1,425 @@
+import contextvars
+import csv
+import io
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from urllib.parse import quote
+
+import requests
+from simple_salesforce.exceptions import SalesforceGeneralError
+
+from salesforce_limits import LIMIT_RETRIES, ORG_CONCURRENT_REQUESTS, TokenBucket, is_limit_error, size_connection_pool
+
+# Keep Salesforce assignment rules from overriding our round robin owner
+AUTO_ASSIGN_HEADERS = {"Sforce-Auto-Assign": "FALSE"}
+
+# =======================
+# Single Record Create
+# =======================
+# Every result also carries 'seconds': how long the call (or Bulk API job) that carried the record took
+def insert_one(sf_instance, object_name, record, headers=AUTO_ASSIGN_HEADERS):
+    start = time.perf_counter()
+    try:
+        created = sf_instance.__getattr__(object_name).create(record, headers=headers)
+        return {'success': True, 'id': created.get('id'), 'error': None, 'seconds': time.perf_counter() - start}
+    except Exception as e:
+        return {'success': False, 'id': None, 'error': str(e), 'seconds': time.perf_counter() - start}
+
+
+def upsert_one(sf_instance, object_name, external_id_field, record, headers=AUTO_ASSIGN_HEADERS):
+    record = dict(record)
+    external_id = quote(str(record.pop(external_id_field)), safe='')
+    start = time.perf_counter()
+    try:
+        # simple_salesforce only returns the status: 201 created, 204 updated
+        status = sf_instance.__getattr__(object_name).upsert(f"{external_id_field}/{external_id}", record, headers=headers)
+        return {'success': True, 'id': None, 'error': None, 'created': status == 201, 'seconds': time.perf_counter() - start}
+    except Exception as e:
+        return {'success': False, 'id': None, 'error': str(e), 'seconds': time.perf_counter() - start}
+
+
+# =======================
+# Concurrent Single Record Create
+# =======================
+PUSH_WORKERS = 8  # Default number of parallel create requests
+MAX_PUSH_WORKERS = ORG_CONCURRENT_REQUESTS  # Threads one push may use; an ApiQuota caps all pushes together
+PUSH_RATE_PER_SECOND = 20  # Token bucket refill rate shared by all workers
+
+
+def concurrent_insert(sf_instance, object_name, records, on_result=None, workers=PUSH_WORKERS,
+                      rate=PUSH_RATE_PER_SECOND, headers=AUTO_ASSIGN_HEADERS, quota=None):
+    """
+    Create records one per request from a bounded pool of worker threads.
+
+    Returns one result dict per record in input order. `on_result(position, result)`
+    is called from the calling thread as requests complete, so it is safe to update
+    Streamlit widgets from it. With an ApiQuota, workers slow down and pause while
+    Salesforce throttles the org, throttled creates are sent again, and every request
+    takes one of the org's slots, so concurrent pushes share the org's request limit.
+    """
+    results = [None] * len(records)
+    if not records:
+        return results
+
+    workers = max(1, min(int(workers), MAX_PUSH_WORKERS))
+    size_connection_pool(sf_instance.session)  # Every worker gets its own connection
+    limiter = TokenBucket(rate, capacity=workers)
+
+    def send(record):
+        for _ in range(LIMIT_RETRIES + 1):
+            if quota:
+                quota.wait()
+                limiter.rate = rate * quota.rate_factor
+            limiter.acquire()
+            with quota.request_slot() if quota else nullcontext():
+                result = insert_one(sf_instance, object_name, record, headers)
+            if not (quota and is_limit_error(result['error'])):
+                break
+        return result
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        # Each worker call runs in a copy of the caller's context, so stage instrumentation follows it
+        futures = {executor.submit(contextvars.copy_context().run, send, record): position
+                   for position, record in enumerate(records)}
+        for future in as_completed(futures):
+            position = futures[future]
+            results[position] = future.result()
+            if on_result:
+                on_result(position, results[position])
+    finally:
+        # If the caller stops mid-push (e.g. Streamlit ends the script run), don't keep sending queued records
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    return results
+
+
+# =======================
+# sObject Collections (up to 200 records per call)
+# =======================
+COLLECTION_BATCH_SIZE = 200
+# Errors where the whole request failed in transit, not the records in it
+TRANSPORT_ERRORS = (requests.exceptions.RequestException, SalesforceGeneralError)
+
+
+def _collection_result(item):
+    if item.get('success'):
+        result = {'success': True, 'id': item.get('id'), 'error': None}
+        if 'created' in item:
+            result['created'] = item['created']
+        return result
+    errors = item.get('errors') or []
+    message = "; ".join(f"{error.get('statusCode')}: {error.get('message')}" for error in errors)
+    return {'success': False, 'id': None, 'error': message or 'Unknown collections error'}
+
+
+def _send_chunk(sf_instance, path, method, body, headers, quota):
+    # One Collections call; with an ApiQuota, a throttled call waits out the back-off and is sent again
+    for attempt in range(LIMIT_RETRIES + 1):
+        if quota:
+            quota.wait()
+        try:
+            with quota.request_slot() if quota else nullcontext():
+                return sf_instance.restful(path, method=method, json=body, headers=headers)
+        except Exception as e:
+            if not (quota and is_limit_error(e)) or attempt == LIMIT_RETRIES:
+                raise
+
+
+def _collections_write(sf_instance, object_name, records, method, path, send_one, on_progress, on_result,
+                       headers, batch_size, quota):
+    results = []
+
+    for start in range(0, len(records), batch_size):
+        chunk = records[start:start + batch_size]
+        body = {
+            'allOrNone': False,
+            'records': [dict(record, attributes={'type': object_name}) for record in chunk]
+        }
+        sent_at = time.perf_counter()
+        try:
+            response = _send_chunk(sf_instance, path, method, body, headers, quota)
+            chunk_results = [_collection_result(item) for item in response]
+        except Exception as e:
+            if is_limit_error(e):
+                # Stop rather than spend more of the org's quota; the chunk's rows are sent by the next push
+                raise
+            if isinstance(e, TRANSPORT_ERRORS):
+                chunk_results = [send_one(record) for record in chunk]
+            else:
+                chunk_results = [{'success': False, 'id': None, 'error': str(e)} for _ in chunk]
+        elapsed = time.perf_counter() - sent_at
+        for result in chunk_results:
+            result.setdefault('seconds', elapsed)
+
+        results.extend(chunk_results)
+        if on_result:
+            for offset, result in enumerate(chunk_results):
+                on_result(start + offset, result)
+        if on_progress:
+            on_progress(len(results), 'Collections')
+
+    return results
+
+
+def collections_insert(sf_instance, object_name, records, on_progress=None, on_result=None,
+                       headers=AUTO_ASSIGN_HEADERS, batch_size=COLLECTION_BATCH_SIZE, quota=None):
+    """
+    Insert records through /composite/sobjects with allOrNone=false.
+
+    Returns one result dict per record in input order, like bulk_insert. Chunks that
+    fail on a transport error are retried one record at a time with insert_one.
+    `on_result(position, result)` is called for every record as its chunk completes.
+    With an ApiQuota, chunks wait out throttling instead of failing.
+    """
+    return _collections_write(
+        sf_instance, object_name, records, 'POST', 'composite/sobjects',
+        lambda record: insert_one(sf_instance, object_name, record, headers),
+        on_progress, on_result, headers, batch_size, quota)
+
+
+def collections_upsert(sf_instance, object_name, external_id_field, records, on_progress=None, on_result=None,
+                       headers=AUTO_ASSIGN_HEADERS, batch_size=COLLECTION_BATCH_SIZE, quota=None):
+    """
+    Upsert records on `external_id_field` through /composite/sobjects/{object}/{field}.
+
+    Records may carry different fields; only the fields present are written. Results
+    are as for collections_insert, plus 'created' (False when an existing record was updated).
+    """
+    return _collections_write(
+        sf_instance, object_name, records, 'PATCH', f'composite/sobjects/{object_name}/{external_id_field}',
+        lambda record: upsert_one(sf_instance, object_name, external_id_field, record, headers),
+        on_progress, on_result, headers, batch_size, quota)
+
+
+# =======================
+# Bulk API 2.0 Ingest Settings
+# =======================
+BULK_POLL_INTERVAL = 2  # Seconds before the first job status check
+BULK_POLL_MAX_INTERVAL = 15  # Back off polling up to this many seconds
+BULK_MAX_WAIT = 60 * 60  # Seconds to wait for one job to finish before leaving it for a later resume
+BULK_MAX_JOB_BYTES = 100 * 1024 * 1024  # Salesforce allows 150 MB per job, keep headroom for encoding
+BULK_TERMINAL_STATES = {'JobComplete', 'Failed', 'Aborted'}
+
+
+class BulkJobTimeout(TimeoutError):
+    # Salesforce is still working on (or hasn't started) the job; its results can be collected later
+    def __init__(self, job_id, state, waited):
+        super().__init__(f"Bulk API job {job_id} is still {state} after {waited / 60:.0f} minutes")
+        self.job_id = job_id
+        self.state = state
+
+
+def _bulk_request(sf_instance, method, path, **kwargs):
+    # Reuse simple_salesforce's session, auth headers and error handling
+    return sf_instance._call_salesforce(method, sf_instance.base_url + path, name=path, **kwargs)
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    return str(value)
+
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerow(values)
+    return buffer.getvalue().encode('utf-8')
+
+
+def _fieldnames(records):
+    # Every field any record sets, in first-seen order; a blank CSV cell leaves the field untouched
+    return list(dict.fromkeys(field for record in records for field in record))
+
+
+def _iter_job_chunks(records, fieldnames, max_bytes=BULK_MAX_JOB_BYTES, key_fields=None):
+    # Yields (first record index, record keys, csv bytes) without ever holding more than one job's CSV
+    header = _csv_line(fieldnames)
+    key_positions = [fieldnames.index(field) for field in key_fields or fieldnames]
+    lines, keys, size, start = [], [], len(header), 0
+
+    for idx, record in enumerate(records):
+        values = [_csv_value(record.get(field)) for field in fieldnames]
+        line = _csv_line(values)
+        if lines and size + len(line) > max_bytes:
+            yield start, keys, header + b''.join(lines)
+            lines, keys, size, start = [], [], len(header), idx
+        lines.append(line)
+        keys.append(tuple(values[position] for position in key_positions))
+        size += len(line)
+
+    if lines:
+        yield start, keys, header + b''.join(lines)
+
+
+# =======================
+# Bulk API 2.0 Job Lifecycle
+# =======================
+def create_ingest_job(sf_instance, object_name, external_id_field=None):
+    # An external ID field makes it an upsert job
+    body = {
+        'object': object_name,
+        'operation': 'upsert' if external_id_field else 'insert',
+        'contentType': 'CSV',
+        'lineEnding': 'LF',
+        'columnDelimiter': 'COMMA'
+    }
+    if external_id_field:
+        body['externalIdFieldName'] = external_id_field
+    return _bulk_request(sf_instance, 'POST', 'jobs/ingest/', json=body).json()
+
+
+def upload_job_data(sf_instance, job_id, csv_bytes):
+    _bulk_request(sf_instance, 'PUT', f'jobs/ingest/{job_id}/batches/',
+                  data=csv_bytes, headers={'Content-Type': 'text/csv'})
+    return _bulk_request(sf_instance, 'PATCH', f'jobs/ingest/{job_id}/',
+                         json={'state': 'UploadComplete'}).json()
+
+
+def wait_for_ingest_job(sf_instance, job_id, on_status=None, poll_interval=BULK_POLL_INTERVAL, max_wait=BULK_MAX_WAIT):
+    # Raises BulkJobTimeout when the job isn't done within `max_wait` seconds; the job is left running
+    started = time.monotonic()
+    delay = poll_interval
+    while True:
+        job = _bulk_request(sf_instance, 'GET', f'jobs/ingest/{job_id}/').json()
+        if on_status:
+            on_status(job)
+        if job['state'] in BULK_TERMINAL_STATES:
+            return job
+        waited = time.monotonic() - started
+        if waited >= max_wait:
+            raise BulkJobTimeout(job_id, job['state'], waited)
+        time.sleep(min(delay, max_wait - waited))
+        delay = min(delay * 1.5, BULK_POLL_MAX_INTERVAL)
+
+
+def get_job_results(sf_instance, job_id, result_type):
+    # result_type is one of successfulResults, failedResults, unprocessedrecords
+    response = _bulk_request(sf_instance, 'GET', f'jobs/ingest/{job_id}/{result_type}/',
+                             headers={'Accept': 'text/csv'})
+    return list(csv.DictReader(io.StringIO(response.content.decode('utf-8'))))
+
+
+def _match_job_results(sf_instance, job, fieldnames, keys):
+    # Salesforce does not return results in upload order, so match each result row
+    # back to the record it echoes (by its external ID for upserts, else every field).
+    # Identical records are matched first come first served.
+    positions = defaultdict(deque)
+    for position, key in enumerate(keys):
+        positions[key].append(position)
+
+    outcomes = [None] * len(keys)
+
+    def assign(row, outcome):
+        key = tuple(row.get(field, '') for field in fieldnames)
+        if positions.get(key):
+            outcomes[positions[key].popleft()] = outcome
+
+    for row in get_job_results(sf_instance, job['id'], 'successfulResults'):
+        assign(row, {'success': True, 'id': row.get('sf__Id'), 'error': None,
+                     'created': row.get('sf__Created', 'true') == 'true'})
+
+    for row in get_job_results(sf_instance, job['id'], 'failedResults'):
+        assign(row, {'success': False, 'id': None, 'error': row.get('sf__Error') or 'Unknown bulk error'})
+
+    not_processed = job.get('errorMessage') or f"Record was not processed (bulk job {job['state']})"
+    return [
+        outcome or {'success': False, 'id': None, 'error': not_processed}
+        for outcome in outcomes
+    ]
+
+
+# =======================
+# Bulk Insert and Upsert Entry Points
+# =======================
+def bulk_insert(sf_instance, object_name, records, on_progress=None, on_result=None, on_job=None,
+                poll_interval=BULK_POLL_INTERVAL, max_job_bytes=BULK_MAX_JOB_BYTES, quota=None, max_wait=BULK_MAX_WAIT):
+    """
+    Insert records through Bulk API 2.0 ingest jobs.
+
+    Returns one result dict per record, in the same order as `records`:
+    {'success': bool, 'id': record id or None, 'error': error text or None}
+
+    `on_job(job_id, start, count)` is called as soon as each job is created, before
+    its data is uploaded, so callers can resume it with resume_bulk_job. With an
+    ApiQuota, no new job is started while the org is backing off or out of requests.
+    Raises BulkJobTimeout when a job takes longer than `max_wait` seconds.
+    """
+    return _bulk_write(sf_instance, object_name, records, None, on_progress, on_result, on_job,
+                       poll_interval, max_job_bytes, quota, max_wait)
+
+
+def bulk_upsert(sf_instance, object_name, external_id_field, records, on_progress=None, on_result=None, on_job=None,
+                poll_interval=BULK_POLL_INTERVAL, max_job_bytes=BULK_MAX_JOB_BYTES, quota=None, max_wait=BULK_MAX_WAIT):
+    """
+    Upsert records on `external_id_field` through Bulk API 2.0 ingest jobs.
+
+    Records may carry different fields: blank cells leave existing values alone.
+    Results are as for bulk_insert, plus 'created' (False when a record was updated).
+    """
+    return _bulk_write(sf_instance, object_name, records, external_id_field, on_progress, on_result, on_job,
+                       poll_interval, max_job_bytes, quota, max_wait)
+
+
+def _bulk_write(sf_instance, object_name, records, external_id_field, on_progress, on_result, on_job,
+                poll_interval, max_job_bytes, quota, max_wait):
+    if not records:
+        return []
+
+    fieldnames = _fieldnames(records)
+    key_fields = [external_id_field] if external_id_field else fieldnames
+    results = []
+
+    for start, keys, csv_bytes in _iter_job_chunks(records, fieldnames, max_job_bytes, key_fields):
+        if quota:
+            quota.wait()
+        sent_at = time.perf_counter()
+        job = create_ingest_job(sf_instance, object_name, external_id_field)
+        if on_job:
+            on_job(job['id'], start, len(keys))
+        upload_job_data(sf_instance, job['id'], csv_bytes)
+
+        def report(job_info, start=start):
+            if on_progress:
+                processed = start + int(job_info.get('numberRecordsProcessed') or 0)
+                on_progress(min(processed, len(records)), job_info['state'])
+
+        job = wait_for_ingest_job(sf_instance, job['id'], on_status=report, poll_interval=poll_interval,
+                                  max_wait=max_wait)
+        chunk_results = _match_job_results(sf_instance, job, key_fields, keys)
+        elapsed = time.perf_counter() - sent_at
+        for result in chunk_results:
+            result['seconds'] = elapsed
+        results.extend(chunk_results)
+        if on_result:
+            for offset, result in enumerate(chunk_results):
+                on_result(start + offset, result)
+
+    return results
+
+
+def resume_bulk_job(sf_instance, job_id, records, on_progress=None, poll_interval=BULK_POLL_INTERVAL,
+                    external_id_field=None, max_wait=BULK_MAX_WAIT):
+    """
+    Collect the results of a job started by an earlier, interrupted bulk_insert or bulk_upsert.
+
+    `records` must be the records that were sent in that job (for an upsert, records
+    with the same external IDs). Returns None when the job never received its data;
+    it is aborted and the records should be sent again.
+    """
+    job = _bulk_request(sf_instance, 'GET', f'jobs/ingest/{job_id}/').json()
+    if job['state'] == 'Open':
+        _bulk_request(sf_instance, 'PATCH', f'jobs/ingest/{job_id}/', json={'state': 'Aborted'})
+        return None
+
+    key_fields = [external_id_field] if external_id_field else _fieldnames(records)
+    keys = [tuple(_csv_value(record.get(field)) for field in key_fields) for record in records]
+
+    def report(job_info):
+        if on_progress:
+            on_progress(min(int(job_info.get('numberRecordsProcessed') or 0), len(records)), job_info['state'])
+
+    job = wait_for_ingest_job(sf_instance, job_id, on_status=report, poll_interval=poll_interval, max_wait=max_wait)
+    return _match_job_results(sf_instance, job, key_fields, keys)
@@ -0,0 +1,106 @@
+import math
+import random
+import time
+
+from salesforce_limits import is_daily_limit_error, is_limit_error
+
+# =======================
+# Error Classification
+# =======================
+TRANSIENT = 'transient'
+PERMANENT = 'permanent'
+DUPLICATE = 'duplicate'
+
+# Failures that say nothing about the record itself: the same send can succeed moments later
+TRANSIENT_ERROR_MARKERS = (
+    'UNABLE_TO_LOCK_ROW',
+    'SERVER_UNAVAILABLE',
+    'REQUEST_RUNNING_TOO_LONG',
+    'Error Code 500.',
+    'Error Code 502.',
+    'Error Code 503.',
+    'Error Code 504.',
+    'timed out',
+    'Connection aborted',
+    'Connection reset',
+    'Max retries exceeded',
+    'RemoteDisconnected',
+    'Record was not processed',  # Left over by a bulk job that failed or was aborted
+)
+
+
+def classify_error(error):
+    """
+    TRANSIENT, PERMANENT or DUPLICATE for a push result's error text; None when there
+    was no error. The daily API limit counts as permanent: it won't lift within a push.
+    """
+    if not error:
+        return None
+    text = str(error)
+    if 'DUPLICATES_DETECTED' in text:
+        return DUPLICATE
+    if is_limit_error(text):
+        return PERMANENT if is_daily_limit_error(text) else TRANSIENT
+    if any(marker in text for marker in TRANSIENT_ERROR_MARKERS):
+        return TRANSIENT
+    return PERMANENT
+
+
+# =======================
+# Retry Queue
+# =======================
+RETRY_MAX_ATTEMPTS = 3  # Re-sends per row
+RETRY_BUDGET_SHARE = 0.2  # Re-sends per push, as a share of its rows ...
+RETRY_BUDGET_MIN = 50  # ... but never fewer than this
+RETRY_BASE_SECONDS = 2  # Back-off before the first retry round; doubles each round
+RETRY_MAX_SECONDS = 60
+
+
+def backoff_delay(attempt, base=RETRY_BASE_SECONDS, cap=RETRY_MAX_SECONDS):
+    # Exponential back-off with equal jitter: half the delay is fixed, half random,
+    # so pushes that failed together don't all come back at the same moment
+    delay = min(cap, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class RetryQueue:
+    """
+    Rows whose send failed on a transient error, re-sent in rounds after a jittered
+    exponential back-off. Each row is retried at most `max_attempts` times, and the
+    push as a whole at most `budget` times, so an outage isn't met with a flood of
+    re-sends. Rows are (row index, payload, log entry) entries.
+    """
+
+    def __init__(self, rows, max_attempts=RETRY_MAX_ATTEMPTS, budget_share=RETRY_BUDGET_SHARE,
+                 budget_min=RETRY_BUDGET_MIN):
+        self.max_attempts = max_attempts
+        self.budget = max(budget_min, math.ceil(rows * budget_share))
+        self.used = 0
+        self.exhausted = False  # A transient failure was given up on because the budget ran out
+        self._attempts = {}  # row index -> re-sends so far
+        self._queued = []
+
+    def offer(self, entry, result):
+        # True when the failed row was queued for another try instead of being final
+        if result['success'] or classify_error(result['error']) != TRANSIENT:
+            return False
+        attempts = self._attempts.get(entry[0], 0)
+        if attempts >= self.max_attempts:
+            return False
+        if self.used >= self.budget:
+            self.exhausted = True
+            return False
+        self._attempts[entry[0]] = attempts + 1
+        self.used += 1
+        self._queued.append(entry)
+        return True
+
+    def rounds(self, sleep=time.sleep):
+        # Yields the queued rows, in file order, once per back-off round until none are left
+        attempt = 0
+        while self._queued:
+            sleep(backoff_delay(attempt))
+            batch = sorted(self._queued, key=lambda entry: entry[0])
+            self._queued = []
+            yield batch
+            attempt += 1
@@ -0,0 +1,89 @@
+from salesforce_duplicates import chunk_in_clauses
+
+# =======================
+# Upsert on an External ID
+# =======================
+EXTERNAL_ID_FIELD = 'msid__c'  # miEdge's MSID, stable across monthly extracts
+
+# Only set when a lead is created: a refresh never reassigns or relabels an existing lead
+CREATE_ONLY_FIELDS = {'OwnerId', 'LeadSource'}
+
+# Planned action per record
+CREATE = 'create'
+UPDATE = 'update'
+UNCHANGED = 'unchanged'
+MISSING_ID = 'missing_id'
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def same_value(new, old):
+    """
+    Whether `new` leaves Salesforce's `old` value as it is. A blank in the refreshed
+    extract never clears a value (Bulk API ignores blank cells too), and numbers
+    compare numerically (Salesforce returns 25.0 for an employee count sent as '25').
+    """
+    if _blank(new):
+        return True
+    if _blank(old):
+        return False
+    if isinstance(old, (int, float)) and not isinstance(old, bool):
+        try:
+            return float(new) == float(old)
+        except (TypeError, ValueError):
+            return False
+    return str(new).strip() == str(old).strip()
+
+
+def fetch_existing(sf_instance, object_name, external_id_field, fields, external_ids):
+    # {external ID: existing record} for the IDs that are already in Salesforce
+    select = ', '.join(['Id', external_id_field] + [field for field in fields if field not in ('Id', external_id_field)])
+    prefix = f"SELECT {select} FROM {object_name} WHERE {external_id_field}"
+    existing = {}
+    for soql in chunk_in_clauses(prefix, sorted(external_ids)):
+        for record in sf_instance.query_all(soql)['records']:
+            existing[str(record[external_id_field])] = record
+    return existing
+
+
+def plan_upsert(sf_instance, object_name, records, external_id_field=EXTERNAL_ID_FIELD, placeholders=None):
+    """
+    Compare `records` with what Salesforce already holds under the same external IDs.
+
+    Returns one (action, record to send, existing Id) per record, in order:
+    CREATE sends the full record; UPDATE sends the external ID plus only the fields
+    that differ (never CREATE_ONLY_FIELDS); UNCHANGED and MISSING_ID send nothing.
+    `placeholders` ({field: value}) are the stand-ins the mapping uses for a blank
+    source value; an update treats them as blank, so they never replace a real value.
+    """
+    placeholders = placeholders or {}
+    fields = list(dict.fromkeys(field for record in records for field in record
+                                if field not in CREATE_ONLY_FIELDS))
+    external_ids = {str(record.get(external_id_field)).strip() for record in records
+                    if not _blank(record.get(external_id_field))}
+    existing = fetch_existing(sf_instance, object_name, external_id_field, fields, external_ids) if external_ids else {}
+
+    plan = []
+    for record in records:
+        if _blank(record.get(external_id_field)):
+            plan.append((MISSING_ID, None, None))
+            continue
+
+        external_id = str(record[external_id_field]).strip()
+        current = existing.get(external_id)
+        if current is None:
+            plan.append((CREATE, dict(record, **{external_id_field: external_id}), None))
+            continue
+
+        changed = {
+            field: value for field, value in record.items()
+            if field not in CREATE_ONLY_FIELDS and field != external_id_field
+            and not same_value(None if placeholders.get(field) == value else value, current.get(field))
+        }
+        if changed:
+            plan.append((UPDATE, {external_id_field: external_id, **changed}, current['Id']))
+        else:
+            plan.append((UNCHANGED, None, current['Id']))
+    return plan
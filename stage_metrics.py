@@ -0,0 +1,138 @@
+import contextvars
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# =======================
+# Stage Instrumentation
+# =======================
+METRICS_MAX_EVENTS = 5000  # Structured log entries kept per metrics object; older ones are dropped
+LATENCY_SAMPLES = 50000  # Per-record latencies kept per stage for the percentiles
+
+# (StageMetrics, stage name) the current thread is timing; API calls made under it are charged to that stage
+_current_stage = contextvars.ContextVar('miedge_stage', default=None)
+
+
+def _percentile(values, share):
+    # Nearest rank, so a p95 is always a latency that actually happened
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(share * len(ordered)) - 1))]
+
+
+def _body_size(body):
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode('utf-8'))
+    try:
+        return len(body)
+    except TypeError:
+        return 0  # A streamed body; its size isn't known up front
+
+
+class StageMetrics:
+    """
+    Wall time, API calls, bytes sent and per-record latency for each named stage of an
+    upload, plus a capped structured log of what happened. Thread safe: a push's worker
+    threads report into the same object.
+    """
+
+    def __init__(self, max_events=METRICS_MAX_EVENTS):
+        self._stages = {}  # name -> totals, in the order stages first ran
+        self.events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+
+    def _totals(self, name):
+        # Caller holds the lock
+        if name not in self._stages:
+            self._stages[name] = {'runs': 0, 'seconds': 0.0, 'last_seconds': 0.0, 'calls': 0, 'bytes_sent': 0,
+                                  'records': 0, 'latencies': deque(maxlen=LATENCY_SAMPLES)}
+        return self._stages[name]
+
+    @contextmanager
+    def stage(self, name):
+        token = _current_stage.set((self, name))
+        started_at = time.time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            _current_stage.reset(token)
+            seconds = time.perf_counter() - start
+            with self._lock:
+                totals = self._totals(name)
+                totals['runs'] += 1
+                totals['seconds'] += seconds
+                totals['last_seconds'] = seconds
+                self.events.append({'event': 'stage', 'stage': name, 'started_at': started_at,
+                                    'seconds': round(seconds, 6)})
+
+    def record_call(self, name, method, path, status, bytes_sent, seconds):
+        with self._lock:
+            totals = self._totals(name)
+            totals['calls'] += 1
+            totals['bytes_sent'] += bytes_sent
+            self.events.append({'event': 'api_call', 'stage': name, 'at': time.time(), 'method': method, 'path': path,
+                                'status': status, 'bytes_sent': bytes_sent, 'seconds': round(seconds, 6)})
+
+    def record_latency(self, name, seconds):
+        # How long the call (or Bulk API job) that carried one record took
+        if seconds is None:
+            return
+        with self._lock:
+            totals = self._totals(name)
+            totals['records'] += 1
+            totals['latencies'].append(seconds)
+
+    def summary(self):
+        # One row per stage, ready for a table
+        with self._lock:
+            stages = [(name, dict(totals, latencies=list(totals['latencies']))) for name, totals in self._stages.items()]
+        rows = []
+        for name, totals in stages:
+            p50 = _percentile(totals['latencies'], 0.50)
+            p95 = _percentile(totals['latencies'], 0.95)
+            rows.append({
+                'stage': name,
+                'runs': totals['runs'],
+                'seconds': round(totals['seconds'], 4),
+                'last_seconds': round(totals['last_seconds'], 4),
+                'api_calls': totals['calls'],
+                'bytes_sent': totals['bytes_sent'],
+                'records': totals['records'],
+                'p50_ms': None if p50 is None else round(p50 * 1000, 1),
+                'p95_ms': None if p95 is None else round(p95 * 1000, 1),
+            })
+        return rows
+
+    def to_json_lines(self):
+        # The per-stage summary followed by the event log, one JSON object per line
+        with self._lock:
+            events = list(self.events)
+        lines = [dict(row, event='summary') for row in self.summary()] + events
+        return "\n".join(json.dumps(line, default=str) for line in lines) + "\n"
+
+
+def record_response(response, *args, **kwargs):
+    """
+    requests response hook: charge the call to the stage the calling thread is timing,
+    if any. Pass it as hooks={'response': record_response} or via instrument_session.
+    """
+    current = _current_stage.get()
+    if current is not None:
+        metrics, name = current
+        request = response.request
+        metrics.record_call(name, request.method, request.path_url, response.status_code,
+                            _body_size(request.body), response.elapsed.total_seconds())
+    return response
+
+
+def instrument_session(session):
+    # Safe to call on every push; the hook is only added once per session
+    if record_response not in session.hooks['response']:
+        session.hooks['response'].append(record_response)
+    return session
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# The app's modules live at the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep pushes made by tests out of the app's checkpoint database
+os.environ.setdefault('MIEDGE_CHECKPOINT_DB', os.path.join(tempfile.mkdtemp(prefix='miedge-tests-'), 'checkpoints.sqlite3'))
@@ -0,0 +1,32 @@
+import pandas as pd
+
+from miedge_pipeline import company_keys
+
+
+def groups(names, **options):
+    keys = company_keys(pd.Series(names), **options)
+    return keys.nunique()
+
+
+def test_canonical_names_group_without_fuzzy_matching():
+    report = {}
+    assert groups(['Acme, Inc.', 'ACME Inc', 'The Acme Incorporated', 'Acme Plumbng', 'Acme Plumbing']) == 3
+    company_keys(pd.Series(['Acme Plumbng', 'Acme Plumbing']), report=report)
+    assert report == {'fuzzy_merges': 0}
+
+
+def test_fuzzy_matching_merges_typos_and_reports_them():
+    report = {}
+    keys = company_keys(pd.Series(['Acme Plumbng', 'Acme Plumbing', 'Northern Lihgts LLC', 'Northern Lights']),
+                        fuzzy=True, report=report)
+    assert keys.nunique() == 2
+    assert report == {'fuzzy_merges': 2}
+
+
+def test_fuzzy_matching_never_merges_a_different_word_or_number():
+    names = ['North Texas Bank', 'North Texas Tank', 'Store 12', 'Store 13',
+             'Greater Houston Community Federal Credit Union Bank',
+             'Greater Houston Community Federal Credit Union Tank']
+    report = {}
+    assert company_keys(pd.Series(names), fuzzy=True, report=report).nunique() == len(names)
+    assert report == {'fuzzy_merges': 0}
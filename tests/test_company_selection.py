@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+from miedge_pipeline import company_keys, job_title_rank, select_one_lead_per_company
+
+
+def reference_selection(df):
+    # The original groupby loop, with the stable sort it meant: best title, ties in file order
+    selected_rows = []
+    for company, group in df.groupby('__company_key', dropna=False):
+        ranks = group['Job Title'].apply(job_title_rank)
+        selected_rows.append(group.loc[ranks.sort_values(kind='stable').index[0]])
+    return pd.DataFrame(selected_rows).drop(columns=['__company_key'])
+
+
+def leads(rows):
+    df = pd.DataFrame(rows, columns=['Contact Company name', 'Job Title', 'Contact Email', 'Last Updated'])
+    df['__company_key'] = company_keys(df['Contact Company name'])
+    return df
+
+
+TIE_CASES = {
+    'equal rank keeps the first row': [
+        ('Acme Inc', 'CEO', 'first@acme.com', '2024-01-01'),
+        ('ACME', 'Chief Executive Officer', 'second@acme.com', '2024-01-01'),
+    ],
+    'equal rank ignores newer dates': [
+        ('Beta LLC', 'President', 'older@beta.com', '2023-01-01'),
+        ('Beta', 'President', 'newer@beta.com', '2024-06-01'),
+    ],
+    'better rank wins over input order': [
+        ('Gamma Co', 'Office Manager', 'manager@gamma.com', '2024-01-01'),
+        ('Gamma Co', 'CFO', 'cfo@gamma.com', '2024-01-01'),
+        ('Gamma Co', 'CFO', 'cfo2@gamma.com', '2024-01-01'),
+    ],
+    'unranked titles keep the first row': [
+        ('Delta', None, 'blank@delta.com', '2024-01-01'),
+        ('Delta', 'Sales Associate', 'sales@delta.com', '2024-01-01'),
+    ],
+    'blank companies group together': [
+        (None, 'COO', 'coo@unknown.com', '2024-01-01'),
+        ('', 'CEO', 'ceo@unknown.com', '2024-01-01'),
+    ],
+}
+
+
+@pytest.mark.parametrize('rows', TIE_CASES.values(), ids=TIE_CASES.keys())
+def test_matches_the_reference_loop_on_ties(rows):
+    df = leads(rows)
+    expected = reference_selection(df)
+    pd.testing.assert_frame_equal(select_one_lead_per_company(df), expected, check_dtype=False)
+
+
+def test_matches_the_reference_loop_with_companies_interleaved():
+    df = leads([row for case in TIE_CASES.values() for row in case][::-1])
+    expected = reference_selection(df)
+    pd.testing.assert_frame_equal(select_one_lead_per_company(df), expected, check_dtype=False)
@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from miedge_pipeline import DateNormalizer
+
+
+def test_threads_sharing_a_small_cache_get_every_date():
+    # A cache this small is cleared on almost every call, while other threads are mid-call
+    dates = DateNormalizer(cache_size=5)
+    columns = [pd.Series([f"{month}/{day}/2024" for day in range(1, 29)] + ['', 'not a date'])
+               for month in range(1, 13)]
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        results = list(pool.map(dates.to_iso, columns * 5))
+
+    for column, iso in zip(columns * 5, results):
+        expected = [pd.Timestamp(value).strftime('%Y-%m-%d') for value in column[:-2]] + [None, None]
+        assert iso.tolist() == expected
+
+
+class ForgetfulCache(dict):
+    # Another thread clearing the shared cache right after this call filled it
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.clear()
+
+
+def test_a_cleared_cache_does_not_lose_this_calls_dates():
+    dates = DateNormalizer()
+    dates._cache = ForgetfulCache()
+    assert dates.to_iso(pd.Series(['01/02/2024', '2024-03-04'])).tolist() == ['2024-01-02', '2024-03-04']
+
+
+def test_unparseable_dates_are_reported():
+    report = {}
+    iso = DateNormalizer().to_iso(pd.Series(['2024-01-31', 'soon', 'soon', None]), report)
+    assert iso.tolist() == ['2024-01-31', None, None, None]
+    assert report == {'soon': 2}
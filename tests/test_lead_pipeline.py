@@ -0,0 +1,68 @@
+import io
+
+import pandas as pd
+
+import miedge_pipeline
+from frame_store import FrameStore
+from miedge_pipeline import SOURCE_FILE_COLUMN, LeadPipeline, content_hash
+
+
+def upload(name, rows):
+    data = pd.DataFrame(rows).to_csv(index=False).encode('utf-8')
+    source = io.BytesIO(data)
+    source.name = name
+    return source
+
+
+def export(region, companies):
+    return [{'MSID': f"{region}{i}", 'Job Title': title, 'Contact Company name': company,
+             'Contact Email': f"{region.lower()}{i}@example.com", 'Annual Revenue': f"{region} revenue {i}"}
+            for i, (company, title) in enumerate(companies)]
+
+
+def test_download_keeps_columns_the_app_does_not_parse():
+    source = upload('east.csv', export('East', [('Acme', 'Office Manager'), ('Acme', 'CEO'), ('Beta', 'CFO')]))
+    pipeline = LeadPipeline()
+    upload_hash = content_hash(source.getbuffer())
+    leads = pipeline.select_leads(upload_hash, source, [], [])
+    assert 'Annual Revenue' not in leads.columns
+
+    download = pd.read_csv(io.BytesIO(pipeline.to_csv(upload_hash, source, [], [], leads)))
+
+    assert download['MSID'].tolist() == ['East1', 'East2']
+    assert download['Annual Revenue'].tolist() == ['East revenue 1', 'East revenue 2']
+
+
+def test_batch_download_finds_each_rows_own_file():
+    east = upload('east.csv', export('East', [('Acme', 'CEO'), ('Beta', 'Office Manager'), ('Beta', 'CFO')]))
+    west = upload('west.csv', export('West', [('Gamma', 'Office Manager'), ('Delta', 'COO'), ('Acme', 'CFO')]))
+    pipeline = LeadPipeline()
+    leads = pipeline.select_leads('batch', [east, west], [], [])
+
+    download = pd.read_csv(io.BytesIO(pipeline.to_csv('batch', [east, west], [], [], leads)))
+
+    assert download[['MSID', 'Annual Revenue', SOURCE_FILE_COLUMN]].values.tolist() == [
+        ['East0', 'East revenue 0', 'east.csv'],
+        ['East2', 'East revenue 2', 'east.csv'],
+        ['West1', 'West revenue 1', 'west.csv'],
+    ]
+
+
+def test_stored_frames_are_reused_only_by_the_same_pipeline_version(tmp_path, monkeypatch):
+    source = upload('east.csv', export('East', [('Acme', 'CEO'), ('Beta', 'CFO')]))
+    upload_hash = content_hash(source.getbuffer())
+    store = FrameStore(path=str(tmp_path))
+    parses = []
+    parse_export = miedge_pipeline.parse_export
+    monkeypatch.setattr(miedge_pipeline, 'parse_export', lambda *args: parses.append(args) or parse_export(*args))
+
+    def run():
+        return LeadPipeline(store=store).select_leads(upload_hash, source, [], [])
+
+    first = run()
+    pd.testing.assert_frame_equal(run(), first)
+    assert len(parses) == 1
+
+    monkeypatch.setattr(miedge_pipeline, 'PIPELINE_VERSION', miedge_pipeline.PIPELINE_VERSION + 1)
+    run()
+    assert len(parses) == 2
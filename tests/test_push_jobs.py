@@ -0,0 +1,103 @@
+import time
+from functools import partial
+
+import pandas as pd
+
+import push_jobs
+from fake_salesforce import connect
+from push_checkpoint import PushCheckpoint
+from push_jobs import FINISHED, INTERRUPTED, PushJob, PushJobManager, run_push
+from salesforce_metadata import SalesforceMetadataCache
+
+USERS = {'005TEST000000001': 'Sales User'}
+
+
+def leads(tag, rows=3):
+    # Rows unique to one test, so tests never share a checkpoint
+    return pd.DataFrame({
+        'Contact First Name': [f"{tag}{i}" for i in range(rows)],
+        'Contact Last Name': [f"Last{i}" for i in range(rows)],
+        'Contact Company name': [f"Company {i}" for i in range(rows)],
+        'Contact Email': [f"{tag}{i}@company{i}.example.com" for i in range(rows)],
+        'Job Title': ['CEO'] * rows,
+    })
+
+
+def push(sf, df, resume=True):
+    job = PushJob('test', 'test push')
+    run_push(job, sf, df, 'Lead', SalesforceMetadataCache(), 'collections', resume=resume, match_on=())
+    return job.snapshot()
+
+
+def test_finished_push_is_not_replayed_as_a_new_result():
+    sf, fake = connect(users=USERS)
+    df = leads('Replay')
+    first = push(sf, df)
+    assert first['success_count'] == 3
+    requests_after_first = fake.request_count
+
+    again = push(sf, df)
+
+    assert again['done'] == again['success_count'] == 0
+    assert any('already pushed on' in message for _, message in again['notices'])
+    assert len(fake.records) == 3
+    assert fake.request_count - requests_after_first < 5  # Metadata lookups at most, no sends
+
+
+def test_finished_push_can_be_sent_again_without_resume():
+    sf, _ = connect(users=USERS)
+    df = leads('Again')
+    push(sf, df)
+
+    again = push(sf, df, resume=False)
+
+    # Sent again from the start; the org's duplicate rule is what stops them this time
+    assert again['done'] == again['duplicate_count'] == 3
+    assert not any('already pushed on' in message for _, message in again['notices'])
+
+
+def wait_for(job):
+    while job.snapshot()['active']:
+        time.sleep(0.01)
+    return job.snapshot()
+
+
+def test_a_stuck_bulk_job_stops_the_push_and_is_collected_by_the_next_one(monkeypatch):
+    monkeypatch.setattr(push_jobs, 'bulk_insert', partial(push_jobs.bulk_insert, poll_interval=0.01, max_wait=0.05))
+    sf, fake = connect(users=USERS, stuck_jobs=True)
+    df = leads('Stuck')
+    jobs = PushJobManager(max_workers=1)
+
+    job = jobs.submit('stuck', run_push, sf, df, 'Lead', SalesforceMetadataCache(), 'bulk', match_on=())
+    stuck = wait_for(job)
+
+    assert stuck['state'] == INTERRUPTED
+    assert any(level == 'warning' and 'still InProgress' in message for level, message in stuck['notices'])
+    [job_id] = fake.jobs
+    saved = PushCheckpoint(job.checkpoint_key).load()
+    assert [row['bulk_job_id'] for row in saved['rows']] == [job_id] * 3
+    assert not fake.records
+
+    fake.stuck_jobs = False
+    resumed = wait_for(jobs.submit('resumed', run_push, sf, df, 'Lead', SalesforceMetadataCache(), 'bulk',
+                                   match_on=()))
+
+    assert resumed['state'] == FINISHED
+    assert resumed['success_count'] == 3
+    assert list(fake.jobs) == [job_id]  # Collected, not sent again
+    assert len(fake.records) == 3
+
+
+def test_collections_push_reports_rows_in_file_order_through_an_outage():
+    # Every Collections call fails in transit, so each record goes out on its own
+    sf, _ = connect(users=USERS, outage=lambda method, path: path == 'composite/sobjects',
+                    reject=lambda record: ('INVALID_FIELD', 'bad company') if record['Company'] == 'Bad Co' else None)
+    df = leads('Order', rows=5)
+    df.loc[[1, 3], 'Contact Company name'] = 'Bad Co'
+
+    result = push(sf, df)
+
+    assert result['success_count'] == 3 and result['failed_count'] == 2
+    assert [message.split(':')[0] for message in result['failed_messages']] == ['Row 2', 'Row 4']
+    assert all('bad company' in message for message in result['failed_messages'])
+    assert [entry['Company'] for entry in result['assignment_log']] == ['Company 0', 'Company 2', 'Company 4']
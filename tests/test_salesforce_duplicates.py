@@ -0,0 +1,40 @@
+from urllib.parse import quote_plus
+
+import pytest
+
+from fake_salesforce import connect
+from miedge_pipeline import canonical_company
+from salesforce_duplicates import SOQL_MAX_ENCODED_LENGTH, DuplicateIndex, _company_key, chunk_in_clauses, soql_literal
+
+
+@pytest.mark.parametrize('names', [
+    ['Acme, Inc.', 'ACME Inc', 'The Acme Incorporated', 'acme'],
+    ['North Texas Bank LLC', 'north texas bank'],
+])
+def test_duplicate_check_groups_companies_like_lead_selection(names):
+    assert {_company_key(name) for name in names} == {canonical_company(names[0])}
+
+
+def test_existing_company_is_found_under_another_spelling():
+    sf, fake = connect()
+    fake.records['00QEXISTING'] = {'attributes': {'type': 'Lead'}, 'Company': 'ACME Inc'}
+
+    index = DuplicateIndex.load(sf, [{'Company': 'Acme, Inc.'}, {'Company': 'Unknown'}], match_on=('company',))
+
+    assert index.match({'Company': 'Acme, Inc.'}) == ('company', 'Lead', '00QEXISTING')
+    assert index.match({'Company': 'Unknown'}) is None
+
+
+@pytest.mark.parametrize('values', [
+    [f"O'Brien & Sons {'x' * 300} {i}" for i in range(200)],
+    ["Quote's \\ back'slash" * 20] * 50 + [f"company {i}" for i in range(2000)],
+])
+def test_every_lookup_stays_under_the_encoded_length(values):
+    prefix = "SELECT Id, Company FROM Lead WHERE Company"
+
+    queries = list(chunk_in_clauses(prefix, values))
+
+    assert len(queries) > 1
+    assert all(len(quote_plus(query)) <= SOQL_MAX_ENCODED_LENGTH for query in queries)
+    sent = [literal for query in queries for literal in query[len(prefix) + 5:-1].split(', ')]
+    assert sent == [soql_literal(value) for value in values]
@@ -0,0 +1,70 @@
+import pytest
+
+import salesforce_limits
+from fake_salesforce import connect
+from push_jobs import INSERT, PushJob, plan_push_mode, run_push
+from salesforce_limits import QuotaExhausted, choose_push_mode, estimate_calls, org_quota
+from salesforce_metadata import SalesforceMetadataCache
+from salesforce_push import concurrent_insert
+from test_push_jobs import USERS, leads
+
+
+@pytest.fixture(autouse=True)
+def fresh_quotas(monkeypatch):
+    # Every fake org has the same URL, so give each test its own ApiQuota registry
+    monkeypatch.setattr(salesforce_limits, '_quotas', {})
+
+
+def test_automatic_mode_follows_the_row_count_and_the_quota():
+    assert choose_push_mode(1) == 'single'
+    assert choose_push_mode(500) == 'collections'
+    assert choose_push_mode(5000) == 'bulk'
+    # 5000 leads through Collections would take 28 requests; Bulk API fits in 13
+    assert estimate_calls('collections', 5000) == 28 and estimate_calls('bulk', 5000) == 13
+    assert choose_push_mode(1500, available=11) == 'collections'
+    assert choose_push_mode(1500, available=10) == 'bulk'  # Nothing fits; Bulk API is the last resort
+
+
+def test_collections_gives_way_to_bulk_when_it_would_eat_into_the_reserve():
+    # 1000 requests a day, 100 kept in reserve: 19 left once /limits has been read
+    sf, _ = connect(api_limit=1000, api_used=880)
+    job = PushJob('plan', 'plan')
+
+    chosen = plan_push_mode(job, sf, org_quota(sf), 'collections', 5000, INSERT)
+
+    assert chosen == 'bulk'
+    assert any('Switched from collections to bulk' in message for _, message in job.snapshot()['notices'])
+
+
+def test_a_push_that_cannot_fit_stops_before_sending_anything():
+    sends = []
+    sf, fake = connect(users=USERS, api_limit=1000, api_used=900,
+                       outage=lambda method, path: sends.append(path) if path.startswith('composite') else False)
+    job = PushJob('full', 'full')
+
+    with pytest.raises(QuotaExhausted):
+        run_push(job, sf, leads('Quota'), 'Lead', SalesforceMetadataCache(), 'collections', match_on=())
+
+    assert not sends
+    assert not fake.records
+
+
+def test_a_throttled_create_is_sent_again_at_half_rate(monkeypatch):
+    monkeypatch.setattr(salesforce_limits, 'LIMIT_PAUSE_SECONDS', 0.01)
+    rate_factors = []
+
+    def throttle(method, path):
+        # Refuse the first create on the concurrent request limit, noting the rate each create went out at
+        if path == 'sobjects/Lead':
+            rate_factors.append(quota.rate_factor)
+            return len(rate_factors) == 1
+        return False
+
+    sf, fake = connect(throttle=throttle)
+    quota = org_quota(sf)
+
+    [result] = concurrent_insert(sf, 'Lead', [{'LastName': 'Throttled', 'Company': 'Acme'}], quota=quota)
+
+    assert result['success']
+    assert rate_factors == [1.0, 0.5]
+    assert len(fake.records) == 1
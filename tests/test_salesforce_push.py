@@ -0,0 +1,180 @@
+import threading
+
+import pytest
+
+from fake_salesforce import connect
+from salesforce_limits import ApiQuota, org_quota
+from salesforce_push import (MAX_PUSH_WORKERS, BulkJobTimeout, bulk_insert, bulk_upsert, collections_insert,
+                             concurrent_insert, create_ingest_job, resume_bulk_job, upload_job_data)
+
+
+def records(tag, count):
+    return [{'LastName': f"{tag}{i}", 'Company': 'Acme', 'Email': f"{tag}{i}@acme.example.com"}
+            for i in range(count)]
+
+
+def test_concurrent_pushes_share_the_orgs_request_slots():
+    sf, fake = connect(latency=0.02)
+    quota = ApiQuota(concurrent_requests=6, rate=1000)
+    results = {}
+
+    def push(tag):
+        results[tag] = concurrent_insert(sf, 'Lead', records(tag, 40), workers=MAX_PUSH_WORKERS, rate=1000,
+                                         quota=quota)
+
+    threads = [threading.Thread(target=push, args=(tag,)) for tag in ('East', 'West', 'North')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(result['success'] for batch in results.values() for result in batch)
+    assert len(fake.records) == 120
+    assert fake.max_in_flight <= 6
+
+
+def test_without_a_quota_each_push_uses_its_own_workers():
+    sf, fake = connect(latency=0.02)
+    concurrent_insert(sf, 'Lead', records('Solo', 40), workers=10, rate=1000)
+    assert 6 < fake.max_in_flight <= 10
+
+
+def test_bulk_insert_runs_a_job_through_its_lifecycle():
+    sf, fake = connect()
+    states = []
+
+    results = bulk_insert(sf, 'Lead', records('Bulk', 3), on_progress=lambda done, state: states.append(state),
+                          on_job=lambda job_id, start, count: states.append(fake.jobs[job_id]['state']),
+                          poll_interval=0)
+
+    [job] = fake.jobs.values()
+    assert states == ['Open', 'InProgress', 'JobComplete']
+    assert job['state'] == 'JobComplete' and job['numberRecordsProcessed'] == 3
+    assert [fake.records[result['id']]['LastName'] for result in results] == ['Bulk0', 'Bulk1', 'Bulk2']
+
+
+def test_bulk_results_are_matched_back_to_their_rows():
+    # The fake, like Salesforce, returns results out of upload order
+    sf, fake = connect(reject=lambda record: ('INVALID_FIELD', 'bad company') if record['Company'] == 'Bad' else None)
+    sent = [{'LastName': 'Twin', 'Company': 'Acme'}, {'LastName': 'Solo', 'Company': 'Bad'},
+            {'LastName': 'Twin', 'Company': 'Acme'}, {'LastName': 'Other', 'Company': 'Acme'}]
+
+    results = bulk_insert(sf, 'Lead', sent, poll_interval=0)
+
+    assert [result['success'] for result in results] == [True, False, True, True]
+    assert results[1]['error'] == 'INVALID_FIELD:bad company'
+    assert results[0]['id'] != results[2]['id']  # Identical records each get one of the two results
+    assert [fake.records[results[i]['id']]['LastName'] for i in (0, 2, 3)] == ['Twin', 'Twin', 'Other']
+
+
+def test_bulk_upsert_matches_results_by_external_id():
+    sf, fake = connect()
+    fake.records['00QEXISTING'] = {'attributes': {'type': 'Lead'}, 'msid__c': '2', 'LastName': 'Old', 'Company': 'Acme'}
+    sent = [{'msid__c': '1', 'LastName': 'New', 'Company': 'Acme'}, {'msid__c': '2', 'Title': 'CEO'}]
+
+    results = bulk_upsert(sf, 'Lead', 'msid__c', sent, poll_interval=0)
+
+    assert [(result['success'], result['created']) for result in results] == [(True, True), (True, False)]
+    assert results[1]['id'] == '00QEXISTING'
+    assert fake.records['00QEXISTING']['LastName'] == 'Old'  # A blank cell leaves the field alone
+    assert fake.records['00QEXISTING']['Title'] == 'CEO'
+
+
+def test_unprocessed_bulk_records_are_reported_as_failures():
+    sf, _ = connect(job_row_limit=2)
+
+    results = bulk_insert(sf, 'Lead', records('Partial', 4), poll_interval=0)
+
+    assert [result['success'] for result in results] == [True, True, False, False]
+    assert results[3]['error'] == 'Job stopped after 2 records: limit reached'
+
+
+def test_resuming_a_job_that_was_never_closed_aborts_it():
+    sf, fake = connect()
+    sent = records('Open', 2)
+    job = create_ingest_job(sf, 'Lead')
+    # Interrupted after the data went up, before the job was closed: Salesforce will never run it
+    sf._call_salesforce('PUT', f"{sf.base_url}jobs/ingest/{job['id']}/batches/",
+                        data=b'LastName,Company,Email\nOpen0,Acme,open0@acme.example.com\n')
+
+    assert resume_bulk_job(sf, job['id'], sent, poll_interval=0) is None
+    assert fake.jobs[job['id']]['state'] == 'Aborted'
+    assert not fake.records
+
+
+def test_resuming_a_closed_job_collects_its_results():
+    sf, fake = connect()
+    sent = records('Closed', 2)
+    job = create_ingest_job(sf, 'Lead')
+    upload_job_data(sf, job['id'], b'LastName,Company,Email\n' + b''.join(
+        f"{record['LastName']},{record['Company']},{record['Email']}\n".encode() for record in sent))
+
+    results = resume_bulk_job(sf, job['id'], sent, poll_interval=0)
+
+    assert [fake.records[result['id']]['LastName'] for result in results] == ['Closed0', 'Closed1']
+
+
+def test_waiting_on_a_stuck_job_times_out_and_leaves_it_running():
+    sf, fake = connect(stuck_jobs=True)
+
+    with pytest.raises(BulkJobTimeout) as timeout:
+        bulk_insert(sf, 'Lead', records('Stuck', 2), poll_interval=0.01, max_wait=0.05)
+
+    [job] = fake.jobs.values()
+    assert timeout.value.job_id == job['id'] and timeout.value.state == 'InProgress'
+    assert job['state'] == 'InProgress'
+
+
+def reject_company(name):
+    return lambda record: ('INVALID_FIELD', f"{name} is not allowed") if record.get('Company') == name else None
+
+
+def test_collections_partial_success_maps_each_result_to_its_row():
+    sf, fake = connect(reject=reject_company('Bad'))
+    sent = records('Part', 5)
+    sent[1]['Company'] = sent[3]['Company'] = 'Bad'
+    seen = []
+
+    results = collections_insert(sf, 'Lead', sent, on_result=lambda position, result: seen.append(position),
+                                 batch_size=2)
+
+    assert [result['success'] for result in results] == [True, False, True, False, True]
+    assert results[3]['error'] == 'INVALID_FIELD: Bad is not allowed'
+    assert [fake.records[results[i]['id']]['LastName'] for i in (0, 2, 4)] == ['Part0', 'Part2', 'Part4']
+    assert seen == [0, 1, 2, 3, 4]
+
+
+def test_collections_chunk_lost_in_transit_is_sent_one_record_at_a_time():
+    calls = []
+
+    def outage(method, path):
+        # The second Collections call fails in transit
+        if path == 'composite/sobjects':
+            calls.append(path)
+            return len(calls) == 2
+        return False
+
+    sf, fake = connect(outage=outage, reject=reject_company('Bad'))
+    sent = records('Outage', 6)
+    sent[3]['Company'] = 'Bad'
+
+    results = collections_insert(sf, 'Lead', sent, batch_size=2)
+
+    assert len(calls) == 3
+    assert [result['success'] for result in results] == [True, True, True, False, True, True]
+    assert 'INVALID_FIELD' in results[3]['error']
+    assert [fake.records[result['id']]['LastName'] for result in results if result['success']] == [
+        'Outage0', 'Outage1', 'Outage2', 'Outage4', 'Outage5']
+
+
+def test_pushes_sharing_a_session_keep_its_connection_pool():
+    sf, _ = connect()
+    default = sf.session.adapters['https://']
+
+    concurrent_insert(sf, 'Lead', records('PoolA', 3), workers=MAX_PUSH_WORKERS)
+    sized = sf.session.adapters['https://']
+    concurrent_insert(sf, 'Lead', records('PoolB', 3), workers=4, quota=org_quota(sf))
+
+    assert sized is not default and sized._pool_maxsize == MAX_PUSH_WORKERS
+    assert sf.session.adapters['https://'] is sized
+    assert not default.poolmanager.pools  # The replaced default pool was closed
@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from salesforce_retry import (DUPLICATE, PERMANENT, RETRY_BASE_SECONDS, RETRY_MAX_SECONDS, TRANSIENT, RetryQueue,
+                              backoff_delay, classify_error)
+
+
+def failed(error):
+    return {'success': False, 'id': None, 'error': error}
+
+
+def entry(row):
+    return (row, {'LastName': f"Row{row}"}, {})
+
+
+@pytest.mark.parametrize('error, kind', [
+    (None, None),
+    ('', None),
+    ('DUPLICATES_DETECTED: Use one of these records?', DUPLICATE),
+    ('REQUEST_LIMIT_EXCEEDED: ConcurrentPerOrgLongTxn Limit exceeded.', TRANSIENT),
+    ('REQUEST_LIMIT_EXCEEDED: TotalRequests Limit exceeded.', PERMANENT),
+    ('UNABLE_TO_LOCK_ROW: unable to obtain exclusive access to this record', TRANSIENT),
+    ('Error Code 503. Response content: Service Unavailable', TRANSIENT),
+    ("HTTPSConnectionPool(host='x'): Read timed out.", TRANSIENT),
+    ('Record was not processed (bulk job Failed)', TRANSIENT),
+    ('INVALID_EMAIL_ADDRESS: Email: invalid email address', PERMANENT),
+    ('REQUIRED_FIELD_MISSING: Required fields are missing: [LastName]', PERMANENT),
+])
+def test_classify_error(error, kind):
+    assert classify_error(error) == kind
+
+
+def test_backoff_delay_stays_within_its_jitter_bounds():
+    random.seed(7)
+    for attempt in range(8):
+        delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt)
+        for _ in range(50):
+            assert delay / 2 <= backoff_delay(attempt) <= delay
+
+
+def test_transient_failures_are_retried_in_rounds_up_to_max_attempts():
+    random.seed(3)
+    queue = RetryQueue(rows=100, max_attempts=2)
+    slept = []
+    rounds = []
+
+    assert queue.offer(entry(5), failed('SERVER_UNAVAILABLE'))
+    assert queue.offer(entry(2), failed('UNABLE_TO_LOCK_ROW'))
+    for batch in queue.rounds(sleep=slept.append):
+        rounds.append([row for row, _, _ in batch])
+        for sent in batch:
+            queue.offer(sent, failed('SERVER_UNAVAILABLE'))  # Still down
+
+    assert rounds == [[2, 5], [2, 5]]  # File order, and no third try
+    assert queue.used == 4 and not queue.exhausted
+    assert RETRY_BASE_SECONDS / 2 <= slept[0] <= RETRY_BASE_SECONDS
+    assert RETRY_BASE_SECONDS <= slept[1] <= 2 * RETRY_BASE_SECONDS
+
+
+def test_successes_duplicates_and_permanent_errors_are_never_requeued():
+    queue = RetryQueue(rows=100)
+
+    assert not queue.offer(entry(0), {'success': True, 'id': '00Q1', 'error': None})
+    assert not queue.offer(entry(1), failed('DUPLICATES_DETECTED: Use one of these records?'))
+    assert not queue.offer(entry(2), failed('INVALID_EMAIL_ADDRESS: Email: invalid email address'))
+    assert not queue.offer(entry(3), failed('REQUEST_LIMIT_EXCEEDED: TotalRequests Limit exceeded.'))
+
+    assert queue.used == 0
+    assert list(queue.rounds(sleep=lambda seconds: None)) == []
+
+
+def test_retry_budget_is_shared_by_the_whole_push():
+    queue = RetryQueue(rows=10, budget_share=0.2, budget_min=3)
+    assert queue.budget == 3
+
+    offered = [queue.offer(entry(row), failed('SERVER_UNAVAILABLE')) for row in range(5)]
+
+    assert offered == [True, True, True, False, False]
+    assert queue.used == 3 and queue.exhausted
@@ -0,0 +1,48 @@
+import pandas as pd
+
+from fake_salesforce import connect
+from miedge_pipeline import LEAD_PLACEHOLDERS, build_lead_payloads, fill_blank
+from salesforce_upsert import CREATE, UNCHANGED, UPDATE, plan_upsert
+
+
+def existing_lead(fake, msid, **fields):
+    fake.records['00QEXISTING' + msid] = {'attributes': {'type': 'Lead'}, 'msid__c': msid, **fields}
+
+
+def payload(**row):
+    return build_lead_payloads(fill_blank(pd.DataFrame([row])), ['005OWNER'], valid_providers={'ADP'})[0]
+
+
+def test_blank_company_and_provider_never_overwrite_existing_values():
+    sf, fake = connect()
+    existing_lead(fake, '1', Company='Acme Corp', Current_Provider__c='ADP', Title='CEO')
+    record = payload(MSID='1', **{'Contact Company name': None, 'PEO (Normalized)': None, 'Job Title': 'CEO'})
+    assert record['Company'] == 'Unknown' and record['Current_Provider__c'] == 'Unknown'
+
+    [(action, sent, _)] = plan_upsert(sf, 'Lead', [record], placeholders=LEAD_PLACEHOLDERS)
+
+    assert action == UNCHANGED
+    assert sent is None
+
+
+def test_invalid_provider_is_not_sent_but_real_changes_are():
+    sf, fake = connect()
+    existing_lead(fake, '2', Company='Acme Corp', Current_Provider__c='ADP', Lead_Source_Other__c='Not A PEO',
+                  Title='CEO')
+    record = payload(MSID='2', **{'Contact Company name': 'Acme Holdings', 'PEO (Normalized)': 'Not A PEO',
+                                  'Job Title': 'CEO'})
+
+    [(action, sent, _)] = plan_upsert(sf, 'Lead', [record], placeholders=LEAD_PLACEHOLDERS)
+
+    assert action == UPDATE
+    assert sent == {'msid__c': '2', 'Company': 'Acme Holdings'}
+
+
+def test_new_records_keep_placeholders():
+    sf, _ = connect()
+    record = payload(MSID='3', **{'Contact Company name': None, 'Job Title': 'CEO'})
+
+    [(action, sent, _)] = plan_upsert(sf, 'Lead', [record], placeholders=LEAD_PLACEHOLDERS)
+
+    assert action == CREATE
+    assert sent['Company'] == 'Unknown'